@@ -1,4 +1,4 @@
 from src.dags.local_dag import pipeline
 
 if __name__ == "__main__":
-    pipeline()
+    raise SystemExit(0 if pipeline() else 1)
@@ -1,76 +1,314 @@
 from src.config.mongo_client import get_mongo_client
-from datetime import datetime
+from src.analytics.order_state import counts_as_milestone, event_epochs, rebuild_order_states
+from src.time_utils import NAT, PLACEHOLDER_EPOCH, parse_datetime, parse_timestamp, parse_timestamps
+from src.transformation.events_transformer import advance_watermark, get_watermark, watermark_query
+from src.transformation.reorder_buffer import ALLOWED_LATENESS_SECONDS, ReorderBuffer
+from pymongo import ReplaceOne, UpdateOne
+import argparse
+import itertools
+import numpy as np
 import os
+import time
 
 DB_NAME = os.getenv("MONGO_DB", "commercepulse")
 
+# Eventos curados juntados por ida a order_metrics (leitura + bulk_write)
+BATCH_SIZE = int(os.getenv("ORDER_METRICS_BATCH_SIZE", "5000"))
 
-def parse_iso(ts):
+# Documentos por ida ao servidor no cursor de events_curated
+CURSOR_BATCH_SIZE = int(os.getenv("ORDER_METRICS_CURSOR_BATCH_SIZE", "5000"))
+
+# Documento em pipeline_state com a marca (_id do último evento curado lido)
+STATE_ID = "order_metrics_builder"
+
+# Muda quando as regras das métricas mudam: as já guardadas são reconstruídas uma vez
+METRICS_VERSION = 2
+
+EVENT_PROJECTION = {
+    "_id": 1, "event_id": 1, "event_type": 1, "order_id": 1, "event_epoch": 1, "event_time": 1, "status": 1,
+    "ingested_at": 1,
+}
+
+# event_type -> (campo, como juntar duas datas). min/max dão o mesmo
+# resultado qualquer que seja a ordem (ou repetição) dos eventos.
+# shipment_updated só conta com status DELIVERED (order_state.REQUIRED_STATUS).
+MILESTONES = {
+    "order_created": ("created_at", min),
+    "payment_succeeded": ("paid_at", min),
+    "shipment_updated": ("delivered_at", max),
+}
+
+
+def event_epoch(ev):
     """
-    Aceita:
-    - ISO string (com ou sem Z)
-    - timestamp int / float
+    Epoch do evento: event_epoch calculado na transformação ou, em eventos
+    curados antes disso, o event_time original. O event_time de
+    preenchimento do bootstrap (epoch 0) conta como sem data.
     """
-    if ts is None:
-        return None
+    epoch = ev.get("event_epoch")
+    if epoch is None or epoch == PLACEHOLDER_EPOCH:
+        epoch = parse_timestamp(ev.get("event_time"))
+    return None if epoch == PLACEHOLDER_EPOCH else epoch
 
-    # Caso seja timestamp (vendor_c)
-    if isinstance(ts, (int, float)):
-        return datetime.utcfromtimestamp(ts)
 
-    # Caso seja string
-    if isinstance(ts, str):
-        return datetime.fromisoformat(ts.replace("Z", ""))
+def ingested_epoch(ev):
+    return parse_timestamp(ev.get("ingested_at"))
 
-    return None
 
+def event_datetime(ev):
+    epoch = event_epoch(ev)
+    return None if epoch is None else parse_datetime(epoch)
 
-def main():
-    client = get_mongo_client()
-    db = client[DB_NAME]
 
-    events = db.events_curated
-    metrics = db.order_metrics
+def empty_metrics(order_id):
+    return {
+        "order_id": order_id,
+        "created_at": None,
+        "paid_at": None,
+        "delivered_at": None,
+        "refund_count": 0,
+        "refund_event_ids": [],
+    }
+
+
+def _merge_time(combine, current, new):
+    if current is None:
+        return new
+    if new is None:
+        return current
+    return combine(current, new)
+
+
+def apply_event(rec, ev, t):
+    et = ev.get("event_type")
+
+    if et in MILESTONES and counts_as_milestone(ev):
+        field, combine = MILESTONES[et]
+        rec[field] = _merge_time(combine, rec[field], t)
+    elif et == "refund_issued":
+        # Guardar os event_id torna a contagem idempotente (eventos relidos)
+        rec["refund_event_ids"].append(ev.get("event_id"))
+
+
+def merge_metrics(existing, delta):
+    """
+    Junta as métricas de um lote às já guardadas para a mesma encomenda.
+    """
+    merged = empty_metrics(delta["order_id"])
+
+    for field, combine in MILESTONES.values():
+        merged[field] = _merge_time(combine, existing.get(field), delta[field])
+
+    refunds = set(existing.get("refund_event_ids") or []) | set(delta["refund_event_ids"])
+    merged["refund_event_ids"] = sorted(refunds, key=str)
+    merged["refund_count"] = len(refunds)
 
-    orders = {}
+    return merged
 
-    for ev in events.find():
+
+def merge_batch(metrics, batch):
+    """
+    Aplica um lote de eventos: lê só as encomendas afetadas, junta e grava
+    num único bulk_write. Devolve o número de encomendas atualizadas.
+    """
+    deltas = {}
+
+    for ev in batch:
         order_id = ev.get("order_id")
         if not order_id:
             continue
 
-        t = parse_iso(ev.get("event_time"))
+        t = event_datetime(ev)
         if not t:
             continue
 
-        rec = orders.setdefault(order_id, {
-            "order_id": order_id,
-            "created_at": None,
-            "paid_at": None,
-            "delivered_at": None,
-            "refund_count": 0
-        })
-
-        et = ev["event_type"]
-
-        if et == "order_created":
-            rec["created_at"] = t
-        elif et == "payment_succeeded":
-            rec["paid_at"] = t
-        elif et == "shipment_updated":
-            rec["delivered_at"] = t
-        elif et == "refund_issued":
-            rec["refund_count"] += 1
-
-    for doc in orders.values():
-        metrics.update_one(
-            {"order_id": doc["order_id"]},
-            {"$set": doc},
-            upsert=True
+        apply_event(deltas.setdefault(order_id, empty_metrics(order_id)), ev, t)
+
+    if not deltas:
+        return 0
+
+    existing = {
+        doc["order_id"]: doc
+        for doc in metrics.find({"order_id": {"$in": list(deltas)}}, {"_id": 0})
+    }
+
+    operations = [
+        UpdateOne(
+            {"order_id": order_id},
+            {"$set": merge_metrics(existing.get(order_id, {}), delta)},
+            upsert=True,
         )
+        for order_id, delta in deltas.items()
+    ]
+    metrics.bulk_write(operations, ordered=False)
+
+    return len(deltas)
+
+
+def correct_orders(events, metrics, order_ids):
+    """
+    Caminho de correção para eventos atrasados: recalcula só estas
+    encomendas a partir de todos os seus eventos curados.
+    """
+    order_ids = list(set(order_ids))
+    if not order_ids:
+        return 0
+
+    cursor = events.find({"order_id": {"$in": order_ids}}, EVENT_PROJECTION)
+    operations = [
+        ReplaceOne({"order_id": doc["order_id"]}, doc, upsert=True)
+        for doc in rebuild_order_states(cursor)
+    ]
+    if operations:
+        metrics.bulk_write(operations, ordered=False)
+
+    return len(operations)
+
+
+def max_capped_event_time(batch, current=None):
+    """
+    Maior event_time de um lote, com cada evento limitado ao teto da sua
+    ingestão (como em ReorderBuffer.push), vetorizado para a reconstrução.
+    """
+    epochs = event_epochs(batch)
+
+    now = int(time.time())
+    ingested = parse_timestamps([ev.get("ingested_at") for ev in batch], field="ingested_at")
+    ceiling = np.minimum(np.where(ingested == NAT, now, ingested), now) + ALLOWED_LATENESS_SECONDS
+
+    valid = epochs != NAT
+    if not valid.any():
+        return current
+    best = int(np.minimum(epochs[valid], ceiling[valid]).max())
+    return best if current is None else max(current, best)
 
-    print(f"Métricas geradas para {len(orders)} encomendas.")
+
+def get_metrics_version(state_col):
+    state = state_col.find_one({"_id": STATE_ID})
+    return state.get("metrics_version") if state else None
+
+
+def get_event_watermark(state_col):
+    state = state_col.find_one({"_id": STATE_ID})
+    return state.get("max_event_time") if state else None
+
+
+def save_event_watermark(state_col, max_event_time):
+    """
+    $set e não $max: o valor já parte do guardado (ReorderBuffer) e assim uma
+    marca antiga no futuro é substituída. Só este builder escreve a marca.
+    """
+    if max_event_time is None:
+        return
+    state_col.update_one({"_id": STATE_ID}, {"$set": {"max_event_time": max_event_time}}, upsert=True)
+
+
+def rebuild(events, metrics, state_col):
+    """
+    Reconstrução completa com o motor compacto (order_state): lê todos os
+    eventos curados, recria order_metrics e põe a marca no último _id lido.
+    """
+    metrics.delete_many({})
+
+    last_seen = {"max_event_time": None}
+
+    def stream():
+        cursor = events.find({}, EVENT_PROJECTION).sort("_id", 1).batch_size(CURSOR_BATCH_SIZE)
+        while True:
+            chunk = list(itertools.islice(cursor, CURSOR_BATCH_SIZE))
+            if not chunk:
+                return
+            last_seen["_id"] = chunk[-1]["_id"]
+            last_seen["max_event_time"] = max_capped_event_time(chunk, last_seen["max_event_time"])
+            yield from chunk
+
+    written = 0
+    docs = []
+
+    for doc in rebuild_order_states(stream()):
+        docs.append(doc)
+        if len(docs) >= BATCH_SIZE:
+            metrics.insert_many(docs, ordered=False)
+            written += len(docs)
+            docs = []
+
+    if docs:
+        metrics.insert_many(docs, ordered=False)
+        written += len(docs)
+
+    if "_id" in last_seen:
+        advance_watermark(state_col, last_seen["_id"], STATE_ID)
+    state_col.update_one({"_id": STATE_ID}, {"$set": {"metrics_version": METRICS_VERSION}}, upsert=True)
+    save_event_watermark(state_col, last_seen["max_event_time"])
+
+    return written
+
+
+def main(full=False):
+    client = get_mongo_client()
+    db = client[DB_NAME]
+
+    events = db.events_curated
+    metrics = db.order_metrics
+    state_col = db.pipeline_state
+
+    last_id = get_watermark(state_col, STATE_ID)
+
+    metrics.create_index("order_id", unique=True)
+    events.create_index("order_id")
+
+    # Sem marca (ou com outra versão das regras) as métricas existentes podem
+    # vir da versão antiga: reconstrói tudo uma vez.
+    if full or last_id is None or get_metrics_version(state_col) != METRICS_VERSION:
+        written = rebuild(events, metrics, state_col)
+        print(f"Métricas reconstruídas para {written} encomendas.")
+        return
+
+    query = watermark_query(last_id)
+
+    cursor = events.find(query, EVENT_PROJECTION).sort("_id", 1).batch_size(CURSOR_BATCH_SIZE)
+
+    # Eventos por ordem de event_time; os que chegam depois da janela de
+    # atraso vão para correct_orders. A marca de event_time passa entre execuções.
+    buffer = ReorderBuffer(ALLOWED_LATENESS_SECONDS, get_event_watermark(state_col))
+
+    touched = 0
+    corrected = 0
+    ready = []
+    late = []
+    read_last_id = None
+
+    for ev in cursor:
+        read_last_id = ev["_id"]
+
+        emitted, arrived_late = buffer.push(ev, event_epoch(ev), ingested_epoch(ev))
+        ready.extend(emitted)
+        late.extend(arrived_late)
+
+        if len(ready) >= BATCH_SIZE:
+            touched += merge_batch(metrics, ready)
+            ready = []
+
+        if len(late) >= BATCH_SIZE:
+            corrected += correct_orders(events, metrics, [ev.get("order_id") for ev in late if ev.get("order_id")])
+            late = []
+
+    ready.extend(buffer.flush())
+    touched += merge_batch(metrics, ready)
+    corrected += correct_orders(events, metrics, [ev.get("order_id") for ev in late if ev.get("order_id")])
+
+    # Só no fim: até aqui podia haver eventos lidos ainda no buffer
+    if read_last_id is not None:
+        advance_watermark(state_col, read_last_id, STATE_ID)
+    save_event_watermark(state_col, buffer.max_event_time)
+
+    print(f"Métricas atualizadas para {touched} encomendas ({corrected} corrigidas por eventos atrasados).")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true",
+                        help="Ignora a marca e reconstrói order_metrics de raiz")
+    args = parser.parse_args()
+
+    main(full=args.full)
@@ -0,0 +1,342 @@
+"""
+Reconstrução de order_metrics com estado compacto por encomenda.
+
+Cada order_id é internado num array NumPy ordenado de bytes (código
+interno por encomenda) e as datas ficam em arrays NumPy paralelos (epochs
+int64), sem dicts nem objetos Python por encomenda. Quando a estimativa de memória passa o orçamento, o estado atual
+é gravado em disco como um run ordenado por order_id e a tabela recomeça;
+no fim os runs são juntados (merge externo) com as mesmas regras
+comutativas do modo incremental.
+"""
+import heapq
+import itertools
+import os
+import pickle
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from src.time_utils import NAT, PLACEHOLDER_EPOCH, parse_timestamps
+
+# Orçamento de memória para o estado em memória antes de passar a disco
+MEMORY_BUDGET_MB = int(os.getenv("ORDER_REBUILD_MEMORY_MB", "512"))
+
+# Bytes estimados por encomenda: chave em bytes, código e três epochs, com
+# folga para o crescimento dos arrays
+ORDER_BYTES = 96
+
+# Bytes estimados por refund guardado (event_id + lista)
+REFUND_BYTES = 120
+
+# Eventos convertidos de cada vez para arrays
+EVENT_BATCH_SIZE = int(os.getenv("ORDER_REBUILD_BATCH_SIZE", "50000"))
+
+# Estados por bloco pickle num run
+RUN_BLOCK_SIZE = 10000
+
+# Sentinelas: "sem data" para campos que guardam o mínimo / o máximo
+NO_MIN = np.iinfo(np.int64).max
+NO_MAX = NAT
+
+CREATED, PAID, DELIVERED, REFUND, OTHER = range(5)
+EVENT_CODES = {
+    "order_created": CREATED,
+    "payment_succeeded": PAID,
+    "shipment_updated": DELIVERED,
+    "refund_issued": REFUND,
+}
+
+# Tipos que só marcam a data com este status canónico (maiúsculas): um
+# shipment_updated CREATED ou IN_TRANSIT não é uma entrega
+REQUIRED_STATUS = {"shipment_updated": "DELIVERED"}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def order_key(order_id):
+    """
+    order_id em bytes para a tabela: texto em UTF-8 (a ordem dos bytes é a
+    dos caracteres); outros tipos em pickle, com o prefixo \\x00.
+    """
+    if isinstance(order_id, str):
+        return order_id.encode("utf-8")
+    return b"\x00" + pickle.dumps(order_id, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def order_id_from_key(key):
+    if key[:1] == b"\x00":
+        return pickle.loads(key[1:])
+    return key.decode("utf-8")
+
+
+class OrderStateTable:
+    """
+    Estado de várias encomendas em arrays paralelos, indexados pelo código
+    interno de cada order_id. Os order_ids ficam num array NumPy de bytes
+    ordenado (keys, com o código de cada um em codes): procurar um lote é
+    um searchsorted e não há um objeto Python por encomenda.
+    """
+
+    __slots__ = (
+        "keys", "codes", "size", "created", "paid", "delivered",
+        "refund_codes", "refund_ids", "refund_total",
+    )
+
+    def __init__(self, capacity=1024):
+        self.keys = np.array([], dtype="S1")
+        self.codes = np.array([], dtype=np.int64)
+        self.size = 0
+        self.created = np.full(capacity, NO_MIN, dtype=np.int64)
+        self.paid = np.full(capacity, NO_MIN, dtype=np.int64)
+        self.delivered = np.full(capacity, NO_MAX, dtype=np.int64)
+        # Por refund: código da encomenda (arrays por lote) e event_id
+        self.refund_codes = []
+        self.refund_ids = []
+        self.refund_total = 0
+
+    def __len__(self):
+        return self.size
+
+    def nbytes(self):
+        return self.size * ORDER_BYTES + self.refund_total * REFUND_BYTES
+
+    def _grow(self, size):
+        capacity = len(self.created)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, fill in (("created", NO_MIN), ("paid", NO_MIN), ("delivered", NO_MAX)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=np.int64)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def intern(self, order_ids):
+        """
+        Código interno de cada order_id do lote; os novos recebem os códigos
+        seguintes e entram em keys na posição ordenada.
+        """
+        if not len(order_ids):
+            return np.array([], dtype=np.int64)
+
+        unique, inverse = np.unique(np.array([order_key(o) for o in order_ids], dtype=bytes), return_inverse=True)
+
+        width = max(self.keys.dtype.itemsize, unique.dtype.itemsize)
+        keys = self.keys.astype(f"S{width}", copy=False)
+        unique = unique.astype(f"S{width}", copy=False)
+
+        at = np.searchsorted(keys, unique)
+        found = at < len(keys)
+        found[found] = keys[at[found]] == unique[found]
+        new = ~found
+
+        unique_codes = np.empty(len(unique), dtype=np.int64)
+        unique_codes[found] = self.codes[at[found]]
+        unique_codes[new] = np.arange(self.size, self.size + int(new.sum()), dtype=np.int64)
+
+        self.keys = np.insert(keys, at[new], unique[new])
+        self.codes = np.insert(self.codes, at[new], unique_codes[new])
+        self.size += int(new.sum())
+
+        return unique_codes[inverse.ravel()]
+
+    def add(self, order_ids, codes, epochs, event_ids):
+        """
+        Aplica um lote de eventos (listas/arrays alinhados).
+        """
+        positions = self.intern(order_ids)
+        self._grow(self.size)
+
+        for code, target, combine in (
+            (CREATED, self.created, np.minimum),
+            (PAID, self.paid, np.minimum),
+            (DELIVERED, self.delivered, np.maximum),
+        ):
+            mask = codes == code
+            if mask.any():
+                combine.at(target, positions[mask], epochs[mask])
+
+        refunds = np.flatnonzero(codes == REFUND)
+        if len(refunds):
+            self.refund_codes.append(positions[refunds])
+            self.refund_ids.extend(event_ids[i] for i in refunds)
+            self.refund_total += len(refunds)
+
+    def sorted_states(self):
+        """
+        (chave, created, paid, delivered, refund_ids) por ordem de order_id;
+        a chave é order_key(order_id).
+        """
+        if self.refund_total:
+            refund_codes = np.concatenate(self.refund_codes)
+            # Estável: os refunds de cada encomenda ficam pela ordem de chegada
+            refund_order = np.argsort(refund_codes, kind="stable")
+            refund_codes = refund_codes[refund_order]
+            first = np.searchsorted(refund_codes, self.codes, side="left")
+            last = np.searchsorted(refund_codes, self.codes, side="right")
+        else:
+            refund_order = None
+            first = last = np.zeros(self.size, dtype=np.int64)
+
+        # Em blocos, para não criar de uma vez um bytes Python por encomenda
+        for start in range(0, self.size, RUN_BLOCK_SIZE):
+            end = start + RUN_BLOCK_SIZE
+            for key, i, lo, hi in zip(
+                self.keys[start:end].tolist(),
+                self.codes[start:end].tolist(),
+                first[start:end].tolist(),
+                last[start:end].tolist(),
+            ):
+                yield (
+                    key,
+                    int(self.created[i]),
+                    int(self.paid[i]),
+                    int(self.delivered[i]),
+                    tuple(self.refund_ids[j] for j in refund_order[lo:hi].tolist()) if hi > lo else (),
+                )
+
+
+def merge_states(a, b):
+    return (
+        a[0],
+        min(a[1], b[1]),
+        min(a[2], b[2]),
+        max(a[3], b[3]),
+        a[4] + b[4],
+    )
+
+
+def write_run(states, directory):
+    handle, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(handle, "wb") as f:
+        while True:
+            block = list(itertools.islice(states, RUN_BLOCK_SIZE))
+            if not block:
+                break
+            pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+
+def merge_runs(paths):
+    """
+    Merge k-way dos runs ordenados, juntando os estados do mesmo order_id.
+    """
+    merged = heapq.merge(*(read_run(p) for p in paths), key=lambda s: s[0])
+    for _, group in itertools.groupby(merged, key=lambda s: s[0]):
+        state = next(group)
+        for other in group:
+            state = merge_states(state, other)
+        yield state
+
+
+def _datetime(epoch, missing):
+    return None if epoch == missing else _EPOCH + timedelta(seconds=epoch)
+
+
+def state_document(state):
+    """
+    Documento de order_metrics (mesmo formato de order_metrics_builder).
+    """
+    key, created, paid, delivered, refund_ids = state
+    refunds = sorted(set(refund_ids), key=str)
+    return {
+        "order_id": order_id_from_key(key),
+        "created_at": _datetime(created, NO_MIN),
+        "paid_at": _datetime(paid, NO_MIN),
+        "delivered_at": _datetime(delivered, NO_MAX),
+        "refund_count": len(refunds),
+        "refund_event_ids": refunds,
+    }
+
+
+def counts_as_milestone(ev):
+    required = REQUIRED_STATUS.get(ev.get("event_type"))
+    return required is None or ev.get("status") == required
+
+
+def event_epochs(batch):
+    """
+    Epochs dos eventos curados (NAT sem data): event_epoch ou, em eventos
+    curados antes dele, o event_time. O epoch 0 do bootstrap não é uma data.
+    """
+    epochs = np.array(
+        [NAT if ev.get("event_epoch") is None else ev["event_epoch"] for ev in batch], dtype=np.int64
+    )
+
+    missing = np.flatnonzero((epochs == NAT) | (epochs == PLACEHOLDER_EPOCH))
+    if len(missing):
+        epochs[missing] = parse_timestamps([batch[i].get("event_time") for i in missing], field="event_time")
+
+    epochs[epochs == PLACEHOLDER_EPOCH] = NAT
+    return epochs
+
+
+def event_arrays(batch):
+    """
+    (order_ids, códigos, epochs, event_ids) dos eventos com order_id e data válida.
+    """
+    epochs = event_epochs(batch)
+
+    keep = [i for i, ev in enumerate(batch) if ev.get("order_id") and epochs[i] != NAT]
+
+    return (
+        [batch[i]["order_id"] for i in keep],
+        np.array(
+            [EVENT_CODES.get(batch[i].get("event_type"), OTHER) if counts_as_milestone(batch[i]) else OTHER
+             for i in keep],
+            dtype=np.int8,
+        ),
+        epochs[keep],
+        [batch[i].get("event_id") for i in keep],
+    )
+
+
+def rebuild_order_states(events, memory_budget_mb=MEMORY_BUDGET_MB, tmp_dir=None, stats=None):
+    """
+    Gera os documentos de order_metrics a partir de todos os eventos curados,
+    por ordem de order_id. Acima de memory_budget_mb o estado vai para runs
+    em disco (tmp_dir) que são juntados no fim.
+    """
+    events = iter(events)
+    budget = memory_budget_mb * 2 ** 20
+    table = OrderStateTable()
+    runs = []
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as directory:
+        while True:
+            batch = list(itertools.islice(events, EVENT_BATCH_SIZE))
+            if not batch:
+                break
+
+            table.add(*event_arrays(batch))
+
+            if table.nbytes() > budget:
+                runs.append(write_run(table.sorted_states(), directory))
+                table = OrderStateTable()
+
+        if stats is not None:
+            stats["runs"] = len(runs) + (1 if runs and len(table) else 0)
+
+        if not runs:
+            for state in table.sorted_states():
+                yield state_document(state)
+            return
+
+        if len(table):
+            runs.append(write_run(table.sorted_states(), directory))
+        table = None
+
+        for state in merge_runs(runs):
+            yield state_document(state)
@@ -1,15 +1,355 @@
-import sqlite3
+"""
+Relatório de qualidade do warehouse.
+
+Todas as verificações registadas em CHECKS são calculadas numa só passagem
+pelas partições de factos. Em modo delta só se leem as linhas carregadas
+desde a última execução e os totais continuam a partir do estado guardado
+em load_state. Cada execução fica registada na tabela quality_runs.
+
+Uso:
+  python -m src.analytics.quality_report [--delta] [--db analytics.db]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
 
-DB_PATH = "src/analytics/analytics.db"  # ajusta se teu DB estiver noutro local
+from src.analytics.warehouse_simulator import DB_PATH, DIMENSIONS, Warehouse
+from src.time_utils import NAT, PLACEHOLDER_EPOCH, PLACEHOLDER_EVENT_TIME, parse_timestamps
+
+# Linhas lidas de cada vez de uma partição
+SCAN_CHUNK_SIZE = int(os.getenv("QUALITY_SCAN_CHUNK_SIZE", "50000"))
+
+# ingested_at - event_time acima disto conta como chegada atrasada
+LATE_ARRIVAL_SECONDS = int(os.getenv("QUALITY_LATE_ARRIVAL_SECONDS", "86400"))
+
+# Prefixo das encomendas sem referência válida
+ORPHAN_PREFIX = "ORD-UNKNOWN-"
+
+# Nome do estado (marcas por partição + totais) em load_state
+QUALITY_STATE = "quality_report"
+
+SCAN_COLUMNS = ["rowid", "event_id", "event_time", "event_epoch", "ingested_at", "event_type_key", "order_key", "vendor_key"]
+
+
+def fingerprint(event_id):
+    """
+    64 bits do blake2b de um event_id (bytes ou texto).
+    """
+    raw = event_id if isinstance(event_id, bytes) else str(event_id).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little", signed=True)
+
+
+class ScanContext:
+    """
+    O que as verificações precisam de saber sobre a passagem em curso.
+    """
+
+    def __init__(self, warehouse, watermarks, delta):
+        self.warehouse = warehouse
+        self.watermarks = watermarks
+        self.delta = delta
+        self.partition = None
+        self.scanned = []
+
+    def dimension_values(self, column):
+        table, key = DIMENSIONS[column]
+        return dict(self.warehouse.execute(f'SELECT {key}, "{column}" FROM {table}'))
+
+
+class Check:
+    """
+    Verificação incremental: update() recebe cada bloco de linhas (DataFrame
+    com SCAN_COLUMNS) e acumula em self.state, que tem de ser serializável
+    em JSON para continuar na execução delta seguinte.
+    """
+
+    name = None
+
+    def __init__(self, state=None):
+        # Métricas novas começam do zero sobre um estado guardado por versões antigas
+        self.state = {**self.initial_state(), **(state or {})}
+
+    def initial_state(self):
+        return {}
+
+    def start(self, context):
+        pass
+
+    def update(self, chunk, context):
+        raise NotImplementedError
+
+    def finish(self, context):
+        pass
+
+    def results(self, context):
+        return dict(self.state)
+
+
+class DuplicateEventIds(Check):
+    """
+    event_id repetidos. Cada partição tem índice único, por isso só há
+    repetidos entre partições. Na passagem completa comparam-se impressões
+    de 64 bits no fim; em delta procuram-se as linhas novas nos índices das
+    outras partições (só nas linhas lidas antes delas).
+    """
+
+    name = "duplicate_event_ids"
+
+    def initial_state(self):
+        return {"duplicates": 0}
+
+    def start(self, context):
+        self.fingerprints = []
+
+    def update(self, chunk, context):
+        if not context.delta:
+            self.fingerprints.append(np.fromiter(map(fingerprint, chunk["event_id"]), dtype=np.int64, count=len(chunk)))
+            return
+
+        ids = chunk["event_id"].tolist()
+        found = set()
+
+        for table, watermark in context.watermarks.items():
+            if table == context.partition:
+                continue
+            # Partições já lidas nesta execução: todas as linhas; as outras: só as antigas
+            limit = "" if table in context.scanned else " AND rowid <= ?"
+            extra = () if table in context.scanned else (watermark,)
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                placeholders = ", ".join("?" for _ in part)
+                found.update(
+                    row[0]
+                    for row in context.warehouse.execute(
+                        f"SELECT event_id FROM {table} WHERE event_id IN ({placeholders}){limit}",
+                        (*part, *extra),
+                    )
+                )
+
+        self.state["duplicates"] += sum(1 for event_id in ids if event_id in found)
+
+    def finish(self, context):
+        if context.delta or not self.fingerprints:
+            return
+        values = np.sort(np.concatenate(self.fingerprints))
+        self.state["duplicates"] += int((values[1:] == values[:-1]).sum())
+
+
+class NullOrderIds(Check):
+    name = "null_order_ids"
+
+    def initial_state(self):
+        return {"null_order_ids": 0}
+
+    def update(self, chunk, context):
+        self.state["null_order_ids"] += int(chunk["order_key"].isna().sum())
+
+
+class OrphanOrders(Check):
+    """
+    Eventos que referem encomendas ORD-UNKNOWN-*, pelas chaves de dim_order.
+    """
+
+    name = "orphan_orders"
+
+    def initial_state(self):
+        return {"orphan_events": 0}
+
+    def start(self, context):
+        self.orphan_keys = [
+            row[0]
+            for row in context.warehouse.execute(
+                "SELECT order_key FROM dim_order WHERE order_id LIKE ?", (f"{ORPHAN_PREFIX}%",)
+            )
+        ]
+
+    def update(self, chunk, context):
+        self.state["orphan_events"] += int(chunk["order_key"].isin(self.orphan_keys).sum())
+
+
+class LateArrivals(Check):
+    """
+    Eventos com ingested_at - event_time acima de LATE_ARRIVAL_SECONDS, e
+    datas que não se conseguem ler. Os registos do bootstrap com o event_time
+    de preenchimento (ou epoch 0) não têm hora de evento conhecida: contam
+    em placeholder_event_time e não como atrasados.
+    """
+
+    name = "late_arrivals"
+
+    def initial_state(self):
+        return {
+            "late_events": 0,
+            "max_delay_seconds": None,
+            "invalid_event_time": 0,
+            "invalid_ingested_at": 0,
+            "placeholder_event_time": 0,
+            "threshold_seconds": LATE_ARRIVAL_SECONDS,
+        }
+
+    def update(self, chunk, context):
+        ingested = parse_timestamps(chunk["ingested_at"], field="ingested_at")
+        event_epoch = chunk["event_epoch"]
+
+        placeholder = ((chunk["event_time"] == PLACEHOLDER_EVENT_TIME) | (event_epoch == PLACEHOLDER_EPOCH)).to_numpy()
+        has_event = event_epoch.notna().to_numpy() & ~placeholder
+        has_ingested = ingested != NAT
+
+        self.state["placeholder_event_time"] += int(placeholder.sum())
+        self.state["invalid_event_time"] += int((~has_event & ~placeholder).sum())
+        self.state["invalid_ingested_at"] += int((~has_ingested).sum())
+
+        both = has_event & has_ingested
+        if not both.any():
+            return
+
+        delay = ingested[both] - event_epoch.to_numpy()[both].astype(np.int64)
+        self.state["late_events"] += int((delay > self.state["threshold_seconds"]).sum())
+
+        chunk_max = int(delay.max())
+        current = self.state["max_delay_seconds"]
+        self.state["max_delay_seconds"] = chunk_max if current is None else max(current, chunk_max)
+
+
+class Distribution(Check):
+    """
+    Eventos por vendor x event_type.
+    """
+
+    name = "distribution"
+
+    def initial_state(self):
+        return {"counts": {}}
+
+    def update(self, chunk, context):
+        keys = chunk[["vendor_key", "event_type_key"]].astype("float64").fillna(0).astype(np.int64)
+        counts = self.state["counts"]
+        for (vendor_key, type_key), n in keys.value_counts().items():
+            key = f"{vendor_key}:{type_key}"
+            counts[key] = counts.get(key, 0) + int(n)
+
+    def results(self, context):
+        vendors = context.dimension_values("vendor")
+        types = context.dimension_values("event_type")
+        results = {}
+        for key, n in sorted(self.state["counts"].items()):
+            vendor_key, type_key = (int(k) for k in key.split(":"))
+            results[f"{vendors.get(vendor_key)}|{types.get(type_key)}"] = n
+        return results
+
+
+CHECKS = [DuplicateEventIds, NullOrderIds, OrphanOrders, LateArrivals, Distribution]
+
+
+def ensure_quality_table(warehouse):
+    warehouse.execute("""
+        CREATE TABLE IF NOT EXISTS quality_runs (
+            run_id INTEGER,
+            run_at TEXT,
+            mode TEXT,
+            rows_scanned INTEGER,
+            check_name TEXT,
+            metric TEXT,
+            value REAL
+        )
+    """)
+
+
+def run_checks(warehouse, delta=False, checks=CHECKS):
+    """
+    Corre as verificações numa passagem (completa ou só pelas linhas novas),
+    grava o resultado em quality_runs e devolve {check: {métrica: valor}}.
+    """
+    state = json.loads(warehouse.get_state(QUALITY_STATE) or "{}") if delta else {}
+    previous = state.get("watermarks", {})
+    saved = state.get("checks", {})
+
+    partitions = warehouse.partitions()
+    watermarks = {table: previous.get(table, 0) for table in partitions}
+    context = ScanContext(warehouse, watermarks, delta)
+
+    active = [check_class(saved.get(check_class.name)) for check_class in checks]
+    for check in active:
+        check.start(context)
+
+    started = time.perf_counter()
+    rows_scanned = 0
+    columns = ", ".join(SCAN_COLUMNS)
+
+    for table in partitions:
+        context.partition = table
+        cursor = warehouse.execute(
+            f"SELECT {columns} FROM {table} WHERE rowid > ? ORDER BY rowid", (watermarks[table],)
+        )
+        last_rowid = watermarks[table]
+
+        while True:
+            rows = cursor.fetchmany(SCAN_CHUNK_SIZE)
+            if not rows:
+                break
+            chunk = pd.DataFrame(rows, columns=SCAN_COLUMNS)
+            for check in active:
+                check.update(chunk, context)
+            rows_scanned += len(chunk)
+            last_rowid = int(chunk["rowid"].iloc[-1])
+
+        context.scanned.append(table)
+        watermarks[table] = last_rowid
+
+    for check in active:
+        check.finish(context)
+
+    results = {check.name: check.results(context) for check in active}
+    run_at = datetime.utcnow().isoformat(timespec="seconds")
+    mode = "delta" if delta else "full"
+
+    with warehouse.transaction():
+        ensure_quality_table(warehouse)
+        run_id = warehouse.execute("SELECT COALESCE(MAX(run_id), 0) + 1 FROM quality_runs").fetchone()[0]
+        warehouse.insert_rows(
+            "quality_runs",
+            ["run_id", "run_at", "mode", "rows_scanned", "check_name", "metric", "value"],
+            [
+                (run_id, run_at, mode, rows_scanned, name, metric, value)
+                for name, metrics in results.items()
+                for metric, value in metrics.items()
+            ],
+        )
+        warehouse.set_state(QUALITY_STATE, json.dumps({
+            "watermarks": watermarks,
+            "checks": {check.name: check.state for check in active},
+        }))
+
+    print(f"{rows_scanned} linhas verificadas em {time.perf_counter() - started:.2f}s ({mode}).")
+    return results
+
+
+def print_report(results):
+    print("\n=== DATA QUALITY REPORT ===")
+    for name, metrics in results.items():
+        print(f"[{name}]")
+        for metric, value in metrics.items():
+            print(f"  {metric}: {value}")
+    print("===========================\n")
+
 
-conn = sqlite3.connect(DB_PATH)
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--db", default=DB_PATH, help="Ficheiro SQLite do warehouse")
+    p.add_argument("--delta", action="store_true",
+                   help="Só as linhas carregadas desde a última execução (totais acumulados)")
+    args = p.parse_args()
 
-# Relatório simples de quantidade de pedidos
-df_orders = pd.read_sql("SELECT COUNT(*) as total_orders FROM fact_events", conn)
+    with Warehouse(args.db) as warehouse:
+        warehouse.ensure_fact_table()
+        print_report(run_checks(warehouse, delta=args.delta))
 
-print("\n=== DATA QUALITY REPORT ===")
-print(df_orders)
-print("===========================\n")
 
-conn.close()
+if __name__ == "__main__":
+    main()
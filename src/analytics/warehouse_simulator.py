@@ -1,9 +1,829 @@
+import calendar
+import os
 import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
 
-DB_PATH = "analytics.db"
+from src.time_utils import NAT, PLACEHOLDER_EPOCH, parse_timestamp, parse_timestamps
+
+DB_PATH = os.getenv("WAREHOUSE_DB_PATH", "analytics.db")
+
+FACT_COLUMNS = [
+    "event_id", "event_time", "event_type", "ingested_at", "order_id", "vendor", "event_epoch",
+    "amount", "currency", "status",
+]
+
+# fact_events é uma view sobre uma tabela por mês de event_epoch
+PARTITION_PREFIX = "fact_events_p"
+UNKNOWN_PARTITION = "fact_events_unknown"
+
+# Partição criada por versões que encaminhavam pelo event_time de
+# preenchimento do bootstrap (1970-01-01): é removida ao abrir o warehouse
+PLACEHOLDER_PARTITION = f"{PARTITION_PREFIX}197001"
+
+# Marca (load_state) da carga incremental de events_curated
+FACT_LOAD_STATE = "fact_events"
+
+# Marca (load_state) de partições antigas sem amount/currency/status: a
+# próxima carga relê events_curated e preenche essas colunas
+FACT_BACKFILL_STATE = "fact_events_backfill"
+
+# Colunas de cada partição: event_id em binário e dimensões como chaves inteiras
+PARTITION_COLUMNS = [
+    "event_id", "event_time", "event_epoch", "ingested_at",
+    "event_type_key", "order_key", "vendor_key",
+    "amount", "currency", "status",
+]
+
+# Coluna de fact_events -> (tabela de dimensão, chave substituta)
+DIMENSIONS = {
+    "event_type": ("dim_event_type", "event_type_key"),
+    "order_id": ("dim_order", "order_key"),
+    "vendor": ("dim_vendor", "vendor_key"),
+}
+
+# Entradas por cache de dimensão antes de ser esvaziada
+DIM_CACHE_MAX = 1_000_000
+
+# event_id volta a texto hexadecimal nas views
+EVENT_ID_SQL = "CASE WHEN typeof(f.event_id) = 'blob' THEN lower(hex(f.event_id)) ELSE f.event_id END"
+
+# Dia dos eventos sem event_time válido nos rollups
+UNKNOWN_DAY = "unknown"
+ROLLUP_DAY_SQL = f"COALESCE(date(event_epoch, 'unixepoch'), '{UNKNOWN_DAY}')"
+
+# Tabelas de rollup mantidas por insert_facts, todas com a coluna day
+ROLLUP_TABLES = ["rollup_events_daily", "rollup_amounts_daily"]
+
+# Colunas de daily_orders -> condição sobre rollup_amounts_daily (r) e
+# dim_event_type (t). Os pagamentos do bootstrap incluem falhados: só contam
+# os de status SUCCESS.
+ORDER_METRICS = {
+    "orders_created": "t.event_type IN ('order_created', 'order_historical')",
+    "payments_succeeded": (
+        "(t.event_type = 'payment_succeeded' OR (t.event_type = 'payment_historical' AND r.status = 'SUCCESS'))"
+    ),
+    "refunds_issued": "t.event_type IN ('refund_issued', 'refund_historical')",
+}
+
+# Colunas de daily_revenue (soma de amount por moeda) -> métrica de ORDER_METRICS
+REVENUE_METRICS = {
+    "order_value": "orders_created",
+    "payments": "payments_succeeded",
+    "refunds": "refunds_issued",
+}
+
+# Agrupamentos/filtros aceites por aggregate(), como expressões sobre {facts}
+FACT_GROUPS = {
+    "day": ROLLUP_DAY_SQL,
+    "hour": "strftime('%Y-%m-%d %H:00', event_epoch, 'unixepoch')",
+    "vendor": "vendor",
+    "event_type": "event_type",
+    "order_id": "order_id",
+}
+
+# ... e os que rollup_events_daily consegue responder
+ROLLUP_GROUPS = {"day": "r.day", "vendor": "v.vendor", "event_type": "t.event_type"}
+
+# Linhas por executemany
+WRITE_CHUNK_SIZE = int(os.getenv("WAREHOUSE_WRITE_CHUNK_SIZE", "10000"))
+
+# PRAGMAs para cargas em lote: WAL, fsync só no checkpoint, cache de 64 MB
+WRITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": "-65536",
+    "temp_store": "MEMORY",
+}
+
+
+def warehouse_value(value):
+    """
+    Valor pronto para uma coluna TEXT (datetime como o to_sql gravava).
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return str(value)
+    if isinstance(value, float) and pd.isna(value):
+        return None
+    return value
+
+
+def encode_event_id(event_id):
+    """
+    event_id hexadecimal em bytes (32 num sha256, 6 nos ids live);
+    qualquer outro valor fica como está.
+    """
+    if isinstance(event_id, str):
+        try:
+            raw = bytes.fromhex(event_id)
+        except ValueError:
+            return event_id
+        if raw.hex() == event_id:
+            return raw
+    return event_id
+
+
+def fact_epochs(rows, column):
+    """
+    Epoch de cada linha (NAT sem data): o event_epoch que a transformação
+    calculou ou, sem ele, o event_time. O epoch 0 do preenchimento do
+    bootstrap não é uma data.
+    """
+    epochs = np.array(
+        [NAT if row[column["event_epoch"]] is None else int(row[column["event_epoch"]]) for row in rows],
+        dtype=np.int64,
+    )
+
+    missing = np.flatnonzero((epochs == NAT) | (epochs == PLACEHOLDER_EPOCH))
+    if len(missing):
+        epochs[missing] = parse_timestamps([rows[i][column["event_time"]] for i in missing], field="event_time")
+
+    epochs[epochs == PLACEHOLDER_EPOCH] = NAT
+    return epochs
+
+
+def decoded_facts_sql(source):
+    """
+    SELECT com as colunas originais de fact_events (e as chaves) a partir
+    de uma fonte com PARTITION_COLUMNS.
+    """
+    return f"""
+        SELECT {EVENT_ID_SQL} AS event_id, f.event_time, t.event_type, f.ingested_at,
+               o.order_id, v.vendor, f.event_epoch, f.amount, f.currency, f.status,
+               f.event_type_key, f.order_key, f.vendor_key
+        FROM {source} f
+        LEFT JOIN dim_event_type t ON t.event_type_key = f.event_type_key
+        LEFT JOIN dim_order o ON o.order_key = f.order_key
+        LEFT JOIN dim_vendor v ON v.vendor_key = f.vendor_key
+    """
+
+
+class Warehouse:
+    """
+    Ligação SQLite mantida durante toda a carga.
+
+    As escritas correm em transações explícitas (transaction()) e são
+    enviadas com executemany em blocos de chunk_size linhas.
+    """
+
+    def __init__(self, path=None, chunk_size=WRITE_CHUNK_SIZE, pragmas=None):
+        self.path = path or DB_PATH
+        self.chunk_size = max(int(chunk_size), 1)
+
+        # isolation_level=None: o módulo sqlite3 não abre transações implícitas
+        self.conn = sqlite3.connect(self.path, isolation_level=None)
+
+        # Por dimensão: valor -> chave inteira
+        self._dim_cache = {}
+
+        for name, value in (WRITE_PRAGMAS if pragmas is None else pragmas).items():
+            self.conn.execute(f"PRAGMA {name} = {value}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        BEGIN ... COMMIT (ROLLBACK em caso de erro). Dentro de outra transação
+        não abre uma nova.
+        """
+        if self.conn.in_transaction:
+            yield self
+            return
+
+        self.conn.execute("BEGIN")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            # Chaves de dimensão criadas nesta transação deixaram de existir
+            self._dim_cache.clear()
+            raise
+        self.conn.execute("COMMIT")
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    def insert_rows(self, table, columns, rows, ignore=False, on_conflict=None):
+        """
+        Insere as linhas em blocos de chunk_size; devolve quantas foram inseridas.
+        Com ignore=True usa INSERT OR IGNORE (linhas com chave repetida são saltadas);
+        on_conflict é uma cláusula ON CONFLICT ... acrescentada ao INSERT.
+        """
+        placeholders = ", ".join("?" for _ in columns)
+        names = ", ".join(f'"{c}"' for c in columns)
+        verb = "INSERT OR IGNORE" if ignore else "INSERT"
+        sql = f"{verb} INTO {table} ({names}) VALUES ({placeholders})"
+        if on_conflict:
+            sql = f"{sql} {on_conflict}"
+
+        before = self.conn.total_changes
+
+        with self.transaction():
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= self.chunk_size:
+                    self.conn.executemany(sql, chunk)
+                    chunk = []
+            if chunk:
+                self.conn.executemany(sql, chunk)
+
+        return self.conn.total_changes - before
+
+    def append(self, df, table):
+        """
+        Substitui o antigo save(df, table): cria a tabela se não existir e
+        acrescenta as linhas do DataFrame.
+        """
+        schema = pd.io.sql.get_schema(df, table, con=self.conn)
+        schema = schema.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1)
+
+        with self.transaction():
+            self.conn.execute(schema)
+            rows = (
+                tuple(warehouse_value(v) for v in row)
+                for row in df.astype(object).itertuples(index=False, name=None)
+            )
+            return self.insert_rows(table, list(df.columns), rows)
+
+    def ensure_fact_table(self):
+        """
+        Prepara as dimensões, o registo de partições, as views e a tabela
+        load_state. Uma fact_events antiga (tabela única) ou partições com
+        colunas de texto são migradas para o formato atual.
+        """
+        with self.transaction():
+            for column, (table, key) in DIMENSIONS.items():
+                self.conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} ({key} INTEGER PRIMARY KEY, "{column}" TEXT NOT NULL UNIQUE)'
+                )
+
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS fact_partitions (
+                    name TEXT PRIMARY KEY,
+                    month TEXT,
+                    start_epoch INTEGER,
+                    end_epoch INTEGER
+                )
+            """)
+            self.conn.execute("CREATE TABLE IF NOT EXISTS load_state (name TEXT PRIMARY KEY, value TEXT)")
+
+            rollups_missing = self.conn.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' "
+                "AND name IN ('rollup_events_daily', 'rollup_amounts_daily')"
+            ).fetchone()[0] < 2
+            self._ensure_rollups()
+
+            sources = []
+            backfill = False
+
+            legacy = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'fact_events'"
+            ).fetchone()
+            if legacy:
+                self.conn.execute("ALTER TABLE fact_events RENAME TO fact_events_legacy")
+                sources.append("fact_events_legacy")
+
+            for (name,) in self.conn.execute("SELECT name FROM fact_partitions").fetchall():
+                columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({name})")}
+                if "vendor" in columns:
+                    self.conn.execute(f"DROP INDEX IF EXISTS ux_{name}_event_id")
+                    self.conn.execute(f"DROP INDEX IF EXISTS ix_{name}_event_epoch")
+                    self.conn.execute(f"ALTER TABLE {name} RENAME TO {name}_text")
+                    self.conn.execute("DELETE FROM fact_partitions WHERE name = ?", (name,))
+                    sources.append(f"{name}_text")
+                elif "amount" not in columns:
+                    for new_column, kind in (("amount", "REAL"), ("currency", "TEXT"), ("status", "TEXT")):
+                        self.conn.execute(f"ALTER TABLE {name} ADD COLUMN {new_column} {kind}")
+                    backfill = True
+
+            if sources or backfill:
+                # amount/currency/status das linhas antigas só existem em events_curated
+                self.set_state(FACT_BACKFILL_STATE, "1")
+                self.conn.execute("DELETE FROM load_state WHERE name = ?", (FACT_LOAD_STATE,))
+
+            self._refresh_fact_view()
+
+            if rollups_missing:
+                self.rebuild_rollups()
+
+            placeholder = self.conn.execute(
+                "SELECT 1 FROM fact_partitions WHERE name = ?", (PLACEHOLDER_PARTITION,)
+            ).fetchone()
+            if placeholder:
+                # Não se sabe a data real destas linhas aqui: saem, e a próxima
+                # carga relê events_curated (INSERT OR IGNORE salta o resto)
+                self.conn.execute(f"DROP TABLE {PLACEHOLDER_PARTITION}")
+                self.conn.execute("DELETE FROM fact_partitions WHERE name = ?", (PLACEHOLDER_PARTITION,))
+                self.conn.execute("DELETE FROM load_state WHERE name = ?", (FACT_LOAD_STATE,))
+                self._refresh_fact_view()
+                self.rebuild_rollup_day("1970-01-01")
+
+            # insert_facts atualiza os rollups com as linhas migradas
+            for source in sources:
+                self._reload_facts(source)
+
+    def _reload_facts(self, source):
+        # Fontes antigas podem não ter todas as colunas de FACT_COLUMNS
+        existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({source})")}
+        names = ", ".join(f'"{c}"' if c in existing else f'NULL AS "{c}"' for c in FACT_COLUMNS)
+        cursor = self.conn.execute(f"SELECT {names} FROM {source} ORDER BY rowid")
+
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            self.insert_facts(rows)
+
+        self.conn.execute(f"DROP TABLE {source}")
+
+    def _ensure_rollups(self):
+        """
+        rollup_events_daily: eventos por dia x vendor x event_type (chave 0
+        quando a dimensão é nula); daily_events tem os valores das dimensões.
+        rollup_amounts_daily separa também por status e currency ('' quando
+        nulos) e soma amount: daily_orders conta encomendas, pagamentos e
+        reembolsos, daily_revenue soma os seus valores por moeda (eventos sem
+        currency ficam de fora), sem conversão.
+        """
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_events_daily (
+                day TEXT NOT NULL,
+                vendor_key INTEGER NOT NULL,
+                event_type_key INTEGER NOT NULL,
+                events INTEGER NOT NULL,
+                PRIMARY KEY (day, vendor_key, event_type_key)
+            ) WITHOUT ROWID
+        """)
+
+        joins = """
+            FROM rollup_events_daily r
+            LEFT JOIN dim_vendor v ON v.vendor_key = r.vendor_key
+            LEFT JOIN dim_event_type t ON t.event_type_key = r.event_type_key
+        """
+        self.conn.execute(f"""
+            CREATE VIEW IF NOT EXISTS daily_events AS
+            SELECT r.day, v.vendor, t.event_type, r.events {joins}
+        """)
+
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_amounts_daily (
+                day TEXT NOT NULL,
+                vendor_key INTEGER NOT NULL,
+                event_type_key INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                currency TEXT NOT NULL,
+                events INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                PRIMARY KEY (day, vendor_key, event_type_key, status, currency)
+            ) WITHOUT ROWID
+        """)
+
+        amount_joins = joins.replace("rollup_events_daily", "rollup_amounts_daily")
+        metrics = ", ".join(
+            f"SUM(CASE WHEN {condition} THEN r.events ELSE 0 END) AS {name}"
+            for name, condition in ORDER_METRICS.items()
+        )
+        amounts = ", ".join(
+            f"SUM(CASE WHEN {ORDER_METRICS[metric]} THEN r.amount ELSE 0 END) AS {name}"
+            for name, metric in REVENUE_METRICS.items()
+        )
+        # Recriadas sempre: a definição acompanha ORDER_METRICS
+        self.conn.execute("DROP VIEW IF EXISTS daily_orders")
+        self.conn.execute(f"""
+            CREATE VIEW daily_orders AS
+            SELECT r.day, v.vendor, {metrics} {amount_joins}
+            GROUP BY r.day, r.vendor_key
+        """)
+        self.conn.execute("DROP VIEW IF EXISTS daily_revenue")
+        self.conn.execute(f"""
+            CREATE VIEW daily_revenue AS
+            SELECT r.day, v.vendor, r.currency, {amounts} {amount_joins}
+            WHERE r.currency <> ''
+            GROUP BY r.day, r.vendor_key, r.currency
+        """)
+
+    def _rollup_rows(self, table, where="1", params=()):
+        """
+        Soma aos rollups as linhas de uma partição que satisfazem where.
+        """
+        self.conn.execute(
+            f"""
+            INSERT INTO rollup_events_daily (day, vendor_key, event_type_key, events)
+            SELECT {ROLLUP_DAY_SQL}, COALESCE(vendor_key, 0), COALESCE(event_type_key, 0), COUNT(*)
+            FROM {table}
+            WHERE {where}
+            GROUP BY 1, 2, 3
+            ON CONFLICT (day, vendor_key, event_type_key) DO UPDATE SET events = events + excluded.events
+            """,
+            params,
+        )
+        self.conn.execute(
+            f"""
+            INSERT INTO rollup_amounts_daily (day, vendor_key, event_type_key, status, currency, events, amount)
+            SELECT {ROLLUP_DAY_SQL}, COALESCE(vendor_key, 0), COALESCE(event_type_key, 0),
+                   COALESCE(status, ''), COALESCE(currency, ''), COUNT(*), COALESCE(SUM(amount), 0)
+            FROM {table}
+            WHERE {where}
+            GROUP BY 1, 2, 3, 4, 5
+            ON CONFLICT (day, vendor_key, event_type_key, status, currency) DO UPDATE
+            SET events = events + excluded.events, amount = amount + excluded.amount
+            """,
+            params,
+        )
+
+    def rebuild_rollups(self):
+        """
+        Recalcula todos os rollups a partir das partições.
+        """
+        with self.transaction():
+            for rollup in ROLLUP_TABLES:
+                self.conn.execute(f"DELETE FROM {rollup}")
+            for table in self.partitions():
+                self._rollup_rows(table)
+
+    def rebuild_rollup_day(self, day):
+        """
+        Recalcula os rollups de um só dia ("YYYY-MM-DD", ou UNKNOWN_DAY para
+        os eventos sem data) a partir das partições desse dia.
+        """
+        with self.transaction():
+            for rollup in ROLLUP_TABLES:
+                self.conn.execute(f"DELETE FROM {rollup} WHERE day = ?", (day,))
+
+            if day == UNKNOWN_DAY:
+                if UNKNOWN_PARTITION in self.partitions():
+                    self._rollup_rows(UNKNOWN_PARTITION, "event_epoch IS NULL")
+                return
+
+            start = parse_timestamp(day)
+            end = start + 86400
+            for table in self.partitions(start, end):
+                self._rollup_rows(table, "event_epoch >= ? AND event_epoch < ?", (start, end))
+
+    def _refresh_fact_view(self):
+        """
+        fact_events_compact junta as partições tal como estão guardadas;
+        fact_events mantém as colunas de texto antigas para o SQL existente.
+        """
+        columns = ", ".join(PARTITION_COLUMNS)
+        tables = [row[0] for row in self.conn.execute("SELECT name FROM fact_partitions ORDER BY name")]
+
+        if tables:
+            body = " UNION ALL ".join(f"SELECT {columns} FROM {t}" for t in tables)
+        else:
+            body = "SELECT " + ", ".join(f"NULL AS {c}" for c in PARTITION_COLUMNS) + " WHERE 0"
+
+        names = ", ".join(f'"{c}"' for c in FACT_COLUMNS)
+
+        self.conn.execute("DROP VIEW IF EXISTS fact_events")
+        self.conn.execute("DROP VIEW IF EXISTS fact_events_compact")
+        self.conn.execute(f"CREATE VIEW fact_events_compact AS {body}")
+        self.conn.execute(
+            f"CREATE VIEW fact_events AS SELECT {names} FROM ({decoded_facts_sql('fact_events_compact')})"
+        )
+
+    def _ensure_partition(self, month):
+        """
+        Cria (se preciso) a tabela do mês "YYYYMM" ou a partição sem data (None).
+        """
+        name = UNKNOWN_PARTITION if month is None else f"{PARTITION_PREFIX}{month}"
+
+        exists = self.conn.execute("SELECT 1 FROM fact_partitions WHERE name = ?", (name,)).fetchone()
+        if exists:
+            return name
+
+        self.conn.execute(f"""
+            CREATE TABLE {name} (
+                event_id BLOB,
+                event_time TEXT,
+                event_epoch INTEGER,
+                ingested_at TEXT,
+                event_type_key INTEGER,
+                order_key INTEGER,
+                vendor_key INTEGER,
+                amount REAL,
+                currency TEXT,
+                status TEXT
+            )
+        """)
+        # O epoch de um evento é fixo por event_id, por isso cai sempre na mesma partição
+        self.conn.execute(f"CREATE UNIQUE INDEX ux_{name}_event_id ON {name}(event_id)")
+        self.conn.execute(f"CREATE INDEX ix_{name}_event_epoch ON {name}(event_epoch)")
+
+        start_epoch = end_epoch = None
+        if month is not None:
+            year, mon = int(month[:4]), int(month[4:])
+            start_epoch = calendar.timegm((year, mon, 1, 0, 0, 0))
+            end_epoch = calendar.timegm((year + mon // 12, mon % 12 + 1, 1, 0, 0, 0))
+
+        self.conn.execute(
+            "INSERT INTO fact_partitions (name, month, start_epoch, end_epoch) VALUES (?, ?, ?, ?)",
+            (name, month, start_epoch, end_epoch),
+        )
+        self._refresh_fact_view()
+        return name
+
+    def dimension_keys(self, column, values):
+        """
+        Chaves inteiras de uma dimensão para os valores dados, criando as que
+        faltam. Os valores já vistos vêm da cache em memória.
+        """
+        table, key = DIMENSIONS[column]
+        cache = self._dim_cache.setdefault(column, {})
+
+        if len(cache) > DIM_CACHE_MAX:
+            cache.clear()
+
+        missing = list({v for v in values if v is not None and v not in cache})
+
+        # Blocos abaixo do limite de parâmetros do SQLite
+        for i in range(0, len(missing), 500):
+            part = missing[i:i + 500]
+            self.conn.executemany(f'INSERT OR IGNORE INTO {table} ("{column}") VALUES (?)', [(v,) for v in part])
+            placeholders = ", ".join("?" for _ in part)
+            cache.update(self.conn.execute(
+                f'SELECT "{column}", {key} FROM {table} WHERE "{column}" IN ({placeholders})', part
+            ))
+
+        return [None if v is None else cache[v] for v in values]
+
+    def insert_facts(self, rows):
+        """
+        Insere linhas (na ordem de FACT_COLUMNS) na partição do mês de
+        event_epoch, ignorando event_id repetidos. Eventos atrasados caem no
+        mês a que pertencem; eventos sem data (incluindo o event_time de
+        preenchimento do bootstrap) ficam na partição sem data. Só as linhas
+        novas entram nos rollups, na mesma transação. Devolve quantas linhas
+        foram inseridas.
+
+        Durante o preenchimento de partições antigas (FACT_BACKFILL_STATE) um
+        event_id repetido sem amount/currency/status recebe os da linha nova;
+        finish_backfill() recalcula depois os rollups.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+
+        column = {c: i for i, c in enumerate(FACT_COLUMNS)}
+        epochs = fact_epochs(rows, column)
+
+        months = np.full(len(rows), None, dtype=object)
+        valid = epochs != NAT
+        months[valid] = np.datetime_as_string(epochs[valid].astype("datetime64[s]"), unit="M")
+
+        inserted = 0
+
+        with self.transaction():
+            type_keys = self.dimension_keys("event_type", [row[column["event_type"]] for row in rows])
+            order_keys = self.dimension_keys("order_id", [row[column["order_id"]] for row in rows])
+            vendor_keys = self.dimension_keys("vendor", [row[column["vendor"]] for row in rows])
+
+            by_month = {}
+            for i, (row, month, epoch, ok) in enumerate(zip(rows, months.tolist(), epochs.tolist(), valid.tolist())):
+                by_month.setdefault(month, []).append((
+                    encode_event_id(row[column["event_id"]]),
+                    row[column["event_time"]],
+                    epoch if ok else None,
+                    row[column["ingested_at"]],
+                    type_keys[i],
+                    order_keys[i],
+                    vendor_keys[i],
+                    row[column["amount"]],
+                    row[column["currency"]],
+                    row[column["status"]],
+                ))
+
+            backfill = self.get_state(FACT_BACKFILL_STATE) is not None
+
+            for month, partition_rows in by_month.items():
+                table = self._ensure_partition(None if month is None else month.replace("-", ""))
+
+                # Sem DELETEs nas partições, as linhas novas têm rowid acima do máximo atual
+                last_rowid = self.conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+                if backfill:
+                    added = self.insert_rows(
+                        table,
+                        PARTITION_COLUMNS,
+                        partition_rows,
+                        on_conflict=(
+                            "ON CONFLICT (event_id) DO UPDATE SET amount = excluded.amount, "
+                            "currency = excluded.currency, status = excluded.status "
+                            f"WHERE {table}.amount IS NULL AND {table}.currency IS NULL AND {table}.status IS NULL"
+                        ),
+                    )
+                else:
+                    added = self.insert_rows(table, PARTITION_COLUMNS, partition_rows, ignore=True)
+                if added:
+                    self._rollup_rows(table, "rowid > ?", (last_rowid,))
+                inserted += added
+
+        return inserted
+
+    def partitions(self, start=None, end=None):
+        """
+        Partições que podem ter eventos em [start, end). Sem intervalo
+        devolve todas; com intervalo a partição sem data fica de fora.
+        """
+        if start is None and end is None:
+            return [row[0] for row in self.conn.execute("SELECT name FROM fact_partitions ORDER BY name")]
+
+        start_epoch = parse_timestamp(start) if start is not None else None
+        end_epoch = parse_timestamp(end) if end is not None else None
+
+        return [
+            row[0]
+            for row in self.conn.execute(
+                """
+                SELECT name FROM fact_partitions
+                WHERE month IS NOT NULL
+                  AND (? IS NULL OR end_epoch > ?)
+                  AND (? IS NULL OR start_epoch < ?)
+                ORDER BY name
+                """,
+                (start_epoch, start_epoch, end_epoch, end_epoch),
+            )
+        ]
+
+    def query_facts(self, sql, start=None, end=None, params=()):
+        """
+        Executa sql sobre os factos, só nas partições do intervalo pedido.
+        O sql refere os factos como {facts}, com as colunas de fact_events,
+        event_epoch e as chaves das dimensões, por exemplo:
+          SELECT vendor, COUNT(*) AS n FROM {facts} GROUP BY vendor
+        """
+        columns = ", ".join(PARTITION_COLUMNS)
+        tables = self.partitions(start, end)
+
+        conditions = []
+        range_params = []
+        if start is not None:
+            conditions.append("event_epoch >= ?")
+            range_params.append(parse_timestamp(start))
+        if end is not None:
+            conditions.append("event_epoch < ?")
+            range_params.append(parse_timestamp(end))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        if tables:
+            body = " UNION ALL ".join(f"SELECT {columns} FROM {t}{where}" for t in tables)
+            all_params = range_params * len(tables)
+        else:
+            body = "SELECT " + ", ".join(f"NULL AS {c}" for c in PARTITION_COLUMNS) + " WHERE 0"
+            all_params = []
+
+        facts = f"({decoded_facts_sql(f'({body})')})"
+        return pd.read_sql(sql.format(facts=facts), self.conn, params=all_params + list(params))
+
+    def aggregate(self, by=("day",), measure="events", start=None, end=None, **filters):
+        """
+        Contagens agrupadas pelas colunas de FACT_GROUPS em `by`.
+
+        measure: "events" (número de eventos) ou "orders" (encomendas distintas).
+        filters: coluna=valor ou coluna=[valores], p.ex. event_type="order_created".
+
+        Lê rollup_events_daily quando ele chega para a pergunta (measure="events",
+        só day/vendor/event_type e intervalo em dias inteiros); senão lê as
+        partições. O DataFrame devolvido indica a origem em attrs["source"].
+        """
+        by = list(by)
+        unknown = [c for c in by + list(filters) if c not in FACT_GROUPS]
+        if unknown:
+            raise ValueError(f"Colunas desconhecidas: {unknown}")
+        if measure not in ("events", "orders"):
+            raise ValueError(f"Medida desconhecida: {measure}")
+
+        start_epoch = parse_timestamp(start) if start is not None else None
+        end_epoch = parse_timestamp(end) if end is not None else None
+
+        use_rollup = (
+            measure == "events"
+            and all(c in ROLLUP_GROUPS for c in by + list(filters))
+            and all(e is None or e % 86400 == 0 for e in (start_epoch, end_epoch))
+        )
+        columns = ROLLUP_GROUPS if use_rollup else FACT_GROUPS
+
+        conditions = []
+        params = []
+        for column, values in filters.items():
+            values = values if isinstance(values, (list, tuple, set)) else [values]
+            conditions.append(f"{columns[column]} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+
+        select = ", ".join(f"{columns[c]} AS {c}" for c in by)
+        group = f" GROUP BY {', '.join(columns[c] for c in by)} ORDER BY {', '.join(columns[c] for c in by)}" if by else ""
+
+        if use_rollup:
+            if start_epoch is not None or end_epoch is not None:
+                conditions.append(f"r.day <> '{UNKNOWN_DAY}'")
+            if start_epoch is not None:
+                conditions.append("r.day >= date(?, 'unixepoch')")
+                params.append(start_epoch)
+            if end_epoch is not None:
+                conditions.append("r.day < date(?, 'unixepoch')")
+                params.append(end_epoch)
+
+            where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+            frame = pd.read_sql(
+                f"""
+                SELECT {select + ', ' if by else ''}SUM(r.events) AS events
+                FROM rollup_events_daily r
+                LEFT JOIN dim_vendor v ON v.vendor_key = r.vendor_key
+                LEFT JOIN dim_event_type t ON t.event_type_key = r.event_type_key
+                {where}{group}
+                """,
+                self.conn,
+                params=params,
+            )
+            frame["events"] = frame["events"].fillna(0).astype("int64")
+            frame.attrs["source"] = "rollup"
+            return frame
+
+        value = "COUNT(*)" if measure == "events" else "COUNT(DISTINCT order_key)"
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        frame = self.query_facts(
+            f"SELECT {select + ', ' if by else ''}{value} AS {measure} FROM {{facts}}{where}{group}",
+            start,
+            end,
+            params,
+        )
+        frame.attrs["source"] = "facts"
+        return frame
+
+    def finish_backfill(self):
+        """
+        Fecha o preenchimento de partições antigas depois de uma carga
+        completa de events_curated: os rollups passam a somar os valores
+        preenchidos.
+        """
+        if self.get_state(FACT_BACKFILL_STATE) is None:
+            return
+
+        with self.transaction():
+            self.rebuild_rollups()
+            self.conn.execute("DELETE FROM load_state WHERE name = ?", (FACT_BACKFILL_STATE,))
+
+    def drop_partition(self, month):
+        """
+        Remove um mês inteiro ("YYYYMM") sem percorrer linhas. Os dias desse
+        mês saem dos rollups na mesma transação: só esta partição os tinha.
+        """
+        name = f"{PARTITION_PREFIX}{month}"
+        with self.transaction():
+            bounds = self.conn.execute(
+                "SELECT start_epoch, end_epoch FROM fact_partitions WHERE name = ?", (name,)
+            ).fetchone()
+            if bounds:
+                for rollup in ROLLUP_TABLES:
+                    self.conn.execute(
+                        f"DELETE FROM {rollup} WHERE day >= date(?, 'unixepoch') AND day < date(?, 'unixepoch')",
+                        bounds,
+                    )
+            self.conn.execute(f"DROP TABLE IF EXISTS {name}")
+            self.conn.execute("DELETE FROM fact_partitions WHERE name = ?", (name,))
+            self._refresh_fact_view()
+
+    def archive_partition(self, month, archive_path):
+        """
+        Copia um mês para outro ficheiro SQLite e remove-o do warehouse.
+        """
+        name = f"{PARTITION_PREFIX}{month}"
+        self.conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        try:
+            with self.transaction():
+                # Com os valores das dimensões, para o arquivo ser legível sozinho
+                self.conn.execute(f"CREATE TABLE archive.{name} AS {decoded_facts_sql(f'main.{name}')}")
+        finally:
+            self.conn.execute("DETACH DATABASE archive")
+
+        self.drop_partition(month)
+
+    def vacuum(self):
+        """
+        Devolve ao sistema o espaço das partições removidas.
+        """
+        self.conn.execute("VACUUM")
+
+    def get_state(self, name):
+        row = self.conn.execute("SELECT value FROM load_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
 
-def save(df, table):
-    conn = sqlite3.connect(DB_PATH)
-    df.to_sql(table, conn, if_exists="append", index=False)
-    conn.close()
+    def set_state(self, name, value):
+        self.conn.execute(
+            "INSERT INTO load_state (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, value),
+        )
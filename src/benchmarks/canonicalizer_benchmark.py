@@ -0,0 +1,70 @@
+"""
+Compara canonicalize_batch (coluna a coluna) com canonicalize_payload (linha a linha).
+
+Uso:
+  python -m src.benchmarks.canonicalizer_benchmark --events 1000000
+"""
+import argparse
+import datetime
+import random
+import time
+
+from src.live_event_generator import VENDORS, vendor_payload
+from src.transformation.canonicalizer import canonicalize_batch, canonicalize_payload
+
+EVENT_TYPES = ["order_created", "payment_succeeded", "refund_issued", "shipment_updated", "order_updated"]
+EVENT_WEIGHTS = [0.20, 0.33, 0.12, 0.25, 0.10]
+
+
+def generate_payloads(n, unique, drift_rate, seed):
+    """
+    Gera `unique` payloads com o gerador de eventos e repete-os até n.
+    """
+    random.seed(seed)
+    day_start = datetime.datetime(2025, 1, 15)
+
+    base = []
+    for i in range(min(unique, n)):
+        vendor = random.choice(VENDORS)
+        et = random.choices(EVENT_TYPES, weights=EVENT_WEIGHTS)[0]
+        dt = day_start + datetime.timedelta(seconds=random.randint(0, 86399))
+        amount = random.choice([5000, 9000, 12000, 18000, 25000, 40000, 65000])
+        payload = vendor_payload(et, vendor, f"ORD-250115-{i:05d}", dt, amount,
+                                 schema_drift=random.random() < drift_rate)
+        base.append((vendor, payload))
+
+    repeats, rest = divmod(n, len(base))
+    return base * repeats + base[:rest]
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--events", type=int, default=1_000_000)
+    p.add_argument("--unique", type=int, default=100_000, help="Payloads distintos gerados")
+    p.add_argument("--chunk-size", type=int, default=100_000, help="Payloads por canonicalize_batch")
+    p.add_argument("--schema-drift-rate", type=float, default=0.15)
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args()
+
+    events = generate_payloads(args.events, args.unique, args.schema_drift_rate, args.seed)
+    vendors = [v for v, _ in events]
+    payloads = [pl for _, pl in events]
+
+    start = time.perf_counter()
+    for vendor, payload in events:
+        canonicalize_payload(vendor, payload)
+    row_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(events), args.chunk_size):
+        canonicalize_batch(vendors[i:i + args.chunk_size], payloads[i:i + args.chunk_size])
+    batch_seconds = time.perf_counter() - start
+
+    print(f"Eventos: {len(events)}")
+    print(f"Linha a linha: {row_seconds:.2f}s ({len(events) / row_seconds:,.0f} eventos/s)")
+    print(f"Em lote:       {batch_seconds:.2f}s ({len(events) / batch_seconds:,.0f} eventos/s)")
+    print(f"Speedup:       {row_seconds / batch_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Compara a reconstrução antiga de order_metrics (um dict por encomenda) com
+o motor compacto de order_state, em memória e com runs em disco.
+Cada variante corre num processo novo para medir o pico de RSS.
+
+Uso:
+  python -m src.benchmarks.order_rebuild_benchmark --events 5000000
+"""
+import argparse
+import multiprocessing
+import random
+import resource
+import sys
+import time
+
+from src.analytics.order_metrics_builder import event_datetime
+from src.analytics.order_state import rebuild_order_states
+
+EVENT_TYPES = ["order_created", "payment_succeeded", "refund_issued", "shipment_updated", "order_updated"]
+EVENT_WEIGHTS = [0.20, 0.33, 0.12, 0.25, 0.10]
+
+
+def generate_events(n, orders, seed):
+    """
+    Eventos curados sintéticos, gerados um a um (não contam para o RSS).
+    """
+    rng = random.Random(seed)
+    start = 1_735_689_600
+    for i in range(n):
+        yield {
+            "event_id": f"{i:064x}",
+            "event_type": rng.choices(EVENT_TYPES, weights=EVENT_WEIGHTS)[0],
+            "order_id": f"ORD-{rng.randrange(orders):09d}",
+            "event_epoch": start + rng.randrange(90 * 86400),
+        }
+
+
+def dict_rebuild(events):
+    # Implementação original de order_metrics_builder.main
+    orders = {}
+
+    for ev in events:
+        order_id = ev.get("order_id")
+        if not order_id:
+            continue
+
+        t = event_datetime(ev)
+        if not t:
+            continue
+
+        rec = orders.setdefault(order_id, {
+            "order_id": order_id,
+            "created_at": None,
+            "paid_at": None,
+            "delivered_at": None,
+            "refund_count": 0
+        })
+
+        et = ev["event_type"]
+
+        if et == "order_created":
+            rec["created_at"] = t
+        elif et == "payment_succeeded":
+            rec["paid_at"] = t
+        elif et == "shipment_updated":
+            rec["delivered_at"] = t
+        elif et == "refund_issued":
+            rec["refund_count"] += 1
+
+    count = 0
+    for _ in orders.values():
+        count += 1
+    return count
+
+
+def run_variant(args):
+    name, n, orders, seed, budget_mb = args
+    events = generate_events(n, orders, seed)
+
+    start = time.perf_counter()
+    stats = {}
+    if name == "dict":
+        written = dict_rebuild(events)
+    else:
+        written = sum(1 for _ in rebuild_order_states(events, memory_budget_mb=budget_mb, stats=stats))
+    seconds = time.perf_counter() - start
+
+    # ru_maxrss em KB no Linux, em bytes no macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+    return name, written, seconds, rss_mb, stats.get("runs", 0)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--events", type=int, default=5_000_000)
+    p.add_argument("--orders", type=int, default=None, help="Encomendas distintas (por omissão events / 4)")
+    p.add_argument("--spill-budget-mb", type=int, default=64, help="Orçamento da variante com runs em disco")
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args()
+
+    orders = args.orders or max(args.events // 4, 1)
+    variants = [
+        ("dict", 0),
+        ("compacto", 1_000_000),
+        ("compacto + disco", args.spill_budget_mb),
+    ]
+
+    print(f"Eventos: {args.events}  encomendas: {orders}")
+
+    ctx = multiprocessing.get_context("spawn")
+    for name, budget in variants:
+        with ctx.Pool(1) as pool:
+            name, written, seconds, rss_mb, runs = pool.apply(
+                run_variant, ((name, args.events, orders, args.seed, budget),)
+            )
+        extra = f"  runs={runs}" if runs else ""
+        print(f"{name:<18} {seconds:8.2f}s  pico RSS {rss_mb:8.1f}MB  encomendas={written}{extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+Benchmark do pipeline completo a várias escalas, no armazenamento embebido.
+
+Para cada escala gera (uma vez, com seeds fixas) dias de eventos com o
+live_event_generator e corre as etapas por ordem, cada uma num processo
+novo: bootstrap, carga live, transformação, carga do warehouse, métricas
+por encomenda e relatório de qualidade. Por etapa ficam eventos/s,
+latência p50/p99 por lote e pico de RSS num ficheiro JSON; com --baseline
+os resultados são comparados com um ficheiro anterior e as regressões
+acima da tolerância são assinaladas (código de saída 1).
+
+Uso:
+  python -m src.benchmarks.pipeline_benchmark --scale 10k --scale 100k
+  python -m src.benchmarks.pipeline_benchmark --scale 1m --baseline bench/baseline.json
+  python -m src.benchmarks.pipeline_benchmark --no-run --out bench/results.json --baseline bench/baseline.json
+"""
+import argparse
+import functools
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+SCALES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+STAGES = ["bootstrap", "live", "transform", "warehouse", "order_metrics", "quality"]
+
+# Eventos gerados por dia (antes dos duplicados do gerador)
+EVENTS_PER_DAY = int(os.getenv("BENCH_EVENTS_PER_DAY", "20000"))
+
+FIRST_DAY = date(2025, 1, 1)
+
+# Métricas comparadas com a baseline: True quando maior é melhor
+COMPARED_METRICS = {
+    "events_per_sec": True,
+    "batch_p50_ms": False,
+    "batch_p99_ms": False,
+    "peak_rss_mb": False,
+}
+
+
+# --------------------------------------------------
+# Dados
+# --------------------------------------------------
+
+def generate_dataset(directory, events, seed, events_per_day=EVENTS_PER_DAY):
+    """
+    Dias de eventos live em directory/live_events, gerados só se ainda não
+    existirem com os mesmos parâmetros (modo --start/--end do gerador, com
+    seeds por dia derivadas de seed).
+    """
+    live_dir = directory / "live_events"
+    days = max(1, math.ceil(events / events_per_day))
+    per_day = math.ceil(events / days)
+    spec = {"events": events, "days": days, "seed": seed, "events_per_day": per_day, "mode": "range"}
+
+    spec_path = directory / "dataset.json"
+    if spec_path.exists() and json.loads(spec_path.read_text()) == spec:
+        return live_dir, days
+
+    shutil.rmtree(live_dir, ignore_errors=True)
+    live_dir.mkdir(parents=True)
+
+    start = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable, "-m", "src.live_event_generator",
+            "--out", str(live_dir),
+            "--start", FIRST_DAY.isoformat(),
+            "--end", (FIRST_DAY + timedelta(days=days - 1)).isoformat(),
+            "--events", str(per_day),
+            "--seed", str(seed),
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+    spec_path.write_text(json.dumps(spec))
+    print(f"Gerados {days} dia(s) em {time.perf_counter() - start:.1f}s: {live_dir}")
+    return live_dir, days
+
+
+def stage_environment(directory):
+    """
+    Variáveis de ambiente que apontam todo o estado das etapas para directory.
+    """
+    return {
+        "STORAGE_BACKEND": "embedded",
+        "MONGO_DB": os.getenv("MONGO_DB", "commercepulse"),
+        "EMBEDDED_STORE_PATH": str(directory / "store.db"),
+        "WAREHOUSE_DB_PATH": str(directory / "warehouse.db"),
+        "LIVE_MANIFEST_PATH": str(directory / "live_ingest_manifest.json"),
+        "LIVE_BLOOM_PATH": str(directory / "events_raw.bloom"),
+        "MONGO_COMMAND_METRICS": "0",
+    }
+
+
+def reset_state(directory):
+    for name in ("store.db", "warehouse.db", "live_ingest_manifest.json", "events_raw.bloom"):
+        for suffix in ("", "-wal", "-shm"):
+            path = directory / f"{name}{suffix}"
+            if path.exists():
+                path.unlink()
+
+
+# --------------------------------------------------
+# Medição dentro de cada etapa
+# --------------------------------------------------
+
+def time_calls(samples, owner, name):
+    """
+    Substitui owner.name por uma versão que regista a duração de cada chamada.
+    """
+    fn = getattr(owner, name)
+
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+
+    setattr(owner, name, timed)
+
+
+def time_intervals(samples, owner, name):
+    """
+    Regista o tempo entre chamadas consecutivas de owner.name (a primeira
+    conta desde agora): para lotes cujo trabalho não está numa só função.
+    """
+    fn = getattr(owner, name)
+    last = [time.perf_counter()]
+
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        result = fn(*args, **kwargs)
+        now = time.perf_counter()
+        samples.append(now - last[0])
+        last[0] = now
+        return result
+
+    setattr(owner, name, timed)
+
+
+def time_items(samples, owner, name, every):
+    """
+    Para um gerador: regista o tempo de cada bloco de every itens consumidos
+    (inclui o trabalho de quem consome).
+    """
+    fn = getattr(owner, name)
+
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        last = time.perf_counter()
+        n = 0
+        for item in fn(*args, **kwargs):
+            yield item
+            n += 1
+            if n % every == 0:
+                now = time.perf_counter()
+                samples.append(now - last)
+                last = now
+        if n % every:
+            samples.append(time.perf_counter() - last)
+
+    setattr(owner, name, timed)
+
+
+def stage_bootstrap(samples, live_dir):
+    from src import bootstrap_loader
+
+    time_calls(samples, bootstrap_loader, "flush_batch")
+    return sum(bootstrap_loader.process_file(filename) for filename in bootstrap_loader.EVENT_TYPE_MAP)
+
+
+def stage_live(samples, live_dir):
+    from src import live_events_loader as loader
+    from src.config.mongo_client import get_database
+
+    time_calls(samples, loader, "insert_chunk")
+    collection = get_database(loader.DB_NAME, profile="bulk")["events_raw"]
+    inserted, duplicates = loader.ingest_pass(
+        Path(live_dir), collection, loader.CHUNK_SIZE, loader.WORKERS,
+        loader.load_bloom_filter(collection), loader.load_manifest(),
+    )
+    return inserted + duplicates
+
+
+def stage_transform(samples, live_dir):
+    from src.config.mongo_client import get_mongo_client
+    from src.transformation import events_transformer
+
+    events = get_mongo_client()[events_transformer.DB_NAME].events_raw.estimated_document_count()
+    time_calls(samples, events_transformer, "transform_batch")
+    events_transformer.transform_events()
+    return events
+
+
+def stage_warehouse(samples, live_dir):
+    from src.config.mongo_client import get_mongo_client
+    from src.transformation import events_transformer
+
+    time_calls(samples, events_transformer, "load_warehouse_chunk")
+    return events_transformer.load_to_warehouse(get_mongo_client()[events_transformer.DB_NAME].events_curated)
+
+
+def stage_order_metrics(samples, live_dir):
+    from src.analytics import order_metrics_builder
+    from src.config.mongo_client import get_mongo_client
+
+    events = get_mongo_client()[order_metrics_builder.DB_NAME].events_curated.estimated_document_count()
+    time_items(samples, order_metrics_builder, "rebuild_order_states", order_metrics_builder.BATCH_SIZE)
+    order_metrics_builder.main()
+    return events
+
+
+def stage_quality(samples, live_dir):
+    from src.analytics import quality_report
+    from src.analytics.warehouse_simulator import Warehouse
+
+    # Um lote = leitura de um bloco + todas as verificações sobre ele
+    time_intervals(samples, quality_report.CHECKS[-1], "update")
+    with Warehouse() as warehouse:
+        quality_report.run_checks(warehouse)
+        return warehouse.execute("SELECT COUNT(*) FROM fact_events").fetchone()[0]
+
+
+STAGE_FUNCTIONS = {
+    "bootstrap": stage_bootstrap,
+    "live": stage_live,
+    "transform": stage_transform,
+    "warehouse": stage_warehouse,
+    "order_metrics": stage_order_metrics,
+    "quality": stage_quality,
+}
+
+
+def run_stage(args):
+    """
+    Corre uma etapa (num processo novo, com o ambiente já definido).
+    """
+    stage, live_dir = args
+    samples = []
+
+    start = time.perf_counter()
+    events = STAGE_FUNCTIONS[stage](samples, live_dir) or 0
+    seconds = time.perf_counter() - start
+
+    # ru_maxrss em KB no Linux, em bytes no macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+    latencies = np.array(samples) * 1000
+    return {
+        "events": int(events),
+        "seconds": round(seconds, 3),
+        "events_per_sec": round(events / seconds, 1) if seconds else None,
+        "batches": len(samples),
+        "batch_p50_ms": round(float(np.percentile(latencies, 50)), 2) if len(samples) else None,
+        "batch_p99_ms": round(float(np.percentile(latencies, 99)), 2) if len(samples) else None,
+        "peak_rss_mb": round(rss_mb, 1),
+    }
+
+
+def run_scale(name, work_dir, seed, events_per_day, stages=STAGES):
+    """
+    Corre as etapas pedidas sobre estado novo. As etapas anteriores de que
+    dependem (p.ex. bootstrap e live antes de --stage transform) correm
+    também, mas não entram nos resultados.
+    """
+    directory = Path(work_dir) / name
+    directory.mkdir(parents=True, exist_ok=True)
+    live_dir, days = generate_dataset(directory, SCALES[name], seed, events_per_day)
+
+    reset_state(directory)
+    os.environ.update(stage_environment(directory))
+
+    last = max(STAGES.index(stage) for stage in stages)
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for stage in STAGES[:last + 1]:
+        with ctx.Pool(1) as pool:
+            result = pool.apply(run_stage, ((stage, str(live_dir)),))
+        if stage not in stages:
+            print(f"[{name}] {stage:<14} {result['seconds']:8.2f}s (preparação, não medida)")
+            continue
+        results[stage] = result
+        print(
+            f"[{name}] {stage:<14} {result['seconds']:8.2f}s {result['events_per_sec'] or 0:>12,.0f} eventos/s "
+            f"p50 {result['batch_p50_ms'] or 0:8.1f}ms p99 {result['batch_p99_ms'] or 0:8.1f}ms "
+            f"pico RSS {result['peak_rss_mb']:7.1f}MB"
+        )
+
+    return {"events": SCALES[name], "days": days, "stages": results}
+
+
+# --------------------------------------------------
+# Comparação com a baseline
+# --------------------------------------------------
+
+def compare(baseline, current, tolerance):
+    """
+    Linhas (escala, etapa, métrica, baseline, atual, variação, regressão)
+    para as escalas/etapas presentes nos dois ficheiros.
+    """
+    rows = []
+    for scale, result in current["scales"].items():
+        base_scale = baseline["scales"].get(scale)
+        if base_scale is None:
+            continue
+
+        for stage, metrics in result["stages"].items():
+            base_metrics = base_scale["stages"].get(stage)
+            if base_metrics is None:
+                continue
+
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                old, new = base_metrics.get(metric), metrics.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                regression = -change > tolerance if higher_is_better else change > tolerance
+                rows.append((scale, stage, metric, old, new, change, regression))
+
+    return rows
+
+
+def print_comparison(rows, tolerance):
+    print(f"\n=== COMPARAÇÃO COM A BASELINE (tolerância {tolerance:.0%}) ===")
+    print(f"{'escala':<6} {'etapa':<14} {'métrica':<15} {'baseline':>12} {'atual':>12} {'variação':>9}")
+    for scale, stage, metric, old, new, change, regression in rows:
+        flag = "  REGRESSÃO" if regression else ""
+        print(f"{scale:<6} {stage:<14} {metric:<15} {old:>12,.1f} {new:>12,.1f} {change:>+8.1%}{flag}")
+    print("=" * 58 + "\n")
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--scale", action="append", choices=list(SCALES),
+                   help="Escala a correr (repetível; por omissão 10k)")
+    p.add_argument("--stage", action="append", choices=STAGES, help="Só estas etapas (por omissão todas)")
+    p.add_argument("--events-per-day", type=int, default=EVENTS_PER_DAY)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--work-dir", default="data/state/bench", help="Dados gerados e estado das etapas")
+    p.add_argument("--out", default="data/state/bench/results.json", help="Ficheiro JSON de resultados")
+    p.add_argument("--baseline", default=None, help="Resultados anteriores a comparar")
+    p.add_argument("--tolerance", type=float, default=0.15, help="Variação aceite antes de ser regressão")
+    p.add_argument("--no-run", action="store_true", help="Só compara --out com --baseline")
+    args = p.parse_args()
+
+    out = Path(args.out)
+
+    if args.no_run:
+        current = json.loads(out.read_text())
+    else:
+        current = {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "backend": "embedded",
+            "seed": args.seed,
+            "events_per_day": args.events_per_day,
+            "scales": {},
+        }
+        for scale in args.scale or ["10k"]:
+            current["scales"][scale] = run_scale(
+                scale, args.work_dir, args.seed, args.events_per_day, args.stage or STAGES
+            )
+
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(current, indent=2))
+        print(f"Resultados em {out}")
+
+    if args.baseline:
+        rows = compare(json.loads(Path(args.baseline).read_text()), current, args.tolerance)
+        print_comparison(rows, args.tolerance)
+        if any(row[-1] for row in rows):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
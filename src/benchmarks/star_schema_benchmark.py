@@ -0,0 +1,132 @@
+"""
+Compara a fact_events antiga (colunas de texto) com o esquema em estrela
+(event_id binário + chaves de dim_vendor, dim_event_type e dim_order):
+tamanho do ficheiro e tempo de consultas de agregação.
+
+Uso:
+  python -m src.benchmarks.star_schema_benchmark --rows 1000000
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+from src.analytics.warehouse_simulator import FACT_COLUMNS, Warehouse
+
+QUERIES = {
+    "eventos por vendor e tipo": (
+        "SELECT vendor, event_type, COUNT(*) FROM fact_events GROUP BY vendor, event_type",
+        """
+        SELECT v.vendor, t.event_type, c.n
+        FROM (
+            SELECT vendor_key, event_type_key, COUNT(*) AS n
+            FROM fact_events_compact GROUP BY vendor_key, event_type_key
+        ) c
+        JOIN dim_vendor v ON v.vendor_key = c.vendor_key
+        JOIN dim_event_type t ON t.event_type_key = c.event_type_key
+        """,
+    ),
+    "encomendas distintas": (
+        "SELECT COUNT(DISTINCT order_id) FROM fact_events",
+        "SELECT COUNT(DISTINCT order_key) FROM fact_events_compact",
+    ),
+    "procura por event_id": (
+        "SELECT COUNT(*) FROM fact_events WHERE event_id IN ({ids})",
+        "SELECT COUNT(*) FROM fact_events_compact WHERE event_id IN ({ids})",
+    ),
+}
+
+
+def fact_rows(n):
+    vendors = ["vendor_a", "vendor_b", "vendor_c"]
+    types = ["order_created", "payment_succeeded", "refund_issued", "shipment_updated", "order_updated"]
+    return [
+        (
+            hashlib.sha256(str(i).encode()).hexdigest(),
+            f"2025-{1 + i % 3:02d}-{1 + i % 28:02d}T{i % 24:02d}:00:00Z",
+            types[i % 5],
+            f"2025-{1 + i % 3:02d}-{1 + i % 28:02d}T{i % 24:02d}:30:00Z",
+            f"ORD-{i // 6:08d}",
+            vendors[i % 3],
+            None,
+            float(1000 + i % 50 * 100),
+            ["NGN", "USD"][i % 2],
+            "SUCCESS",
+        )
+        for i in range(n)
+    ]
+
+
+def file_size(warehouse):
+    warehouse.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(warehouse.path)
+
+
+def timed_query(warehouse, sql, params=(), repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        warehouse.execute(sql, params).fetchall()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--chunk-size", type=int, default=50_000)
+    args = p.parse_args()
+
+    rows = fact_rows(args.rows)
+    lookups = [rows[i][0] for i in range(0, len(rows), max(1, len(rows) // 500))][:500]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        flat = Warehouse(os.path.join(tmp, "flat.db"))
+        star = Warehouse(os.path.join(tmp, "star.db"))
+
+        start = time.perf_counter()
+        flat.execute(f"CREATE TABLE fact_events ({', '.join(c + ' TEXT' for c in FACT_COLUMNS)})")
+        flat.execute("CREATE UNIQUE INDEX ux_fact_events_event_id ON fact_events(event_id)")
+        for i in range(0, len(rows), args.chunk_size):
+            flat.insert_rows("fact_events", FACT_COLUMNS, rows[i:i + args.chunk_size], ignore=True)
+        flat_load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        star.ensure_fact_table()
+        for i in range(0, len(rows), args.chunk_size):
+            star.insert_facts(rows[i:i + args.chunk_size])
+        star_load = time.perf_counter() - start
+
+        flat_size = file_size(flat)
+        star_size = file_size(star)
+
+        print(f"Linhas: {len(rows)}")
+        print(f"{'carga':<28} texto {flat_load:8.2f}s   estrela {star_load:8.2f}s")
+        print(f"{'tamanho':<28} texto {flat_size / 2**20:7.1f}MB   estrela {star_size / 2**20:7.1f}MB"
+              f"   ({flat_size / star_size:.1f}x menor)")
+
+        placeholders = ", ".join("?" for _ in lookups)
+        binary_lookups = [bytes.fromhex(e) for e in lookups]
+
+        for label, (flat_sql, star_sql) in QUERIES.items():
+            if "{ids}" in flat_sql:
+                flat_seconds = timed_query(flat, flat_sql.format(ids=placeholders), lookups)
+                star_seconds = timed_query(star, star_sql.format(ids=placeholders), binary_lookups)
+            else:
+                flat_seconds = timed_query(flat, flat_sql)
+                star_seconds = timed_query(star, star_sql)
+            print(f"{label:<28} texto {flat_seconds:8.3f}s   estrela {star_seconds:8.3f}s"
+                  f"   ({flat_seconds / star_seconds:.1f}x)")
+
+        # O SQL antigo continua a funcionar sobre a view de compatibilidade
+        compat = timed_query(star, QUERIES["eventos por vendor e tipo"][0])
+        print(f"{'view fact_events (compat.)':<28} {compat:8.3f}s")
+
+        flat.close()
+        star.close()
+
+
+if __name__ == "__main__":
+    main()
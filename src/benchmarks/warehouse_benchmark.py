@@ -0,0 +1,102 @@
+"""
+Compara o antigo warehouse_simulator.save com a classe Warehouse.
+
+Uso:
+  python -m src.benchmarks.warehouse_benchmark --rows 1000000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+from src.analytics.warehouse_simulator import FACT_COLUMNS, Warehouse
+
+
+def legacy_save(df, table, db_path):
+    # Implementação original de warehouse_simulator.save
+    conn = sqlite3.connect(db_path)
+    df.to_sql(table, conn, if_exists="append", index=False)
+    conn.close()
+
+
+def fact_rows(n):
+    vendors = ["vendor_a", "vendor_b", "vendor_c"]
+    types = ["order_created", "payment_succeeded", "refund_issued", "shipment_updated", "order_updated"]
+    return [
+        (
+            f"{i:064x}",
+            f"2025-01-{1 + i % 28:02d}T{i % 24:02d}:00:00Z",
+            types[i % 5],
+            f"2025-01-{1 + i % 28:02d}T{i % 24:02d}:30:00Z",
+            f"ORD-{i // 6:08d}",
+            vendors[i % 3],
+            None,
+            float(1000 + i % 50 * 100),
+            ["NGN", "USD"][i % 2],
+            "SUCCESS",
+        )
+        for i in range(n)
+    ]
+
+
+def timed(label, n, fn):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        start = time.perf_counter()
+        fn(db_path)
+        seconds = time.perf_counter() - start
+    print(f"{label:<40} {seconds:7.2f}s  {n / seconds:>12,.0f} linhas/s")
+    return seconds
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--chunk-size", type=int, default=5000, help="Linhas por chamada (carga incremental)")
+    args = p.parse_args()
+
+    rows = fact_rows(args.rows)
+    chunks = [rows[i:i + args.chunk_size] for i in range(0, len(rows), args.chunk_size)]
+    frames = [pd.DataFrame(chunk, columns=FACT_COLUMNS) for chunk in chunks]
+    create = f"CREATE TABLE fact_events ({', '.join(c + ' TEXT' for c in FACT_COLUMNS)})"
+
+    print(f"Linhas: {len(rows)}  (blocos de {args.chunk_size})")
+
+    def legacy_per_chunk(db_path):
+        for df in frames:
+            legacy_save(df, "fact_events", db_path)
+
+    def warehouse_per_chunk(db_path):
+        with Warehouse(db_path) as warehouse:
+            warehouse.execute(create)
+            for chunk in chunks:
+                warehouse.insert_rows("fact_events", FACT_COLUMNS, chunk)
+
+    def warehouse_dedup(db_path):
+        with Warehouse(db_path) as warehouse:
+            warehouse.ensure_fact_table()
+            for chunk in chunks:
+                warehouse.insert_facts(chunk)
+
+    def legacy_single(db_path):
+        legacy_save(pd.DataFrame(rows, columns=FACT_COLUMNS), "fact_events", db_path)
+
+    def warehouse_single(db_path):
+        with Warehouse(db_path) as warehouse:
+            warehouse.execute(create)
+            warehouse.insert_rows("fact_events", FACT_COLUMNS, rows)
+
+    legacy = timed("save() por bloco", len(rows), legacy_per_chunk)
+    tuned = timed("Warehouse.insert_rows por bloco", len(rows), warehouse_per_chunk)
+    timed("Warehouse.insert_facts (partições)", len(rows), warehouse_dedup)
+    timed("save() numa só chamada", len(rows), legacy_single)
+    timed("Warehouse.insert_rows numa só chamada", len(rows), warehouse_single)
+
+    print(f"Speedup por bloco: {legacy / tuned:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import hashlib
+import math
+import os
+import struct
+
+_MAGIC = b"CPBF"
+_HEADER = struct.Struct("<4sQQQQ")  # magic, num_bits, num_hashes, capacity, count
+
+
+class BloomFilter:
+    """
+    Conjunto probabilístico de strings (ex.: event_id).
+
+    "x in filtro" nunca dá falso negativo; pode dar falso positivo com
+    probabilidade ~error_rate enquanto count <= capacity.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(int(capacity), 1)
+        num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+
+        self.num_bits = max(num_bits, 8)
+        self.num_hashes = max(round(self.num_bits / capacity * math.log(2)), 1)
+        self.capacity = capacity
+        self.count = 0
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def is_saturated(self):
+        return self.count > self.capacity
+
+    def save(self, path):
+        """
+        Grava o filtro de forma atómica (ficheiro temporário + rename).
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, self.num_bits, self.num_hashes, self.capacity, self.count))
+            f.write(self.bits)
+
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            magic, num_bits, num_hashes, capacity, count = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"{path}: não é um ficheiro de Bloom filter")
+            bits = bytearray(f.read())
+
+        if len(bits) != (num_bits + 7) // 8:
+            raise ValueError(f"{path}: Bloom filter truncado")
+
+        bloom = cls.__new__(cls)
+        bloom.num_bits = num_bits
+        bloom.num_hashes = num_hashes
+        bloom.capacity = capacity
+        bloom.count = count
+        bloom.bits = bits
+        return bloom
@@ -1,26 +1,31 @@
+import argparse
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import islice
 
-from pymongo import MongoClient
-from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
-from hash_utils import generate_event_id
+from src.config.mongo_client import command_stage, get_database, print_command_report
+from src.hash_utils import generate_event_ids
+from src.time_utils import PLACEHOLDER_EVENT_TIME
 
 # --------------------------------------------------
 # Configuração
 # --------------------------------------------------
 
-load_dotenv()
+BOOTSTRAP_PATH = "data/bootstrap"
 
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB = os.getenv("MONGO_DB")
+# Número de upserts enviados por cada bulk_write
+BATCH_SIZE = int(os.getenv("BOOTSTRAP_BATCH_SIZE", "1000"))
 
-client = MongoClient(MONGO_URI)
-db = client[MONGO_DB]
-events_collection = db["events_raw"]
+# Registos cujo event_id é calculado de uma vez (em paralelo com --hash-workers)
+HASH_BATCH_SIZE = int(os.getenv("BOOTSTRAP_HASH_BATCH_SIZE", "20000"))
 
-BOOTSTRAP_PATH = "data/bootstrap"
+# Caracteres lidos do ficheiro de cada vez pelo leitor incremental
+READ_CHUNK_SIZE = int(os.getenv("BOOTSTRAP_READ_CHUNK_SIZE", str(1 << 20)))
 
 EVENT_TYPE_MAP = {
     "orders_2023.json": "order_historical",
@@ -33,61 +38,179 @@ EVENT_TYPE_MAP = {
 # Funções
 # --------------------------------------------------
 
-def load_json(file_path):
+def iter_json_array(file_path, chunk_size=READ_CHUNK_SIZE):
+    """
+    Lê um ficheiro no formato [ {...}, {...} ] e devolve um registo de cada vez.
+    Só mantém em memória o bloco atual (chunk_size) e o registo a ser lido.
+    """
+    decoder = json.JSONDecoder()
+
     with open(file_path, "r") as f:
-        return json.load(f)
+        buffer = ""
+        pos = 0
+        eof = False
+        expect = "["  # "[" -> "value_or_end" -> ("," | "]") -> "value" ...
+
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+
+            if pos == len(buffer):
+                if eof:
+                    raise ValueError(f"{file_path}: array JSON incompleto")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = chunk, 0
+                continue
+
+            char = buffer[pos]
+
+            if expect == "[":
+                if char != "[":
+                    raise ValueError(f"{file_path}: esperado um array JSON")
+                pos += 1
+                expect = "value_or_end"
+                continue
+
+            if expect in ("value_or_end", "sep") and char == "]":
+                return
+
+            if expect == "sep":
+                if char != ",":
+                    raise ValueError(f"{file_path}: esperado ',' na posição {pos}")
+                pos += 1
+                expect = "value"
+                continue
+
+            # Valor completo só quando o decoder não chega ao fim do buffer
+            # (um número no fim do bloco pode estar cortado).
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+                complete = end < len(buffer) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+
+            if not complete:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+
+            yield record
+            pos = end
+            expect = "sep"
+
+
+def events_collection():
+    """
+    events_raw no cliente partilhado; o bootstrap pode ser repetido, por isso
+    usa o perfil "bulk" (sem esperar pelo journal).
+    """
+    return get_database(profile="bulk")["events_raw"]
+
+
+def flush_batch(batch):
+    """
+    Envia um lote de upserts ($setOnInsert) num único bulk_write não ordenado.
+    Devolve o número de documentos realmente inseridos.
+    """
+    if not batch:
+        return 0
+
+    operations = [
+        UpdateOne(
+            {"event_id": event_id},
+            {"$setOnInsert": event_document},
+            upsert=True,
+        )
+        for event_id, event_document in batch.items()
+    ]
 
+    try:
+        result = events_collection().bulk_write(operations, ordered=False)
+        return result.upserted_count
+    except BulkWriteError as e:
+        return e.details.get("nUpserted", 0)
 
-def process_file(filename):
+
+def process_file(filename, batch_size=BATCH_SIZE, executor=None):
     file_path = os.path.join(BOOTSTRAP_PATH, filename)
-    records = load_json(file_path)
+    records = iter_json_array(file_path)
 
     event_type = EVENT_TYPE_MAP[filename]
 
     inserted = 0
 
-    for record in records:
-        event_time = record.get("created_at") or record.get("timestamp") or "1970-01-01T00:00:00"
-        vendor = record.get("vendor", "unknown")
-
-        event_id = generate_event_id(
-            event_type=event_type,
-            event_time=event_time,
-            vendor=vendor,
-            payload=record,
-        )
-
-        event_document = {
-            "event_id": event_id,
-            "event_type": event_type,
-            "event_time": event_time,
-            "vendor": vendor,
-            "payload": record,
-            "ingested_at": datetime.utcnow(),
-            "source": "historical_bootstrap",
-        }
-
-        result = events_collection.update_one(
-            {"event_id": event_id},
-            {"$setOnInsert": event_document},
-            upsert=True,
-        )
-
-        if result.upserted_id:
-            inserted += 1
+    # event_id -> documento; repetidos dentro do mesmo lote são descartados
+    batch = {}
+
+    while True:
+        keys = [
+            (
+                event_type,
+                record.get("created_at") or record.get("timestamp") or PLACEHOLDER_EVENT_TIME,
+                record.get("vendor", "unknown"),
+                record,
+            )
+            for record in islice(records, HASH_BATCH_SIZE)
+        ]
+
+        if not keys:
+            break
+
+        event_ids = generate_event_ids(keys, executor=executor)
+
+        for (_, event_time, vendor, record), event_id in zip(keys, event_ids):
+            if event_id in batch:
+                continue
+
+            batch[event_id] = {
+                "event_id": event_id,
+                "event_type": event_type,
+                "event_time": event_time,
+                "vendor": vendor,
+                "payload": record,
+                "ingested_at": datetime.utcnow(),
+                "source": "historical_bootstrap",
+            }
+
+            if len(batch) >= batch_size:
+                inserted += flush_batch(batch)
+                batch = {}
+
+    inserted += flush_batch(batch)
 
     print(f"{filename}: {inserted} novos eventos inseridos.")
 
+    return inserted
+
 
 # --------------------------------------------------
 # Execução
 # --------------------------------------------------
 
 def main():
-    for filename in EVENT_TYPE_MAP.keys():
-        process_file(filename)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Número de upserts por bulk_write")
+    parser.add_argument("--hash-workers", type=int, default=1,
+                        help="Processos usados para calcular os event_ids")
+    args = parser.parse_args()
+
+    executor = ProcessPoolExecutor(args.hash_workers) if args.hash_workers > 1 else None
+
+    try:
+        with command_stage("bootstrap"):
+            for filename in EVENT_TYPE_MAP.keys():
+                process_file(filename, batch_size=max(args.batch_size, 1), executor=executor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
     print("✅ Bootstrap histórico concluído.")
+    print_command_report()
 
 
 if __name__ == "__main__":
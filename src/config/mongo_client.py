@@ -1,20 +1,232 @@
+"""
+Cliente MongoDB partilhado pelo processo.
+
+get_mongo_client() devolve sempre o mesmo MongoClient (um pool de ligações
+por URI). Os perfis de write concern são aplicados por base de dados /
+coleção em get_database(), sem abrir novos pools. Com MONGO_COMMAND_METRICS
+ativo, um CommandListener regista a latência de cada comando por etapa do
+pipeline (ver command_stage e print_command_report); com MONGO_COMMAND_BYTES
+regista também os bytes enviados/recebidos.
+
+Com STORAGE_BACKEND=embedded o "cliente" é o armazenamento SQLite local de
+src.db.embedded_store, com a mesma interface: os loaders, a transformação
+e as métricas correm sem alterações e sem servidor MongoDB.
+"""
+import bisect
 import os
-from pymongo import MongoClient
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import bson
 from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+from pymongo.write_concern import WriteConcern
 
 load_dotenv()
 
+# "mongo" (MONGO_URI) ou "embedded" (SQLite em EMBEDDED_STORE_PATH)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+
+# Ligações por servidor no pool partilhado
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+
+# Compressão do protocolo, p.ex. "zstd,snappy,zlib" (vazio = sem compressão;
+# num servidor local costuma custar mais CPU do que poupa)
+COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+
+# Perfis de write concern: "bulk" para cargas em massa que se podem repetir
+# (sem esperar pelo journal), "durable" para escritas que não se podem perder
+WRITE_CONCERNS = {
+    "default": WriteConcern(),
+    "bulk": WriteConcern(w=1, j=False),
+    "durable": WriteConcern(w="majority", j=True),
+}
+
+# Regista latência por comando (MONGO_COMMAND_METRICS=0 desativa)
+COMMAND_METRICS = os.getenv("MONGO_COMMAND_METRICS", "1") != "0"
+
+# Bytes por comando: volta a serializar em BSON cada comando e resposta
+# (lotes de insert/bulk_write, batches dos cursores), por isso só a pedido
+COMMAND_BYTES = os.getenv("MONGO_COMMAND_BYTES", "0") == "1"
+
+# Limites dos baldes do histograma de latência, em ms
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+_stage = ContextVar("mongo_stage", default="other")
+
+
+@contextmanager
+def command_stage(name):
+    """
+    Os comandos enviados dentro do bloco (na mesma thread) contam para esta etapa.
+    """
+    token = _stage.set(name)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Por (etapa, comando): número, falhas, tempo total, histograma de
+    latência e bytes enviados/recebidos (BSON dos comandos e respostas).
+    """
+
+    def __init__(self, count_bytes=False):
+        self.count_bytes = count_bytes
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _entry(self, command_name):
+        key = (_stage.get(), command_name)
+        entry = self._stats.get(key)
+        if entry is None:
+            entry = self._stats.setdefault(key, {
+                "count": 0,
+                "failed": 0,
+                "seconds": 0.0,
+                "bytes_sent": 0,
+                "bytes_received": 0,
+                "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            })
+        return entry
+
+    def record(self, command_name, millis, failed=False, bytes_received=0):
+        with self._lock:
+            entry = self._entry(command_name)
+            entry["count"] += 1
+            entry["failed"] += int(failed)
+            entry["seconds"] += millis / 1000
+            entry["bytes_received"] += bytes_received
+            entry["histogram"][bisect.bisect_left(LATENCY_BUCKETS_MS, millis)] += 1
+
+    def _record(self, event, failed, reply=None):
+        size = len(bson.encode(reply)) if self.count_bytes and reply is not None else 0
+        self.record(event.command_name, event.duration_micros / 1000, failed, size)
+
+    def started(self, event):
+        if not self.count_bytes:
+            return
+        size = len(bson.encode(event.command))
+        with self._lock:
+            self._entry(event.command_name)["bytes_sent"] += size
+
+    def succeeded(self, event):
+        self._record(event, False, event.reply)
+
+    def failed(self, event):
+        self._record(event, True)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(entry, histogram=list(entry["histogram"])) for key, entry in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def percentile_ms(histogram, fraction):
+    """
+    Limite superior do balde onde cai o percentil (None acima do último).
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    target = fraction * total
+    seen = 0
+    for i, n in enumerate(histogram):
+        seen += n
+        if seen >= target:
+            return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None
+    return None
+
+
+command_metrics = CommandMetrics(count_bytes=COMMAND_BYTES)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
 def get_mongo_client():
+    """
+    MongoClient partilhado (um por MONGO_URI), criado na primeira chamada;
+    com STORAGE_BACKEND=embedded, o armazenamento local equivalente.
+    """
+    if STORAGE_BACKEND == "embedded":
+        return get_embedded_client()
+
     mongo_uri = os.getenv("MONGO_URI")
     if not mongo_uri:
         raise ValueError("MONGO_URI não encontrada no .env")
 
-    return MongoClient(mongo_uri)
+    client = _clients.get(mongo_uri)
+    if client is not None:
+        return client
 
-def get_database():
-    client = get_mongo_client()
-    db_name = os.getenv("MONGO_DB")
+    with _clients_lock:
+        if mongo_uri not in _clients:
+            options = {"maxPoolSize": MAX_POOL_SIZE, "minPoolSize": MIN_POOL_SIZE}
+            if COMPRESSORS:
+                options["compressors"] = COMPRESSORS
+            if COMMAND_METRICS:
+                options["event_listeners"] = [command_metrics]
+            _clients[mongo_uri] = MongoClient(mongo_uri, **options)
+        return _clients[mongo_uri]
+
+
+def get_embedded_client():
+    """
+    Armazenamento embebido partilhado (um por ficheiro).
+    """
+    from src.db.embedded_store import STORE_PATH, EmbeddedClient
+
+    path = os.getenv("EMBEDDED_STORE_PATH", STORE_PATH)
+    with _clients_lock:
+        key = f"embedded:{path}"
+        if key not in _clients:
+            _clients[key] = EmbeddedClient(path)
+        return _clients[key]
+
+
+def close_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def get_database(name=None, profile="default"):
+    """
+    Base de dados (MONGO_DB por omissão) com o write concern do perfil.
+    """
+    db_name = name or os.getenv("MONGO_DB")
     if not db_name:
         raise ValueError("MONGO_DB não encontrada no .env")
 
-    return client[db_name]
+    return get_mongo_client().get_database(db_name, write_concern=WRITE_CONCERNS[profile])
+
+
+def print_command_report(metrics=command_metrics):
+    stats = metrics.snapshot()
+    if not stats:
+        return
+
+    print(f"\n=== {'EMBEDDED STORE' if STORAGE_BACKEND == 'embedded' else 'MONGODB'} COMMANDS ===")
+    header = f"{'etapa':<22} {'comando':<16} {'n':>8} {'falhas':>6} {'total':>9} {'p50':>7} {'p99':>7}"
+    print(header + (f" {'enviado':>10} {'recebido':>10}" if metrics.count_bytes else ""))
+    for (stage, command), entry in sorted(stats.items(), key=lambda item: -item[1]["seconds"]):
+        p50 = percentile_ms(entry["histogram"], 0.50)
+        p99 = percentile_ms(entry["histogram"], 0.99)
+        line = (
+            f"{stage:<22} {command:<16} {entry['count']:>8} {entry['failed']:>6} {entry['seconds']:>8.2f}s "
+            f"{'>' if p50 is None else '≤'}{p50 or LATENCY_BUCKETS_MS[-1]:>5}ms "
+            f"{'>' if p99 is None else '≤'}{p99 or LATENCY_BUCKETS_MS[-1]:>5}ms"
+        )
+        if metrics.count_bytes:
+            line += f" {entry['bytes_sent'] / 2**20:>8.1f}MB {entry['bytes_received'] / 2**20:>8.1f}MB"
+        print(line)
+    print("========================\n")
@@ -0,0 +1,149 @@
+"""
+Executor de DAG em processo.
+
+Cada tarefa declara as suas dependências; as tarefas prontas correm ao mesmo
+tempo num pool de threads (ou de processos). Para cada tarefa fica registado
+o tempo, o número de linhas devolvido pela função e o número de tentativas.
+Quando uma tarefa falha (depois das novas tentativas), as que dependem dela
+não correm.
+"""
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+SUCCESS = "success"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+@dataclass
+class Task:
+    name: str
+    fn: object
+    deps: tuple = ()
+    retries: int = 0
+    retry_delay: float = 1.0
+
+
+@dataclass
+class TaskResult:
+    name: str
+    status: str
+    seconds: float = 0.0
+    rows: object = None
+    attempts: int = 0
+    error: str = None
+    deps: tuple = field(default_factory=tuple)
+
+
+def _run_task(fn, retries, retry_delay):
+    """
+    Corre no worker: tenta até retries + 1 vezes. Devolve
+    (ok, linhas ou erro, tentativas, segundos).
+    """
+    start = time.perf_counter()
+    attempts = 0
+
+    while True:
+        attempts += 1
+        try:
+            rows = fn()
+            return True, rows, attempts, time.perf_counter() - start
+        except Exception:
+            if attempts > retries:
+                return False, traceback.format_exc(), attempts, time.perf_counter() - start
+            time.sleep(retry_delay * attempts)
+
+
+class DAG:
+
+    def __init__(self, name):
+        self.name = name
+        self.tasks = {}
+
+    def add(self, name, fn, deps=(), retries=0, retry_delay=1.0):
+        """
+        Regista uma tarefa. fn não recebe argumentos e pode devolver o número
+        de linhas processadas. Com executor="process", fn tem de ser picklable.
+        """
+        if name in self.tasks:
+            raise ValueError(f"Tarefa repetida: {name}")
+        self.tasks[name] = Task(name, fn, tuple(deps), retries, retry_delay)
+        return name
+
+    def validate(self):
+        for task in self.tasks.values():
+            missing = [d for d in task.deps if d not in self.tasks]
+            if missing:
+                raise ValueError(f"{task.name}: dependências desconhecidas {missing}")
+
+        # Kahn: se sobrar alguma tarefa há um ciclo
+        pending = {name: set(task.deps) for name, task in self.tasks.items()}
+        while pending:
+            ready = [name for name, deps in pending.items() if not deps]
+            if not ready:
+                raise ValueError(f"Ciclo entre as tarefas: {sorted(pending)}")
+            for name in ready:
+                del pending[name]
+            for deps in pending.values():
+                deps.difference_update(ready)
+
+    def run(self, max_workers=4, executor="thread"):
+        """
+        Corre o DAG e devolve {nome: TaskResult}.
+        """
+        self.validate()
+
+        pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        results = {}
+        running = {}
+
+        def blocked(task):
+            return any(results.get(d) is not None and results[d].status != SUCCESS for d in task.deps)
+
+        with pool_class(max_workers=max_workers) as pool:
+            while len(results) < len(self.tasks):
+                for task in self.tasks.values():
+                    if task.name in results or task.name in running.values():
+                        continue
+
+                    if blocked(task):
+                        failed = [d for d in task.deps if results.get(d) and results[d].status != SUCCESS]
+                        results[task.name] = TaskResult(
+                            task.name, SKIPPED, error=f"dependência falhou: {', '.join(failed)}", deps=task.deps
+                        )
+                        print(f"[{self.name}] {task.name}: ignorada ({', '.join(failed)} falhou)")
+                        continue
+
+                    if all(results.get(d) is not None for d in task.deps):
+                        print(f"[{self.name}] {task.name}: a correr")
+                        future = pool.submit(_run_task, task.fn, task.retries, task.retry_delay)
+                        running[future] = task.name
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    task = self.tasks[name]
+                    ok, value, attempts, seconds = future.result()
+
+                    if ok:
+                        results[name] = TaskResult(name, SUCCESS, seconds, value, attempts, deps=task.deps)
+                        print(f"[{self.name}] {name}: ok em {seconds:.2f}s")
+                    else:
+                        results[name] = TaskResult(name, FAILED, seconds, None, attempts, value, deps=task.deps)
+                        print(f"[{self.name}] {name}: falhou após {attempts} tentativa(s)\n{value}")
+
+        return results
+
+
+def print_summary(results):
+    print("\n=== DAG ===")
+    print(f"{'tarefa':<40} {'estado':<8} {'tempo':>8} {'linhas':>10} {'tent.':>5}")
+    for result in results.values():
+        rows = "" if result.rows is None else result.rows
+        print(f"{result.name:<40} {result.status:<8} {result.seconds:7.2f}s {rows!s:>10} {result.attempts:>5}")
+    print("===========\n")
@@ -1,22 +1,122 @@
-import subprocess
+import os
+from functools import partial
+from pathlib import Path
+
+from src.bootstrap_loader import EVENT_TYPE_MAP, process_file
+from src.config.mongo_client import command_stage, get_database, print_command_report
+from src.dags.executor import DAG, FAILED, print_summary
+from src.live_events_loader import (
+    BLOOM_PATH,
+    CHUNK_SIZE,
+    DB_NAME,
+    ingest_file,
+    load_bloom_filter,
+    load_manifest,
+    save_manifest,
+)
 from src.transformation.events_transformer import main as transform_run
 
-def task_bootstrap():
-    print("STEP 1 — BOOTSTRAP")
-    subprocess.run(["python", "src/bootstrap_loader.py"])
+# Tarefas a correr ao mesmo tempo (as cargas são sobretudo espera pelo MongoDB)
+DAG_WORKERS = int(os.getenv("DAG_WORKERS", "4"))
+
+# Novas tentativas por tarefa antes de desistir
+DAG_RETRIES = int(os.getenv("DAG_RETRIES", "2"))
+
+# "thread" ou "process" (ver DAG.run)
+DAG_EXECUTOR = os.getenv("DAG_EXECUTOR", "thread")
+
+LIVE_EVENTS_DIR = Path("data/live_events")
+
+# Estado partilhado pelas tarefas live (mesmo processo, threads do DAG)
+_live = {}
+
+
+def run_staged(stage, fn):
+    with command_stage(stage):
+        return fn()
+
+
+def staged(stage, fn):
+    """
+    fn com os comandos MongoDB atribuídos à etapa (as threads do DAG não
+    herdam o contexto de quem as criou). Um partial de funções do módulo,
+    por isso picklable para executor="process" se fn também o for.
+    """
+    return partial(run_staged, stage, fn)
+
+
+def task_bootstrap_file(filename):
+    return process_file(filename)
+
+
+def task_live_prepare():
+    collection = get_database(DB_NAME, profile="bulk")["events_raw"]
+    _live.update(
+        collection=collection,
+        bloom=load_bloom_filter(collection),
+        manifest=load_manifest(),
+    )
+
+
+def task_live_file(path):
+    inserted, _ = ingest_file(path, _live["collection"], CHUNK_SIZE, _live["bloom"], _live["manifest"])
+    return inserted
+
+
+def task_live_finish():
+    save_manifest(_live["manifest"])
+    if _live["bloom"] is not None:
+        _live["bloom"].save(BLOOM_PATH)
+
+
+def task_live_all(paths):
+    """
+    prepare, os ficheiros e finish numa só tarefa, para quando as tarefas
+    não partilham o processo (_live).
+    """
+    task_live_prepare()
+    try:
+        return sum(task_live_file(path) for path in paths)
+    finally:
+        task_live_finish()
+
+
+def build_pipeline(executor=DAG_EXECUTOR):
+    """
+    bootstrap (um ficheiro por tarefa) e live (um dia por tarefa) correm em
+    paralelo; a transformação espera pelos dois. Com executor="process" o
+    live é uma só tarefa: o Bloom filter e o manifest vivem num processo.
+    """
+    dag = DAG("commerce_pulse")
+
+    bootstrap = [
+        dag.add(f"bootstrap:{filename}", staged("bootstrap", partial(task_bootstrap_file, filename)), retries=DAG_RETRIES)
+        for filename in EVENT_TYPE_MAP
+    ]
+
+    paths = sorted(LIVE_EVENTS_DIR.glob("*/events.jsonl"))
+    if executor == "process":
+        finish = dag.add("live", staged("live", partial(task_live_all, paths)), retries=DAG_RETRIES)
+    else:
+        prepare = dag.add("live:prepare", staged("live", task_live_prepare), retries=DAG_RETRIES)
+        live = [
+            dag.add(f"live:{path.parent.name}", staged("live", partial(task_live_file, path)), deps=[prepare], retries=DAG_RETRIES)
+            for path in paths
+        ]
+        finish = dag.add("live:finish", task_live_finish, deps=live or [prepare])
+
+    dag.add("transform", staged("transform", transform_run), deps=bootstrap + [finish], retries=DAG_RETRIES)
+
+    return dag
 
-def task_live_events():
-    print("STEP 2 — LIVE EVENTS")
-    subprocess.run(["python", "src/live_events_loader.py"])
 
-def task_transform():
-    print("STEP 3 — TRANSFORM")
-    transform_run()
+def pipeline(executor=DAG_EXECUTOR):
+    results = build_pipeline(executor).run(max_workers=DAG_WORKERS, executor=executor)
+    print_summary(results)
+    # Com executor="process" os comandos foram registados nos workers
+    print_command_report()
+    return not any(r.status == FAILED for r in results.values())
 
-def pipeline():
-    task_bootstrap()
-    task_live_events()
-    task_transform()
 
 if __name__ == "__main__":
-    pipeline()
+    raise SystemExit(0 if pipeline() else 1)
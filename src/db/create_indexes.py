@@ -15,6 +15,12 @@ def main():
     events.create_index("event_time")
     events.create_index("vendor")
     events.create_index("event_type")
+    # Pré-filtro das janelas --since/--until do relatório de qualidade
+    events.create_index("ingested_at")
+
+    curated = db.events_curated
+    curated.create_index("event_id", unique=True)
+    curated.create_index("order_id")
 
     print("Índices criados com sucesso.")
 
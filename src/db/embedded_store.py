@@ -0,0 +1,875 @@
+"""
+Armazenamento embebido (SQLite) com a parte da API do pymongo que o
+pipeline usa, para correr cargas e benchmarks locais sem servidor MongoDB.
+
+Cada coleção é uma tabela com o documento em BSON e algumas colunas
+indexadas extraídas dele: _id (único, ordena os cursores), event_id (único
+em todas as coleções, guardado em bytes como no warehouse) e os campos
+pedidos com create_index. Os filtros sobre essas colunas vão para o SQL;
+o resto do filtro é avaliado em Python sobre o documento.
+
+Suportado: insert_one/insert_many, bulk_write (InsertOne, UpdateOne,
+UpdateMany, ReplaceOne, DeleteOne, DeleteMany), update_one/update_many,
+replace_one, delete_one/delete_many, find/find_one (projeção, sort,
+limit, batch_size), count_documents, estimated_document_count e
+create_index. Operadores de consulta: igualdade, $eq, $ne, $gt, $gte, $lt,
+$lte, $in, $nin, $exists, $and, $or. Operadores de atualização: $set,
+$setOnInsert, $unset, $inc, $min, $max. Os erros e resultados são os do
+pymongo (BulkWriteError, DuplicateKeyError, BulkWriteResult, ...).
+
+Não há aggregate: o relatório src.quality_reports.events_quality_report
+calcula aqui as mesmas métricas com pandas (frame_facets).
+"""
+import functools
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import bson
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from src.analytics.warehouse_simulator import encode_event_id
+from src.config.mongo_client import COMMAND_METRICS, command_metrics
+
+# Ficheiro SQLite com todas as bases de dados / coleções
+STORE_PATH = os.getenv("EMBEDDED_STORE_PATH", "data/state/event_store.db")
+
+# Documentos lidos por página quando o cursor não pede batch_size
+DEFAULT_BATCH_SIZE = 1000
+
+# Acima disto um $in não vai para o SQL (limite de parâmetros do SQLite)
+MAX_IN_PARAMS = 10000
+
+# Uma ligação partilhada: WAL, cache de 64 MB e ficheiro mapeado em memória
+STORE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": "-65536",
+    "mmap_size": str(1 << 30),
+    "temp_store": "MEMORY",
+}
+
+DUPLICATE_KEY_ERROR = 11000
+
+RANGE_OPERATORS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+class DuplicateKey(Exception):
+    pass
+
+
+# --------------------------------------------------
+# Valores, comparação e filtros ao estilo MongoDB
+# --------------------------------------------------
+
+def _type_rank(value):
+    """
+    Ordem entre tipos do MongoDB (null < números < texto < objeto < ...).
+    """
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, bytes):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def compare(a, b):
+    rank_a, rank_b = _type_rank(a), _type_rank(b)
+    if rank_a != rank_b:
+        return -1 if rank_a < rank_b else 1
+    if a == b:
+        return 0
+    try:
+        return -1 if a < b else 1
+    except TypeError:
+        return -1 if repr(a) < repr(b) else 1
+
+
+def get_path(doc, path):
+    """
+    (existe, valor) de um campo, com caminhos "a.b".
+    """
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return False, None
+        value = value[part]
+    return True, value
+
+
+def set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def unset_path(doc, path):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _equals(value, target):
+    if isinstance(value, list) and not isinstance(target, list):
+        return any(compare(v, target) == 0 for v in value)
+    return compare(value, target) == 0
+
+
+def _in_range(value, op, target):
+    values = value if isinstance(value, list) else [value]
+    for v in values:
+        if _type_rank(v) != _type_rank(target):
+            continue
+        c = compare(v, target)
+        if (op == "$gt" and c > 0) or (op == "$gte" and c >= 0) or (op == "$lt" and c < 0) or (op == "$lte" and c <= 0):
+            return True
+    return False
+
+
+def _is_operator_dict(cond):
+    return isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond)
+
+
+def _match_condition(found, value, cond):
+    if not _is_operator_dict(cond):
+        return _equals(value, cond)
+
+    for op, arg in cond.items():
+        if op == "$eq":
+            ok = _equals(value, arg)
+        elif op == "$ne":
+            ok = not _equals(value, arg)
+        elif op == "$in":
+            ok = any(_equals(value, a) for a in arg)
+        elif op == "$nin":
+            ok = not any(_equals(value, a) for a in arg)
+        elif op in RANGE_OPERATORS:
+            ok = found and _in_range(value, op, arg)
+        elif op == "$exists":
+            ok = found == bool(arg)
+        else:
+            raise NotImplementedError(f"Operador não suportado no armazenamento embebido: {op}")
+        if not ok:
+            return False
+
+    return True
+
+
+def matches(doc, query):
+    for field, cond in query.items():
+        if field == "$and":
+            ok = all(matches(doc, q) for q in cond)
+        elif field == "$or":
+            ok = any(matches(doc, q) for q in cond)
+        elif field.startswith("$"):
+            raise NotImplementedError(f"Operador não suportado no armazenamento embebido: {field}")
+        else:
+            ok = _match_condition(*get_path(doc, field), cond)
+        if not ok:
+            return False
+    return True
+
+
+def project(doc, projection):
+    """
+    Projeção de inclusão ({"a": 1, "b.c": 1}) ou de exclusão ({"a": 0}).
+    """
+    if not projection:
+        return doc
+
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+
+    include = [f for f, v in projection.items() if v and f != "_id"]
+    keep_id = projection.get("_id", 1)
+
+    if not include:
+        for field, v in projection.items():
+            if not v:
+                unset_path(doc, field)
+        return doc
+
+    tree = {}
+    for field in include:
+        set_path(tree, field, True)
+    if keep_id:
+        tree["_id"] = True
+    return _include(doc, tree)
+
+
+def _include(doc, tree):
+    """
+    Campos incluídos pela ordem do documento (como no MongoDB).
+    """
+    result = {}
+    for key, value in doc.items():
+        branch = tree.get(key)
+        if branch is True:
+            result[key] = value
+        elif branch and isinstance(value, dict):
+            result[key] = _include(value, branch)
+    return result
+
+
+def apply_update(doc, update, inserting):
+    """
+    Aplica os operadores de atualização ao documento (alterado no lugar).
+    """
+    for op, fields in update.items():
+        if op == "$setOnInsert":
+            if not inserting:
+                continue
+            op = "$set"
+
+        for path, value in fields.items():
+            if op == "$set":
+                set_path(doc, path, value)
+            elif op == "$unset":
+                unset_path(doc, path)
+            elif op == "$inc":
+                found, current = get_path(doc, path)
+                set_path(doc, path, (current if found else 0) + value)
+            elif op in ("$min", "$max"):
+                found, current = get_path(doc, path)
+                c = compare(value, current) if found else None
+                if c is None or (op == "$min" and c < 0) or (op == "$max" and c > 0):
+                    set_path(doc, path, value)
+            else:
+                raise NotImplementedError(f"Operador não suportado no armazenamento embebido: {op}")
+
+
+def upsert_seed(query):
+    """
+    Documento inicial de um upsert: os campos de igualdade do filtro.
+    """
+    doc = {}
+    for field, cond in query.items():
+        if field.startswith("$"):
+            continue
+        if _is_operator_dict(cond):
+            if "$eq" in cond:
+                set_path(doc, field, cond["$eq"])
+            continue
+        set_path(doc, field, cond)
+    return doc
+
+
+def index_value(value):
+    """
+    Valor guardado numa coluna indexada; None para o que não é escalar.
+    """
+    if isinstance(value, ObjectId):
+        return value.binary
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float, str, bytes)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return None
+
+
+def _pushable(value):
+    return isinstance(value, (str, int, float, bytes, ObjectId)) and not isinstance(value, bool)
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sort_spec(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    return [(k, d) for k, d in key_or_list]
+
+
+def _sort_key(spec):
+    def cmp(a, b):
+        for field, direction in spec:
+            c = compare(get_path(a, field)[1], get_path(b, field)[1])
+            if c:
+                return c * direction
+        return 0
+    return functools.cmp_to_key(cmp)
+
+
+@contextmanager
+def _command(name):
+    """
+    Conta o comando nas métricas partilhadas (mesmo relatório do MongoDB);
+    name=None para leituras internas de outro comando.
+    """
+    if not COMMAND_METRICS or name is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        command_metrics.record(name, (time.perf_counter() - start) * 1000, failed)
+
+
+def _synchronous(write_concern):
+    """
+    PRAGMA synchronous equivalente ao perfil de write concern.
+    """
+    document = write_concern.document if write_concern is not None else {}
+    if document.get("j") or document.get("w") == "majority":
+        return "FULL"
+    if document.get("j") is False:
+        return "OFF"
+    return "NORMAL"
+
+
+# --------------------------------------------------
+# Cliente, base de dados, coleção e cursor
+# --------------------------------------------------
+
+class EmbeddedClient:
+    """
+    Equivalente local de MongoClient: uma ligação SQLite partilhada pelas
+    threads do processo (as escritas são serializadas por um lock).
+    """
+
+    def __init__(self, path=STORE_PATH, pragmas=None):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=60)
+        self.lock = threading.RLock()
+        self._synchronous = None
+        self._collections = {}
+
+        for name, value in (STORE_PRAGMAS if pragmas is None else pragmas).items():
+            self.conn.execute(f"PRAGMA {name} = {value}")
+        self._synchronous = (STORE_PRAGMAS if pragmas is None else pragmas).get("synchronous")
+
+    def __getitem__(self, name):
+        return self.get_database(name)
+
+    def get_database(self, name, write_concern=None, **kwargs):
+        return EmbeddedDatabase(self, name, write_concern)
+
+    def list_database_names(self):
+        return sorted({name.split(".", 1)[0] for name in self._table_names()})
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _table_names(self):
+        return [
+            row[0] for row in self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%.%'"
+            )
+        ]
+
+    def set_synchronous(self, level):
+        if level != self._synchronous:
+            self.conn.execute(f"PRAGMA synchronous = {level}")
+            self._synchronous = level
+
+    @contextmanager
+    def transaction(self, synchronous="NORMAL"):
+        with self.lock:
+            self.set_synchronous(synchronous)
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def collection_state(self, table):
+        """
+        Cria a tabela se não existir; devolve as colunas indexadas (partilhadas
+        por todos os objetos EmbeddedCollection da mesma tabela).
+        """
+        with self.lock:
+            state = self._collections.get(table)
+            if state is None:
+                self.conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {_quote(table)} ("
+                    "seq INTEGER PRIMARY KEY, _id NOT NULL UNIQUE, event_id UNIQUE, doc BLOB NOT NULL)"
+                )
+                columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({_quote(table)})")]
+                state = self._collections[table] = [c for c in columns if c not in ("seq", "doc")]
+            return state
+
+
+class EmbeddedDatabase:
+
+    def __init__(self, client, name, write_concern=None):
+        self.client = client
+        self.name = name
+        self.write_concern = write_concern
+
+    def __getitem__(self, name):
+        return self.get_collection(name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_collection(name)
+
+    def get_collection(self, name, write_concern=None, **kwargs):
+        return EmbeddedCollection(self, name, write_concern or self.write_concern)
+
+    def create_collection(self, name, **kwargs):
+        return self.get_collection(name)
+
+    def list_collection_names(self):
+        prefix = f"{self.name}."
+        return sorted(t[len(prefix):] for t in self.client._table_names() if t.startswith(prefix))
+
+    def drop_collection(self, name):
+        self.get_collection(name).drop()
+
+
+class EmbeddedCollection:
+
+    def __init__(self, database, name, write_concern=None):
+        self.database = database
+        self.name = name
+        self.write_concern = write_concern
+        self.full_name = f"{database.name}.{name}"
+
+        self._client = database.client
+        self._conn = self._client.conn
+        self._table = _quote(self.full_name)
+        self._columns = self._client.collection_state(self.full_name)
+
+    def with_options(self, write_concern=None, **kwargs):
+        return EmbeddedCollection(self.database, self.name, write_concern or self.write_concern)
+
+    # ---------- linhas ----------
+
+    def _column_value(self, column, value):
+        if column == "event_id":
+            value = encode_event_id(value)
+        return index_value(value)
+
+    def _row(self, doc):
+        return [self._column_value(c, get_path(doc, c)[1]) for c in self._columns] + [bson.encode(doc)]
+
+    def _insert_sql(self, verb="INSERT"):
+        columns = ", ".join(_quote(c) for c in self._columns)
+        marks = ", ".join("?" * (len(self._columns) + 1))
+        return f"{verb} INTO {self._table} ({columns}, doc) VALUES ({marks})"
+
+    def _insert(self, doc):
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        try:
+            self._conn.execute(self._insert_sql(), self._row(doc))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKey(str(e))
+        return doc["_id"]
+
+    def _update_row(self, seq, doc):
+        assignments = ", ".join(f"{_quote(c)} = ?" for c in self._columns)
+        try:
+            self._conn.execute(
+                f"UPDATE {self._table} SET {assignments}, doc = ? WHERE seq = ?", self._row(doc) + [seq]
+            )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKey(str(e))
+
+    def _where(self, query):
+        """
+        Parte do filtro que as colunas indexadas resolvem em SQL. O filtro
+        completo volta a ser avaliado em Python, por isso basta que isto
+        devolva um superconjunto.
+        """
+        clauses = []
+        params = []
+
+        for field, cond in (query or {}).items():
+            if field not in self._columns:
+                continue
+
+            column = _quote(field)
+            if not _is_operator_dict(cond):
+                cond = {"$eq": cond}
+
+            for op, arg in cond.items():
+                if op == "$eq" and _pushable(arg):
+                    clauses.append(f"{column} = ?")
+                    params.append(self._column_value(field, arg))
+                elif op in RANGE_OPERATORS and _pushable(arg):
+                    clauses.append(f"{column} {RANGE_OPERATORS[op]} ?")
+                    params.append(self._column_value(field, arg))
+                elif op == "$in" and 0 < len(arg) <= MAX_IN_PARAMS and all(_pushable(a) for a in arg):
+                    clauses.append(f"{column} IN ({', '.join('?' * len(arg))})")
+                    params.extend(self._column_value(field, a) for a in arg)
+
+        return clauses, params
+
+    def _rows(self, query, batch_size=DEFAULT_BATCH_SIZE, order="seq", command="find"):
+        """
+        (seq, documento) que passam o filtro, por ordem de seq ou de _id.
+        Lê por páginas (keyset), sem manter o lock entre páginas.
+        """
+        query = query or {}
+        clauses, params = self._where(query)
+        last = None
+        name = command
+
+        while True:
+            page_clauses = list(clauses)
+            page_params = list(params)
+            if last is not None:
+                page_clauses.append(f"{order} > ?")
+                page_params.append(last)
+
+            where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+            sql = f"SELECT seq, {order}, doc FROM {self._table} {where} ORDER BY {order} LIMIT {int(batch_size)}"
+
+            with _command(name), self._client.lock:
+                page = self._conn.execute(sql, page_params).fetchall()
+            name = name and "getMore"
+
+            for seq, _, blob in page:
+                doc = bson.decode(blob)
+                if matches(doc, query):
+                    yield seq, doc
+
+            if len(page) < batch_size:
+                return
+            last = page[-1][1]
+
+    def _matching(self, query, limit=0):
+        rows = self._rows(query, order="seq", command=None)
+        return list(rows) if not limit else [row for _, row in zip(range(limit), rows)]
+
+    # ---------- escrita ----------
+
+    def insert_one(self, document):
+        with _command("insert"), self._client.transaction(_synchronous(self.write_concern)):
+            try:
+                inserted_id = self._insert(document)
+            except DuplicateKey as e:
+                raise DuplicateKeyError(f"E11000 duplicate key error: {e}", DUPLICATE_KEY_ERROR)
+        return InsertOneResult(inserted_id, True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        """
+        Insere tudo num executemany; se houver chaves repetidas repete o lote
+        linha a linha para saber quais falharam (como o MongoDB, devolve
+        BulkWriteError com writeErrors e nInserted).
+        """
+        documents = list(documents)
+        for doc in documents:
+            if "_id" not in doc:
+                doc["_id"] = ObjectId()
+        rows = [self._row(doc) for doc in documents]
+
+        errors = []
+        inserted = 0
+
+        with _command("insert"), self._client.transaction(_synchronous(self.write_concern)):
+            self._conn.execute("SAVEPOINT insert_many")
+            try:
+                self._conn.executemany(self._insert_sql(), rows)
+                inserted = len(rows)
+            except sqlite3.IntegrityError:
+                self._conn.execute("ROLLBACK TO insert_many")
+                sql = self._insert_sql("INSERT OR IGNORE")
+                for index, row in enumerate(rows):
+                    if self._conn.execute(sql, row).rowcount:
+                        inserted += 1
+                        continue
+                    errors.append({
+                        "index": index,
+                        "code": DUPLICATE_KEY_ERROR,
+                        "errmsg": "E11000 duplicate key error",
+                        "op": documents[index],
+                    })
+                    if ordered:
+                        break
+            self._conn.execute("RELEASE insert_many")
+
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors,
+                "writeConcernErrors": [],
+                "nInserted": inserted,
+                "nUpserted": 0,
+                "nMatched": 0,
+                "nModified": 0,
+                "nRemoved": 0,
+                "upserted": [],
+            })
+
+        return InsertManyResult([doc["_id"] for doc in documents], True)
+
+    def _update(self, query, update, upsert, multi, replace=False):
+        """
+        Devolve (encontrados, modificados, _id inserido ou None).
+        """
+        found = self._matching(query, limit=0 if multi else 1)
+
+        if not found:
+            if not upsert:
+                return 0, 0, None
+            if replace:
+                doc = dict(update)
+                seed = upsert_seed(query)
+                if "_id" in seed and "_id" not in doc:
+                    doc["_id"] = seed["_id"]
+            else:
+                doc = upsert_seed(query)
+                apply_update(doc, update, inserting=True)
+            return 0, 0, self._insert(doc)
+
+        modified = 0
+        for seq, doc in found:
+            before = bson.encode(doc)
+            if replace:
+                doc = {"_id": doc["_id"], **{k: v for k, v in update.items() if k != "_id"}}
+            else:
+                apply_update(doc, update, inserting=False)
+            if bson.encode(doc) != before:
+                self._update_row(seq, doc)
+                modified += 1
+
+        return len(found), modified, None
+
+    def _delete(self, query, multi):
+        if not query and multi:
+            return self._conn.execute(f"DELETE FROM {self._table}").rowcount
+
+        seqs = [seq for seq, _ in self._matching(query, limit=0 if multi else 1)]
+        for seq in seqs:
+            self._conn.execute(f"DELETE FROM {self._table} WHERE seq = ?", (seq,))
+        return len(seqs)
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        result = {
+            "writeErrors": [],
+            "writeConcernErrors": [],
+            "nInserted": 0,
+            "nUpserted": 0,
+            "nMatched": 0,
+            "nModified": 0,
+            "nRemoved": 0,
+            "upserted": [],
+        }
+
+        with _command("bulkWrite"), self._client.transaction(_synchronous(self.write_concern)):
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(request._doc)
+                        result["nInserted"] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        matched, modified, upserted_id = self._update(
+                            request._filter,
+                            request._doc,
+                            request._upsert,
+                            multi=isinstance(request, UpdateMany),
+                            replace=isinstance(request, ReplaceOne),
+                        )
+                        result["nMatched"] += matched
+                        result["nModified"] += modified
+                        if upserted_id is not None:
+                            result["nUpserted"] += 1
+                            result["upserted"].append({"index": index, "_id": upserted_id})
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        result["nRemoved"] += self._delete(request._filter, multi=isinstance(request, DeleteMany))
+                    else:
+                        raise TypeError(f"Operação não suportada: {request!r}")
+                except DuplicateKey as e:
+                    result["writeErrors"].append({
+                        "index": index,
+                        "code": DUPLICATE_KEY_ERROR,
+                        "errmsg": f"E11000 duplicate key error: {e}",
+                    })
+                    if ordered:
+                        break
+
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+
+        return BulkWriteResult(result, True)
+
+    def _update_one(self, query, update, upsert, multi, replace, command):
+        with _command(command), self._client.transaction(_synchronous(self.write_concern)):
+            try:
+                matched, modified, upserted_id = self._update(query, update, upsert, multi, replace)
+            except DuplicateKey as e:
+                raise DuplicateKeyError(f"E11000 duplicate key error: {e}", DUPLICATE_KEY_ERROR)
+
+        raw = {"n": matched or int(upserted_id is not None), "nModified": modified, "updatedExisting": bool(matched)}
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return UpdateResult(raw, True)
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        return self._update_one(filter, update, upsert, False, False, "update")
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        return self._update_one(filter, update, upsert, True, False, "update")
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        return self._update_one(filter, replacement, upsert, False, True, "update")
+
+    def delete_one(self, filter, **kwargs):
+        with _command("delete"), self._client.transaction(_synchronous(self.write_concern)):
+            return DeleteResult({"n": self._delete(filter, multi=False)}, True)
+
+    def delete_many(self, filter, **kwargs):
+        with _command("delete"), self._client.transaction(_synchronous(self.write_concern)):
+            return DeleteResult({"n": self._delete(filter, multi=True)}, True)
+
+    def drop(self):
+        with self._client.lock:
+            self._conn.execute(f"DROP TABLE IF EXISTS {self._table}")
+            self._client._collections.pop(self.full_name, None)
+
+    # ---------- índices ----------
+
+    def create_index(self, keys, unique=False, **kwargs):
+        """
+        Cada campo passa a ser uma coluna (preenchida a partir dos documentos
+        existentes) com índice SQLite; _id e event_id já são colunas únicas.
+        """
+        fields = [field for field, _ in _sort_spec(keys)]
+        name = kwargs.get("name") or "_".join(f"{field}_1" for field in fields)
+
+        if fields in (["_id"], ["event_id"]):
+            return name
+
+        with _command("createIndexes"), self._client.transaction():
+            new = [f for f in fields if f not in self._columns]
+            for field in new:
+                self._conn.execute(f"ALTER TABLE {self._table} ADD COLUMN {_quote(field)}")
+
+            if new:
+                rows = self._conn.execute(f"SELECT seq, doc FROM {self._table}").fetchall()
+                assignments = ", ".join(f"{_quote(f)} = ?" for f in new)
+                self._conn.executemany(
+                    f"UPDATE {self._table} SET {assignments} WHERE seq = ?",
+                    (
+                        [self._column_value(f, get_path(doc, f)[1]) for f in new] + [seq]
+                        for seq, doc in ((seq, bson.decode(blob)) for seq, blob in rows)
+                    ),
+                )
+                self._columns.extend(new)
+
+            columns = ", ".join(_quote(f) for f in fields)
+            try:
+                self._conn.execute(
+                    f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS "
+                    f"{_quote(f'{self.full_name}:{name}')} ON {self._table} ({columns})"
+                )
+            except sqlite3.IntegrityError as e:
+                self._columns[:] = [c for c in self._columns if c not in new]
+                raise DuplicateKeyError(f"E11000 duplicate key error: {e}", DUPLICATE_KEY_ERROR)
+
+        return name
+
+    # ---------- leitura ----------
+
+    def find(self, filter=None, projection=None, sort=None, limit=0, batch_size=DEFAULT_BATCH_SIZE, **kwargs):
+        return EmbeddedCursor(self, filter, projection, sort, limit, batch_size)
+
+    def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        return next(iter(self.find(filter, projection, sort=sort, limit=1)), None)
+
+    def count_documents(self, filter=None, **kwargs):
+        if not filter:
+            return self.estimated_document_count()
+        return sum(1 for _ in self._rows(filter, command="count"))
+
+    def estimated_document_count(self, **kwargs):
+        with _command("count"), self._client.lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+
+class EmbeddedCursor:
+    """
+    Cursor preguiçoso: sem sort ou com sort por _id lê por páginas na ordem do
+    índice; outro sort lê tudo o que passa o filtro e ordena em Python (com
+    limit guarda só os primeiros num heap).
+    """
+
+    def __init__(self, collection, query, projection, sort, limit, batch_size):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self._sort = _sort_spec(sort) if sort else None
+        self._limit = limit
+        self._batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self._iterator = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size):
+        self._batch_size = batch_size or DEFAULT_BATCH_SIZE
+        return self
+
+    def close(self):
+        self._iterator = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = self._documents()
+        return next(self._iterator)
+
+    def _documents(self):
+        collection = self.collection
+
+        if not self._sort or self._sort == [("_id", 1)]:
+            order = "_id" if self._sort else "seq"
+            docs = (doc for _, doc in collection._rows(self.query, self._batch_size, order))
+        else:
+            docs = (doc for _, doc in collection._rows(self.query, self._batch_size))
+            key = _sort_key(self._sort)
+            docs = heapq.nsmallest(self._limit, docs, key=key) if self._limit else sorted(docs, key=key)
+
+        for n, doc in enumerate(docs, start=1):
+            yield project(doc, self.projection)
+            if self._limit and n >= self._limit:
+                return
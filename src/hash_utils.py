@@ -1,6 +1,13 @@
 import hashlib
 import json
 
+# Registos por tarefa enviada ao pool de processos
+HASH_CHUNK_SIZE = 5000
+
+# json.dumps(..., sort_keys=True) constrói um JSONEncoder novo em cada chamada;
+# este encoder partilhado produz exatamente o mesmo texto.
+_CANONICAL_ENCODER = json.JSONEncoder(sort_keys=True)
+
 
 def generate_event_id(event_type: str, event_time: str, vendor: str, payload: dict) -> str:
     """
@@ -11,3 +18,37 @@ def generate_event_id(event_type: str, event_time: str, vendor: str, payload: di
     raw_string = f"{event_type}|{event_time}|{vendor}|{normalized_payload}"
 
     return hashlib.sha256(raw_string.encode("utf-8")).hexdigest()
+
+
+def _hash_chunk(records):
+    encode = _CANONICAL_ENCODER.encode
+    sha256 = hashlib.sha256
+
+    return [
+        sha256(f"{event_type}|{event_time}|{vendor}|{encode(payload)}".encode("utf-8")).hexdigest()
+        for event_type, event_time, vendor, payload in records
+    ]
+
+
+def generate_event_ids(records, executor=None, chunk_size=HASH_CHUNK_SIZE) -> list:
+    """
+    Versão em lote de generate_event_id.
+
+    records: sequência de tuplos (event_type, event_time, vendor, payload).
+    executor: ProcessPoolExecutor opcional; só é usado quando há mais de um
+    bloco de chunk_size registos.
+
+    Devolve os event_ids pela mesma ordem, idênticos aos de generate_event_id.
+    """
+    records = list(records)
+
+    if executor is None or len(records) <= chunk_size:
+        return _hash_chunk(records)
+
+    chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+
+    event_ids = []
+    for chunk_ids in executor.map(_hash_chunk, chunks):
+        event_ids.extend(chunk_ids)
+
+    return event_ids
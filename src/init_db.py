@@ -1,18 +1,14 @@
-from pymongo import MongoClient
-from dotenv import load_dotenv
-import os
+from src.config.mongo_client import get_database
 
-load_dotenv()
 
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB = os.getenv("MONGO_DB")
+def main():
+    collection = get_database()["events_raw"]
 
-client = MongoClient(MONGO_URI)
-db = client[MONGO_DB]
+    # Garante unicidade do event_id (IDEMPOTÊNCIA)
+    collection.create_index("event_id", unique=True)
 
-collection = db["events_raw"]
+    print("✅ Collection events_raw pronta com índice único em event_id")
 
-# Garante unicidade do event_id (IDEMPOTÊNCIA)
-collection.create_index("event_id", unique=True)
 
-print("✅ Collection events_raw pronta com índice único em event_id")
+if __name__ == "__main__":
+    main()
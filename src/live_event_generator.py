@@ -11,18 +11,41 @@ Generates noisy, realistic JSONL event streams:
 Usage:
   python src/live_event_generator.py --out data/live_events --date 2025-01-15 --events 2000
   python src/live_event_generator.py --out data/live_events --events 2000          # uses today's date
+  python src/live_event_generator.py --out data/live_events --start 2025-01-01 --end 2025-12-31 --events 50000
 Options:
   --dup-rate 0.05
   --late-rate 0.10
   --schema-drift-rate 0.15
   --seed 123
+  --workers 8              # date range mode: days generated in parallel
+
+The date range mode streams each day straight to its file, draws the random
+fields in batches from a NumPy Generator seeded per day (same distributions
+as the single-day mode, different sequence) and hands the order pool between
+days in memory.
 """
-import argparse, json, random, hashlib, datetime
+import argparse, json, random, hashlib, datetime, os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
+
 VENDORS = ["vendor_a","vendor_b","vendor_c"]
 REGIONS = ["Lagos","Abuja","Kano","Kaduna","PH"]
 CURRENCIES = ["NGN","USD"]
+EVENT_TYPES = ["order_created","payment_succeeded","refund_issued","shipment_updated","order_updated"]
+EVENT_WEIGHTS = [0.20, 0.33, 0.12, 0.25, 0.10]
+BASE_AMOUNTS = [5000,9000,12000,18000,25000,40000,65000]
+
+ORDER_POOL_LIMIT = 50000   # orders kept in order_pool.txt
+DRAW_BATCH = 8192          # values drawn at once per kind of random field
+EVENT_BLOCK = 8192         # events whose top-level fields are drawn together
+WRITE_BUFFER = 1 << 20
+
+_json = json.JSONEncoder().encode
+_sorted_json = json.JSONEncoder(sort_keys=True).encode
+
+_EPOCH = datetime.datetime(1970, 1, 1)
 
 def stable_id(*parts):
     s = "|".join(map(str, parts))
@@ -31,14 +54,50 @@ def stable_id(*parts):
 def iso(dt):
     return dt.replace(microsecond=0).isoformat() + "Z"
 
-def rand_dt(day_start, day_end):
+def rand_dt(day_start, day_end, rnd=random):
     delta = int((day_end-day_start).total_seconds())
-    return day_start + datetime.timedelta(seconds=random.randint(0, max(delta,1)))
+    return day_start + datetime.timedelta(seconds=rnd.randint(0, max(delta,1)))
+
+class BatchRandom:
+    """
+    The subset of the random module used here (random, randint, choice,
+    choices), served from batches drawn with a NumPy Generator: one buffer
+    per kind of draw, refilled DRAW_BATCH values at a time.
+    """
+
+    def __init__(self, seed=None, batch=DRAW_BATCH):
+        self.rng = np.random.default_rng(seed)
+        self.batch = batch
+        self._buffers = {}
+
+    def _next(self, key, draw):
+        try:
+            return next(self._buffers[key])
+        except (KeyError, StopIteration):
+            self._buffers[key] = iter(draw(self.batch).tolist())
+            return next(self._buffers[key])
+
+    def random(self):
+        return self._next("random", self.rng.random)
+
+    def randint(self, a, b):
+        return self._next(("randint", a, b), lambda n: self.rng.integers(a, b + 1, n))
+
+    def choice(self, seq):
+        return seq[self.randint(0, len(seq) - 1)]
 
-def vendor_payload(event_type, vendor, order_id, dt, base_amount, schema_drift=False):
-    currency = random.choices(CURRENCIES, weights=[0.88, 0.12])[0]
+    def choices(self, population, weights):
+        key = ("choices", len(population), tuple(weights))
+        return [population[self._next(key, lambda n: self.rng.choice(len(population), n, p=_probabilities(weights)))]]
+
+def _probabilities(weights):
+    p = np.asarray(weights, dtype=float)
+    return p / p.sum()
+
+def vendor_payload(event_type, vendor, order_id, dt, base_amount, schema_drift=False, rnd=random):
+    currency = rnd.choices(CURRENCIES, weights=[0.88, 0.12])[0]
     if currency == "USD":
-        fx = 950 + random.randint(-80, 120)
+        fx = 950 + rnd.randint(-80, 120)
         amount = round(base_amount / fx, 2)
     else:
         amount = base_amount
@@ -48,41 +107,41 @@ def vendor_payload(event_type, vendor, order_id, dt, base_amount, schema_drift=F
             payload = {
                 "orderRef": order_id,
                 "created": dt.strftime("%Y-%m-%d %H:%M"),
-                "customer": {"email": f"user{random.randint(1,2500)}@example.com"},
+                "customer": {"email": f"user{rnd.randint(1,2500)}@example.com"},
                 "total": amount,
                 "currency": currency,
-                "region": random.choice(REGIONS),
-                "items": [{"sku": f"SKU-{random.randint(0,219):04d}", "qty": random.randint(1,3), "price": random.choice([2500,4000,6500,9000,12000])}
-                          for _ in range(random.randint(1,4))]
+                "region": rnd.choice(REGIONS),
+                "items": [{"sku": f"SKU-{rnd.randint(0,219):04d}", "qty": rnd.randint(1,3), "price": rnd.choice([2500,4000,6500,9000,12000])}
+                          for _ in range(rnd.randint(1,4))]
             }
             if schema_drift:
                 payload["totalAmount"] = payload.pop("total")
                 payload["buyer"] = payload.pop("customer")
         elif event_type == "payment_succeeded":
             payload = {"orderRef": order_id, "paidAt": dt.strftime("%Y/%m/%d %H:%M:%S"), "status": "SUCCESS",
-                       "amount": amount, "currency": currency, "method": random.choice(["card","bank_transfer","ussd"]),
+                       "amount": amount, "currency": currency, "method": rnd.choice(["card","bank_transfer","ussd"]),
                        "txRef": f"TX-{stable_id(order_id, dt, amount)}"}
             if schema_drift:
                 payload["payment_status"] = payload.pop("status")
         elif event_type == "refund_issued":
-            partial = random.random() < 0.55
-            items = [{"sku": f"SKU-{random.randint(0,219):04d}", "qty": 1, "amount": random.choice([1500,2500,4000,6500])}
-                     for _ in range(random.randint(1,2))] if partial else None
+            partial = rnd.random() < 0.55
+            items = [{"sku": f"SKU-{rnd.randint(0,219):04d}", "qty": 1, "amount": rnd.choice([1500,2500,4000,6500])}
+                     for _ in range(rnd.randint(1,2))] if partial else None
             payload = {"orderRef": order_id, "refundedAt": dt.strftime("%Y-%m-%dT%H:%M:%S"),
                        "amount": amount if not partial else sum(x["amount"] for x in items),
-                       "currency": currency, "reason": random.choice(["customer_request","duplicate","damaged","late_delivery"]),
+                       "currency": currency, "reason": rnd.choice(["customer_request","duplicate","damaged","late_delivery"]),
                        "items": items}
             if schema_drift:
                 payload["refunded_items"] = payload.pop("items")
         elif event_type == "shipment_updated":
             payload = {"orderRef": order_id, "tracking": f"TRK-{stable_id(order_id, vendor)}",
-                       "status": random.choice(["CREATED","PICKED_UP","IN_TRANSIT","DELIVERED"]),
+                       "status": rnd.choice(["CREATED","PICKED_UP","IN_TRANSIT","DELIVERED"]),
                        "updateTime": iso(dt)}
             if schema_drift:
                 payload["update_time"] = payload.pop("updateTime")
         else:
             payload = {"orderRef": order_id, "updatedAt": iso(dt),
-                       "change": random.choice(["address_change","qty_change","phone_change"]),
+                       "change": rnd.choice(["address_change","qty_change","phone_change"]),
                        "notes": "customer requested update"}
             if schema_drift:
                 payload["updated_at"] = payload.pop("updatedAt")
@@ -90,136 +149,117 @@ def vendor_payload(event_type, vendor, order_id, dt, base_amount, schema_drift=F
     elif vendor == "vendor_b":
         if event_type == "order_created":
             payload = {"order_id": order_id, "created_at": iso(dt),
-                       "buyerEmail": f"user{random.randint(1,2500)}@mail.com",
+                       "buyerEmail": f"user{rnd.randint(1,2500)}@mail.com",
                        "totalAmount": amount, "currencyCode": currency,
-                       "state": random.choice(REGIONS),
-                       "line_items": [{"sku": f"SKU-{random.randint(0,219):04d}", "quantity": random.randint(1,3), "unit_price": random.choice([2500,4000,6500,9000,12000])}
-                                      for _ in range(random.randint(1,4))]}
+                       "state": rnd.choice(REGIONS),
+                       "line_items": [{"sku": f"SKU-{rnd.randint(0,219):04d}", "quantity": rnd.randint(1,3), "unit_price": rnd.choice([2500,4000,6500,9000,12000])}
+                                      for _ in range(rnd.randint(1,4))]}
             if schema_drift:
                 payload["currency"] = payload.pop("currencyCode")
         elif event_type == "payment_succeeded":
             payload = {"order_id": order_id, "paid_at": iso(dt), "payment_status": "SUCCESS",
                        "amountPaid": amount, "currencyCode": currency,
-                       "channel": random.choice(["card","bank_transfer","ussd"]),
+                       "channel": rnd.choice(["card","bank_transfer","ussd"]),
                        "transaction_id": stable_id(order_id, dt, amount)}
             if schema_drift:
                 payload["amount_paid"] = payload.pop("amountPaid")
         elif event_type == "refund_issued":
-            partial = random.random() < 0.55
-            refunded_items = [{"sku": f"SKU-{random.randint(0,219):04d}", "qty": 1, "amount": random.choice([1500,2500,4000,6500])}
-                              for _ in range(random.randint(1,2))] if partial else None
+            partial = rnd.random() < 0.55
+            refunded_items = [{"sku": f"SKU-{rnd.randint(0,219):04d}", "qty": 1, "amount": rnd.choice([1500,2500,4000,6500])}
+                              for _ in range(rnd.randint(1,2))] if partial else None
             payload = {"order_id": order_id, "refunded_at": iso(dt), "refundAmount": amount if not partial else sum(x["amount"] for x in refunded_items),
-                       "currencyCode": currency, "refund_reason": random.choice(["customer_request","duplicate","damaged","late_delivery"]),
+                       "currencyCode": currency, "refund_reason": rnd.choice(["customer_request","duplicate","damaged","late_delivery"]),
                        "refunded_items": refunded_items}
             if schema_drift:
                 payload["reason"] = payload.pop("refund_reason")
         elif event_type == "shipment_updated":
-            payload = {"order_id": order_id, "tracking_code": f"TRK{random.randint(1000000,9999999)}",
-                       "shipment_status": random.choice(["CREATED","PICKED_UP","IN_TRANSIT","DELIVERED"]),
+            payload = {"order_id": order_id, "tracking_code": f"TRK{rnd.randint(1000000,9999999)}",
+                       "shipment_status": rnd.choice(["CREATED","PICKED_UP","IN_TRANSIT","DELIVERED"]),
                        "time": iso(dt)}
             if schema_drift:
                 payload["status"] = payload.pop("shipment_status")
         else:
-            payload = {"order_id": order_id, "updated_at": iso(dt), "change_type": random.choice(["address_change","qty_change","phone_change"])}
+            payload = {"order_id": order_id, "updated_at": iso(dt), "change_type": rnd.choice(["address_change","qty_change","phone_change"])}
             if schema_drift:
                 payload["change"] = payload.pop("change_type")
 
     else:
         if event_type == "order_created":
             payload = {"order": {"id": order_id, "ts": int(dt.timestamp())},
-                       "email": f"user{random.randint(1,2500)}@pulse.africa",
+                       "email": f"user{rnd.randint(1,2500)}@pulse.africa",
                        "amount": amount, "ccy": currency,
-                       "geo": {"region": random.choice(REGIONS)},
-                       "items": [{"productSku": f"SKU-{random.randint(0,219):04d}", "qty": random.randint(1,3), "price": random.choice([2500,4000,6500,9000,12000])}
-                                 for _ in range(random.randint(1,4))]}
+                       "geo": {"region": rnd.choice(REGIONS)},
+                       "items": [{"productSku": f"SKU-{rnd.randint(0,219):04d}", "qty": rnd.randint(1,3), "price": rnd.choice([2500,4000,6500,9000,12000])}
+                                 for _ in range(rnd.randint(1,4))]}
             if schema_drift:
                 payload["items"] = [{"sku": it["productSku"], "qty": it["qty"], "price": it["price"]} for it in payload["items"]]
         elif event_type == "payment_succeeded":
             payload = {"order": order_id, "timestamp": int(dt.timestamp()), "state": "SUCCESS",
-                       "amt": amount, "ccy": currency, "paymentMethod": random.choice(["card","bank_transfer","ussd"]),
-                       "txn": f"TRX{random.randint(100000,999999)}"}
+                       "amt": amount, "ccy": currency, "paymentMethod": rnd.choice(["card","bank_transfer","ussd"]),
+                       "txn": f"TRX{rnd.randint(100000,999999)}"}
             if schema_drift:
                 payload["payment_state"] = payload.pop("state")
         elif event_type == "refund_issued":
-            partial = random.random() < 0.55
-            items = [{"sku": f"SKU-{random.randint(0,219):04d}", "qty": 1, "amount": random.choice([1500,2500,4000,6500])}
-                     for _ in range(random.randint(1,2))] if partial else None
+            partial = rnd.random() < 0.55
+            items = [{"sku": f"SKU-{rnd.randint(0,219):04d}", "qty": 1, "amount": rnd.choice([1500,2500,4000,6500])}
+                     for _ in range(rnd.randint(1,2))] if partial else None
             payload = {"order": order_id, "ts": int(dt.timestamp()), "amt": amount if not partial else sum(x["amount"] for x in items),
-                       "ccy": currency, "reason": random.choice(["customer_request","duplicate","damaged","late_delivery"]),
+                       "ccy": currency, "reason": rnd.choice(["customer_request","duplicate","damaged","late_delivery"]),
                        "items_refunded": items}
             if schema_drift:
                 payload["items"] = payload.pop("items_refunded")
         elif event_type == "shipment_updated":
-            payload = {"order": {"id": order_id}, "tracking": f"{random.randint(100000000,999999999)}",
-                       "state": random.choice(["CREATED","PICKED_UP","IN_TRANSIT","DELIVERED"]),
+            payload = {"order": {"id": order_id}, "tracking": f"{rnd.randint(100000000,999999999)}",
+                       "state": rnd.choice(["CREATED","PICKED_UP","IN_TRANSIT","DELIVERED"]),
                        "ts": int(dt.timestamp())}
             if schema_drift:
                 payload["status"] = payload.pop("state")
         else:
-            payload = {"order": order_id, "ts": int(dt.timestamp()), "change": random.choice(["address_change","qty_change","phone_change"]),
+            payload = {"order": order_id, "ts": int(dt.timestamp()), "change": rnd.choice(["address_change","qty_change","phone_change"]),
                        "notes": "legacy update"}
             if schema_drift:
                 payload["note"] = payload.pop("notes")
     return payload
 
-def main():
-    p = argparse.ArgumentParser()
-    p.add_argument("--out", required=True, help="Output root directory (e.g., data/live_events)")
-    p.add_argument("--date", default=None, help="YYYY-MM-DD; default=today")
-    p.add_argument("--events", type=int, default=2000, help="Number of events to generate")
-    p.add_argument("--dup-rate", type=float, default=0.05, help="Fraction of generated events to duplicate")
-    p.add_argument("--late-rate", type=float, default=0.10, help="Fraction of events with late arrival")
-    p.add_argument("--schema-drift-rate", type=float, default=0.15, help="Fraction of events with schema drift")
-    p.add_argument("--seed", type=int, default=42)
-    args = p.parse_args()
-
-    random.seed(args.seed)
+def new_order_ids(day, events):
+    return [f"ORD-{day.strftime('%y%m%d')}-{i:05d}" for i in range(1, int(events*0.15)+1)]
 
-    day = datetime.date.fromisoformat(args.date) if args.date else datetime.date.today()
+def generate_events(day, events, order_pool, new_orders, dup_rate, late_rate, schema_drift_rate, rnd=random):
+    """
+    Yields one day of events (a duplicate right after its original).
+    order_pool must already contain new_orders.
+    """
     day_start = datetime.datetime.combine(day, datetime.time(0,0,0))
     day_end   = datetime.datetime.combine(day, datetime.time(23,59,59))
+    next_new = 0
 
-    out_dir = Path(args.out) / day.isoformat()
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_path = out_dir / "events.jsonl"
-
-    pool_path = Path(args.out) / "order_pool.txt"
-    order_pool = []
-    if pool_path.exists():
-        order_pool = [x.strip() for x in pool_path.read_text().splitlines() if x.strip()]
-
-    new_orders = [f"ORD-{day.strftime('%y%m%d')}-{i:05d}" for i in range(1, int(args.events*0.15)+1)]
-    order_pool.extend(new_orders)
-
-    event_types = ["order_created","payment_succeeded","refund_issued","shipment_updated","order_updated"]
+    for _ in range(events):
+        vendor = rnd.choice(VENDORS)
+        et = rnd.choices(EVENT_TYPES, weights=EVENT_WEIGHTS)[0]
 
-    generated = []
-    for _ in range(args.events):
-        vendor = random.choice(VENDORS)
-        et = random.choices(event_types, weights=[0.20, 0.33, 0.12, 0.25, 0.10])[0]
-
-        if et == "order_created" and new_orders:
-            order_id = new_orders.pop(0)
+        if et == "order_created" and next_new < len(new_orders):
+            order_id = new_orders[next_new]
+            next_new += 1
         else:
-            if random.random() < 0.03:
-                order_id = f"ORD-UNKNOWN-{random.randint(1000,9999)}"
+            if rnd.random() < 0.03:
+                order_id = f"ORD-UNKNOWN-{rnd.randint(1000,9999)}"
             else:
-                order_id = random.choice(order_pool) if order_pool else f"ORD-{day.strftime('%y%m%d')}-00001"
+                order_id = rnd.choice(order_pool) if order_pool else f"ORD-{day.strftime('%y%m%d')}-00001"
 
-        ingested_at = rand_dt(day_start, day_end)
+        ingested_at = rand_dt(day_start, day_end, rnd)
 
-        if random.random() < args.late_rate:
-            lag_days = random.randint(1, 7)
-            event_time = ingested_at - datetime.timedelta(days=lag_days, hours=random.randint(1, 18))
+        if rnd.random() < late_rate:
+            lag_days = rnd.randint(1, 7)
+            event_time = ingested_at - datetime.timedelta(days=lag_days, hours=rnd.randint(1, 18))
         else:
-            event_time = ingested_at - datetime.timedelta(minutes=random.randint(0, 120))
+            event_time = ingested_at - datetime.timedelta(minutes=rnd.randint(0, 120))
 
-        schema_drift = random.random() < args.schema_drift_rate
-        base_amount = random.choice([5000,9000,12000,18000,25000,40000,65000])
+        schema_drift = rnd.random() < schema_drift_rate
+        base_amount = rnd.choice(BASE_AMOUNTS)
 
-        payload = vendor_payload(et, vendor, order_id, event_time, base_amount, schema_drift=schema_drift)
+        payload = vendor_payload(et, vendor, order_id, event_time, base_amount, schema_drift=schema_drift, rnd=rnd)
 
-        event_id = stable_id(vendor, et, order_id, iso(event_time), json.dumps(payload, sort_keys=True))
+        event_id = stable_id(vendor, et, order_id, iso(event_time), _sorted_json(payload))
         doc = {
             "event_id": event_id,
             "event_type": et,
@@ -228,20 +268,222 @@ def main():
             "payload": payload,
             "ingested_at": iso(ingested_at)
         }
-        generated.append(doc)
+        yield doc
 
-        if random.random() < args.dup_rate:
+        if rnd.random() < dup_rate:
             dup = dict(doc)
-            if random.random() < 0.5:
-                dup["ingested_at"] = iso(ingested_at + datetime.timedelta(minutes=random.randint(1, 180)))
-            generated.append(dup)
+            if rnd.random() < 0.5:
+                dup["ingested_at"] = iso(ingested_at + datetime.timedelta(minutes=rnd.randint(1, 180)))
+            yield dup
+
+def generate_events_batched(day, events, order_pool, new_orders, dup_rate, late_rate, schema_drift_rate, rnd):
+    """
+    Same events as generate_events (same distributions), but the per-event
+    fields are drawn EVENT_BLOCK events at a time from rnd.rng and the
+    timestamps are formatted with NumPy; only the payloads are built one by one.
+    """
+    rng = rnd.rng
+    day_start = np.datetime64(day.isoformat(), "s")
+    epoch_day = int((day_start - np.datetime64(0, "s")).astype(np.int64))
+    type_p = _probabilities(EVENT_WEIGHTS)
+    fallback = f"ORD-{day.strftime('%y%m%d')}-00001"
+    used_new = 0
+
+    for block in range(0, events, EVENT_BLOCK):
+        n = min(EVENT_BLOCK, events - block)
+
+        vendors = rng.integers(0, len(VENDORS), n)
+        types = rng.choice(len(EVENT_TYPES), n, p=type_p)
+
+        # order_created takes the next new order while there are any left
+        created = types == 0
+        rank = used_new + np.cumsum(created)
+        takes_new = created & (rank <= len(new_orders))
+        used_new = min(len(new_orders), used_new + int(created.sum()))
+        unknown = rng.random(n) < 0.03
+        unknown_ids = rng.integers(1000, 10000, n)
+        picks = rng.integers(0, max(len(order_pool), 1), n)
+
+        ingested = rng.integers(0, 86400, n)
+        late = rng.random(n) < late_rate
+        lag = rng.integers(1, 8, n) * 86400 + rng.integers(1, 19, n) * 3600
+        recent = rng.integers(0, 121, n) * 60
+        event_time = ingested - np.where(late, lag, recent)
+
+        drift = (rng.random(n) < schema_drift_rate).tolist()
+        base = rng.choice(BASE_AMOUNTS, n).tolist()
+        dup = (rng.random(n) < dup_rate).tolist()
+        dup_shift = np.where(rng.random(n) < 0.5, rng.integers(1, 181, n) * 60, 0)
+
+        ingested_iso = np.datetime_as_string(day_start + ingested, unit="s").tolist()
+        dup_iso = np.datetime_as_string(day_start + ingested + dup_shift, unit="s").tolist()
+        event_iso = np.datetime_as_string(day_start + event_time, unit="s").tolist()
+        event_epoch = (event_time + epoch_day).tolist()
+
+        vendors = vendors.tolist()
+        types = types.tolist()
+        rank = rank.tolist()
+        takes_new = takes_new.tolist()
+        unknown = unknown.tolist()
+        unknown_ids = unknown_ids.tolist()
+        picks = picks.tolist()
+
+        for i in range(n):
+            vendor = VENDORS[vendors[i]]
+            et = EVENT_TYPES[types[i]]
+
+            if takes_new[i]:
+                order_id = new_orders[rank[i] - 1]
+            elif unknown[i]:
+                order_id = f"ORD-UNKNOWN-{unknown_ids[i]}"
+            else:
+                order_id = order_pool[picks[i]] if order_pool else fallback
+
+            dt = _EPOCH + datetime.timedelta(seconds=event_epoch[i])
+            payload = vendor_payload(et, vendor, order_id, dt, base[i], schema_drift=drift[i], rnd=rnd)
+
+            event_time_iso = event_iso[i] + "Z"
+            doc = {
+                "event_id": stable_id(vendor, et, order_id, event_time_iso, _sorted_json(payload)),
+                "event_type": et,
+                "event_time": event_time_iso,
+                "vendor": vendor,
+                "payload": payload,
+                "ingested_at": ingested_iso[i] + "Z"
+            }
+            yield doc
+
+            if dup[i]:
+                dup_doc = dict(doc)
+                dup_doc["ingested_at"] = dup_iso[i] + "Z"
+                yield dup_doc
+
+def write_day(out, day, docs):
+    """
+    Streams the events to <out>/<day>/events.jsonl; returns (count, path).
+    """
+    out_dir = Path(out) / day.isoformat()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / "events.jsonl"
+
+    count = 0
+    with out_path.open("w", encoding="utf-8", buffering=WRITE_BUFFER) as f:
+        for d in docs:
+            f.write(_json(d) + "\n")
+            count += 1
+    return count, out_path
+
+def read_order_pool(pool_path):
+    if not pool_path.exists():
+        return []
+    return [x.strip() for x in pool_path.read_text().splitlines() if x.strip()]
+
+# Order pool prefix shared by the worker processes (see generate_range)
+_pool_chain = []
+
+def _init_worker(pool_chain):
+    global _pool_chain
+    _pool_chain = pool_chain
+
+def generate_day(out, day, events, pool_size, seed, dup_rate, late_rate, schema_drift_rate):
+    """
+    One day of the range mode. The seed depends only on (seed, day), so the
+    output does not depend on the number of workers or on scheduling.
+    """
+    new_orders = new_order_ids(day, events)
+    order_pool = _pool_chain[:pool_size] + new_orders
+    rnd = BatchRandom(np.random.SeedSequence([seed, day.toordinal()]))
+    docs = generate_events_batched(day, events, order_pool, new_orders, dup_rate, late_rate, schema_drift_rate, rnd)
+    return write_day(out, day, docs)
+
+def generate_range(args, start, end):
+    """
+    Generates every day in [start, end] in a process pool. order_pool.txt is
+    read once and written once: the pool a day starts with is always a prefix
+    of (initial pool + new orders of each day, in order), capped at
+    ORDER_POOL_LIMIT like in the single-day mode, so each worker gets it from
+    that chain in memory.
+    """
+    days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+    pool_path = Path(args.out) / "order_pool.txt"
+    initial = read_order_pool(pool_path)
+
+    new_per_day = int(args.events*0.15)
+    pool_sizes = []
+    size = len(initial)
+    for _ in days:
+        pool_sizes.append(size)
+        size = min(ORDER_POOL_LIMIT, size + new_per_day)
+
+    needed = max(pool_sizes + [size])
+    chain = initial
+    for day in days:
+        if len(chain) >= needed:
+            break
+        chain = chain + new_order_ids(day, args.events)
+    chain = chain[:needed]
+
+    tasks = [
+        (args.out, day, args.events, pool_size, args.seed, args.dup_rate, args.late_rate, args.schema_drift_rate)
+        for day, pool_size in zip(days, pool_sizes)
+    ]
+
+    total = 0
+    if args.workers <= 1:
+        _init_worker(chain)
+        results = (generate_day(*task) for task in tasks)
+        for count, out_path in results:
+            total += count
+            print(f"Wrote {count} events to {out_path}")
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(chain,)) as executor:
+            for count, out_path in executor.map(generate_day, *zip(*tasks)):
+                total += count
+                print(f"Wrote {count} events to {out_path}")
+
+    pool_path.parent.mkdir(parents=True, exist_ok=True)
+    pool_path.write_text("\n".join(chain[:size]))
+    print(f"Wrote {total} events for {len(days)} days")
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--out", required=True, help="Output root directory (e.g., data/live_events)")
+    p.add_argument("--date", default=None, help="YYYY-MM-DD; default=today")
+    p.add_argument("--start", default=None, help="YYYY-MM-DD; first day of a date range (with --end)")
+    p.add_argument("--end", default=None, help="YYYY-MM-DD; last day of a date range (inclusive)")
+    p.add_argument("--events", type=int, default=2000, help="Number of events to generate (per day)")
+    p.add_argument("--dup-rate", type=float, default=0.05, help="Fraction of generated events to duplicate")
+    p.add_argument("--late-rate", type=float, default=0.10, help="Fraction of events with late arrival")
+    p.add_argument("--schema-drift-rate", type=float, default=0.15, help="Fraction of events with schema drift")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes for the date range mode")
+    args = p.parse_args()
+
+    if args.start or args.end:
+        if not (args.start and args.end) or args.date:
+            p.error("--start and --end go together and replace --date")
+        start = datetime.date.fromisoformat(args.start)
+        end = datetime.date.fromisoformat(args.end)
+        if end < start:
+            p.error("--end is before --start")
+        generate_range(args, start, end)
+        return
+
+    random.seed(args.seed)
+
+    day = datetime.date.fromisoformat(args.date) if args.date else datetime.date.today()
+
+    pool_path = Path(args.out) / "order_pool.txt"
+    order_pool = read_order_pool(pool_path)
+
+    new_orders = new_order_ids(day, args.events)
+    order_pool.extend(new_orders)
 
-    with out_path.open("w", encoding="utf-8") as f:
-        for d in generated:
-            f.write(json.dumps(d) + "\n")
+    docs = generate_events(day, args.events, order_pool, new_orders, args.dup_rate, args.late_rate, args.schema_drift_rate)
+    count, out_path = write_day(args.out, day, docs)
 
-    pool_path.write_text("\n".join(order_pool[:50000]))
-    print(f"Wrote {len(generated)} events to {out_path}")
+    pool_path.write_text("\n".join(order_pool[:ORDER_POOL_LIMIT]))
+    print(f"Wrote {count} events to {out_path}")
 
 if __name__ == "__main__":
     main()
@@ -3,54 +3,402 @@
 Loads live JSONL events into MongoDB (append-only, raw ingestion)
 """
 
+import argparse
+import contextvars
+import hashlib
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from pymongo.errors import BulkWriteError
 
-#from config.mongo import get_mongo_client
-#from src.config.mongo import get_mongo_client
-from src.config.mongo_client import get_mongo_client
+from src.config.mongo_client import command_stage, get_database, print_command_report
+from src.bloom_filter import BloomFilter
 
+DB_NAME = os.getenv("MONGO_DB", "commercepulse")
 
-def load_events(jsonl_path: Path):
-    client = get_mongo_client()
-    db = client["commercepulse"]
-    collection = db["events_raw"]
+# Eventos enviados por cada insert_many
+CHUNK_SIZE = int(os.getenv("LIVE_CHUNK_SIZE", "1000"))
 
-    docs = []
+# Ficheiros diários carregados em simultâneo
+WORKERS = int(os.getenv("LIVE_WORKERS", "4"))
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Bloom filter dos event_id já presentes em events_raw, persistido entre execuções
+BLOOM_PATH = os.getenv("LIVE_BLOOM_PATH", "data/state/events_raw.bloom")
+BLOOM_MIN_CAPACITY = 1_000_000
+BLOOM_ERROR_RATE = 0.001
+
+# As threads partilham o mesmo filtro
+_bloom_lock = threading.Lock()
+
+# Manifesto com o offset já carregado de cada ficheiro
+MANIFEST_PATH = os.getenv("LIVE_MANIFEST_PATH", "data/state/live_ingest_manifest.json")
+
+# Bytes do início e do fim da parte já carregada usados na impressão digital
+FINGERPRINT_BYTES = 64 * 1024
+
+# Bytes lidos de cada vez no hash completo da parte já carregada
+HASH_BLOCK_BYTES = 1 << 20
+
+# Intervalo entre verificações no modo --follow (segundos)
+FOLLOW_INTERVAL = float(os.getenv("LIVE_FOLLOW_INTERVAL", "5"))
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    os.replace(tmp_path, path)
+
+
+def file_fingerprint(jsonl_path: Path, offset: int):
+    """
+    sha256 do início e do fim dos primeiros `offset` bytes do ficheiro.
+    Muda se a parte já carregada for reescrita.
+    """
+    digest = hashlib.sha256()
+
+    with jsonl_path.open("rb") as f:
+        digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+
+        tail_start = max(offset - FINGERPRINT_BYTES, FINGERPRINT_BYTES)
+        if tail_start < offset:
+            f.seek(tail_start)
+            digest.update(f.read(offset - tail_start))
+
+    return digest.hexdigest()
+
+
+def content_hash(jsonl_path: Path, offset: int):
+    """
+    sha256 de todos os primeiros `offset` bytes do ficheiro.
+    """
+    digest = hashlib.sha256()
+
+    with jsonl_path.open("rb") as f:
+        remaining = offset
+        while remaining:
+            block = f.read(min(remaining, HASH_BLOCK_BYTES))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+
+    return digest.hexdigest()
+
+
+def resume_offset(jsonl_path: Path, entry):
+    """
+    Decide a partir de onde ler o ficheiro:
+    - None: ficheiro inalterado desde a última execução (tamanho e mtime)
+    - offset gravado: a parte já carregada é igual, só pode haver linhas novas
+    - 0: ficheiro novo, truncado ou reescrito
+
+    A impressão digital (início e fim) apanha os casos comuns sem ler o
+    ficheiro todo; se o tamanho ou o mtime mudaram, o hash completo da parte
+    já carregada apanha também reescritas a meio.
+    """
+    if not entry:
+        return 0
+
+    stat = jsonl_path.stat()
+    offset = entry["offset"]
+
+    if stat.st_size < offset or file_fingerprint(jsonl_path, offset) != entry["fingerprint"]:
+        print(f"{jsonl_path}: ficheiro truncado ou reescrito, a recarregar do início.")
+        return 0
+
+    if stat.st_size == entry["size"] and stat.st_mtime_ns == entry.get("mtime_ns"):
+        return None
+
+    # Entradas antigas não têm hash completo: ficam com ele nesta execução
+    if entry.get("content_hash") is not None and content_hash(jsonl_path, offset) != entry["content_hash"]:
+        print(f"{jsonl_path}: ficheiro reescrito, a recarregar do início.")
+        return 0
+
+    return offset
+
+
+def seed_bloom_filter(collection, capacity=None):
+    """
+    Constrói o filtro a partir dos event_id existentes em events_raw.
+    """
+    if capacity is None:
+        capacity = max(BLOOM_MIN_CAPACITY, collection.estimated_document_count() * 2)
+
+    bloom = BloomFilter(capacity, BLOOM_ERROR_RATE)
+
+    cursor = collection.find(
+        {"event_id": {"$exists": True}},
+        {"event_id": 1, "_id": 0},
+        batch_size=10000,
+    )
+    for doc in cursor:
+        bloom.add(doc["event_id"])
+
+    return bloom
+
+
+def load_bloom_filter(collection, path=BLOOM_PATH):
+    """
+    Lê o filtro gravado em disco; reconstrói-o se não existir, estiver
+    corrompido ou tiver ultrapassado a capacidade.
+    """
+    if os.path.exists(path):
+        try:
+            bloom = BloomFilter.load(path)
+            if not bloom.is_saturated():
+                return bloom
+            return seed_bloom_filter(collection, capacity=bloom.count * 2)
+        except (ValueError, OSError):
+            pass
+
+    return seed_bloom_filter(collection)
+
+
+def filter_new_events(collection, docs, bloom):
+    """
+    Remove duplicados antes do insert; devolve (novos, duplicados).
+
+    - duplicados dentro do bloco: conjunto exato
+    - event_id fora do filtro: de certeza novo, vai direto para o insert
+    - event_id no filtro: possível duplicado, confirmado na coleção
+    """
+    seen = set()
+    new_docs = []
+    maybe_seen = {}
+    duplicates = 0
+
+    with _bloom_lock:
+        for doc in docs:
+            event_id = doc.get("event_id")
+
+            if event_id is None:
+                new_docs.append(doc)
+                continue
+
+            if event_id in seen:
+                duplicates += 1
+                continue
+            seen.add(event_id)
+
+            if event_id in bloom:
+                maybe_seen[event_id] = doc
+            else:
+                new_docs.append(doc)
+
+    if maybe_seen:
+        existing = {
+            d["event_id"]
+            for d in collection.find(
+                {"event_id": {"$in": list(maybe_seen)}},
+                {"event_id": 1, "_id": 0},
+            )
+        }
+        duplicates += len(existing)
+        new_docs.extend(doc for event_id, doc in maybe_seen.items() if event_id not in existing)
+
+    return new_docs, duplicates
+
+
+def iter_chunks(jsonl_path: Path, chunk_size: int = CHUNK_SIZE, start_offset: int = 0):
+    """
+    Lê o ficheiro JSONL a partir de start_offset em blocos de no máximo
+    chunk_size eventos. Devolve (eventos, offset a seguir ao bloco).
+
+    Uma última linha sem "\n" ainda está a ser escrita e fica para a
+    próxima leitura.
+    """
+    chunk = []
+    offset = start_offset
+
+    with jsonl_path.open("rb") as f:
+        f.seek(start_offset)
 
-    with jsonl_path.open("r", encoding="utf-8") as f:
         for line in f:
-            if line.strip():
-                docs.append(json.loads(line))
+            if not line.endswith(b"\n"):
+                break
 
-    if not docs:
-        print(f"Nenhum evento encontrado em {jsonl_path}")
-        return
+            offset += len(line)
+
+            if not line.strip():
+                continue
+
+            chunk.append(json.loads(line))
+
+            if len(chunk) >= chunk_size:
+                yield chunk, offset
+                chunk = []
+
+    if chunk or offset != start_offset:
+        yield chunk, offset
 
+
+def insert_chunk(collection, docs):
+    """
+    Insere um bloco sem ordem; devolve (inseridos, duplicados).
+    Erros que não sejam de chave duplicada são propagados.
+    """
     try:
         result = collection.insert_many(docs, ordered=False)
-        print(f"{jsonl_path.name}: {len(result.inserted_ids)} eventos inseridos.")
+        return len(result.inserted_ids), 0
     except BulkWriteError as e:
-        print("Alguns eventos duplicados foram ignorados.")
-        print(f"Inseridos: {e.details.get('nInserted', 0)}")
+        errors = e.details.get("writeErrors", [])
+        duplicates = sum(1 for err in errors if err.get("code") == DUPLICATE_KEY_ERROR)
+
+        if duplicates < len(errors):
+            raise
+
+        return e.details.get("nInserted", 0), duplicates
+
+
+def load_events(jsonl_path: Path, collection=None, chunk_size: int = CHUNK_SIZE, bloom=None,
+                start_offset: int = 0):
+    """
+    Carrega o ficheiro a partir de start_offset.
+    Devolve (inseridos, duplicados, offset final).
+    """
+    if collection is None:
+        collection = get_database(DB_NAME, profile="bulk")["events_raw"]
+
+    inserted = 0
+    duplicates = 0
+    offset = start_offset
+
+    for docs, offset in iter_chunks(jsonl_path, chunk_size, start_offset):
+        if bloom is not None and docs:
+            docs, filtered = filter_new_events(collection, docs, bloom)
+            duplicates += filtered
+
+        if not docs:
+            continue
+
+        chunk_inserted, chunk_duplicates = insert_chunk(collection, docs)
+        inserted += chunk_inserted
+        duplicates += chunk_duplicates
+
+        if bloom is not None:
+            # Inseridos ou rejeitados pelo índice, todos existem agora na coleção
+            with _bloom_lock:
+                for doc in docs:
+                    if doc.get("event_id") is not None:
+                        bloom.add(doc["event_id"])
+
+    name = f"{jsonl_path.parent.name}/{jsonl_path.name}"
+
+    if not inserted and not duplicates:
+        print(f"Nenhum evento novo encontrado em {jsonl_path}")
+    else:
+        print(f"{name}: {inserted} eventos inseridos, {duplicates} duplicados ignorados.")
+
+    return inserted, duplicates, offset
+
+
+def ingest_file(jsonl_path: Path, collection, chunk_size, bloom, manifest):
+    """
+    Carrega só o que ainda não foi carregado do ficheiro e atualiza o manifesto.
+    """
+    key = str(jsonl_path)
+    start_offset = resume_offset(jsonl_path, manifest.get(key))
+
+    if start_offset is None:
+        return 0, 0
+
+    # Antes de ler: se o ficheiro mudar durante a carga, a próxima execução verifica-o
+    stat = jsonl_path.stat()
+    inserted, duplicates, offset = load_events(jsonl_path, collection, chunk_size, bloom, start_offset)
+
+    manifest[key] = {
+        "offset": offset,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "fingerprint": file_fingerprint(jsonl_path, offset),
+        "content_hash": content_hash(jsonl_path, offset),
+    }
+
+    return inserted, duplicates
+
+
+def ingest_pass(base_dir: Path, collection, chunk_size, workers, bloom, manifest):
+    jsonl_files = sorted(base_dir.glob("*/events.jsonl"))
+
+    if not jsonl_files:
+        print("Nenhum ficheiro events.jsonl encontrado.")
+        return 0, 0
+
+    # As threads herdam a etapa de command_stage (métricas dos comandos)
+    context = contextvars.copy_context()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda path: context.copy().run(ingest_file, path, collection, chunk_size, bloom, manifest),
+            jsonl_files,
+        ))
+
+    save_manifest(manifest)
+    if bloom is not None:
+        bloom.save(BLOOM_PATH)
+
+    return sum(r[0] for r in results), sum(r[1] for r in results)
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="Eventos por insert_many")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Ficheiros diários carregados em simultâneo")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Desativa o filtro de duplicados antes do insert")
+    parser.add_argument("--follow", action="store_true",
+                        help="Continua a verificar os ficheiros e carrega as linhas novas")
+    parser.add_argument("--interval", type=float, default=FOLLOW_INTERVAL,
+                        help="Segundos entre verificações no modo --follow")
+    args = parser.parse_args()
+
     base_dir = Path("data/live_events")
 
     if not base_dir.exists():
         print("Diretório data/live_events não encontrado.")
         return
 
-    jsonl_files = list(base_dir.glob("*/events.jsonl"))
+    # MongoClient é thread-safe: um único pool de ligações para todos os ficheiros
+    collection = get_database(DB_NAME, profile="bulk")["events_raw"]
+    chunk_size = max(args.chunk_size, 1)
+    workers = max(args.workers, 1)
+    bloom = None if args.no_dedup else load_bloom_filter(collection)
+    manifest = load_manifest()
 
-    if not jsonl_files:
-        print("Nenhum ficheiro events.jsonl encontrado.")
-        return
+    while True:
+        with command_stage("live"):
+            total_inserted, total_duplicates = ingest_pass(
+                base_dir, collection, chunk_size, workers, bloom, manifest
+            )
+        print(f"Total: {total_inserted} eventos inseridos, {total_duplicates} duplicados ignorados.")
+        print_command_report()
+
+        if not args.follow:
+            break
 
-    for file in jsonl_files:
-        load_events(file)
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            break
 
 
 if __name__ == "__main__":
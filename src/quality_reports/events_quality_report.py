@@ -1,29 +1,380 @@
-from src.config.mongo_client import get_mongo_client
+from src.config.mongo_client import STORAGE_BACKEND, get_mongo_client
+from src.time_utils import NAT, STRPTIME_FORMATS, parse_timestamps
+from datetime import datetime, timedelta
+from pymongo import ReplaceOne
+import argparse
+import calendar
+import numpy as np
 import os
+import pandas as pd
 
 DB_NAME = os.getenv("MONGO_DB", "commercepulse")
 
-def main():
-    client = get_mongo_client()
-    db = client[DB_NAME]
-    events = db.events_raw
+# Um documento por dia de ingested_at com as métricas da última execução
+BUCKETS_COLLECTION = "events_quality_daily"
 
-    report = {}
+# Acima disto um epoch numérico está em milissegundos (como em time_utils)
+EPOCH_MS_THRESHOLD = 10 ** 11
 
-    report["total_events"] = events.count_documents({})
+METRICS = ["total_events", "missing_event_id", "invalid_event_time", "invalid_ingested_at", "future_events"]
 
-    report["missing_event_id"] = events.count_documents({
-        "event_id": {"$exists": False}
-    })
 
-    report["future_events"] = events.count_documents({
-        "$expr": {"$gt": ["$event_time", "$ingested_at"]}
+def normalized_date(field):
+    """
+    Expressão de agregação que converte o campo em data (ou null): aceita
+    datetime, epoch numérico e strings nos formatos de time_utils.
+    """
+    value = f"${field}"
+
+    def from_string(fmt=None):
+        spec = {"dateString": value, "onError": None, "onNull": None}
+        if fmt:
+            spec["format"] = fmt
+        return {"$dateFromString": spec}
+
+    def from_epoch(number):
+        return {"$toDate": {"$cond": [
+            {"$lt": [{"$abs": number}, EPOCH_MS_THRESHOLD]},
+            {"$multiply": [number, 1000]},
+            number,
+        ]}}
+
+    # Formatos conhecidos primeiro; depois ISO 8601 genérico e epoch em texto
+    parsed = from_epoch({"$convert": {"input": value, "to": "double", "onError": None, "onNull": None}})
+    for fmt in [None, *reversed(list(STRPTIME_FORMATS.values()))]:
+        parsed = {"$ifNull": [from_string(fmt), parsed]}
+
+    return {"$switch": {
+        "branches": [
+            {"case": {"$eq": [{"$type": value}, "date"]}, "then": value},
+            {"case": {"$in": [{"$type": value}, ["int", "long", "double", "decimal"]]}, "then": from_epoch(value)},
+            {"case": {"$eq": [{"$type": value}, "string"]}, "then": parsed},
+        ],
+        "default": None,
+    }}
+
+
+def day_window(since=None, until=None):
+    """
+    Alarga a janela a dias inteiros, para os buckets diários ficarem completos.
+    """
+    if since is not None:
+        since = datetime(since.year, since.month, since.day)
+    if until is not None:
+        floor = datetime(until.year, until.month, until.day)
+        until = floor if floor == until else floor + timedelta(days=1)
+    return since, until
+
+
+def _bounds(since, until, convert):
+    bounds = {}
+    if since is not None:
+        bounds["$gte"] = convert(since)
+    if until is not None:
+        bounds["$lt"] = convert(until)
+    return bounds
+
+
+def window_prefilter(since, until):
+    """
+    Filtro sobre ingested_at (índice de src.db.create_indexes) que cobre todos os valores que
+    normalized_date aceita: datetime (bootstrap), epoch numérico ou em texto
+    (segundos ou ms) e strings com data ISO ou com barras. É um superconjunto;
+    o corte exato é feito depois de normalizar.
+    """
+    def epoch(value):
+        return calendar.timegm(value.timetuple())
+
+    # Folga de um dia nas strings: podem ter offset de fuso
+    slack = timedelta(days=1)
+    text_since = since - slack if since is not None else None
+    text_until = until + slack if until is not None else None
+
+    clauses = [
+        {"$type": "date", **_bounds(since, until, lambda d: d)},
+        {"$type": "number", **_bounds(since, until, epoch)},
+        {"$type": "number", **_bounds(since, until, lambda d: epoch(d) * 1000)},
+        # Epoch em texto: os primeiros 10 dígitos são os segundos, por isso a
+        # ordem lexicográfica serve também para ms e frações
+        {"$type": "string", "$regex": r"^\d+(\.\d*)?$", **_bounds(since, until, lambda d: str(epoch(d)))},
+    ]
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d"):
+        clauses.append({"$type": "string", **_bounds(text_since, text_until, lambda d, fmt=fmt: d.strftime(fmt))})
+
+    return {"$or": [{"ingested_at": clause} for clause in clauses]}
+
+
+def _is_null(field):
+    return {"$eq": [{"$ifNull": [field, None]}, None]}
+
+
+def quality_pipeline(since=None, until=None):
+    """
+    Uma só agregação ($facet) com todas as métricas, por tipo e por dia.
+    """
+    pipeline = []
+
+    if since is not None or until is not None:
+        pipeline.append({"$match": window_prefilter(since, until)})
+
+    pipeline.append({"$project": {
+        "_id": 0,
+        "event_type": 1,
+        "has_event_id": {"$ne": [{"$type": "$event_id"}, "missing"]},
+        "event_time": normalized_date("event_time"),
+        "ingested_at": normalized_date("ingested_at"),
+    }})
+
+    if since is not None or until is not None:
+        exact = {}
+        if since is not None:
+            exact["$gte"] = since
+        if until is not None:
+            exact["$lt"] = until
+        pipeline.append({"$match": {"ingested_at": exact}})
+
+    pipeline.append({"$addFields": {
+        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$ingested_at", "onNull": None}},
+    }})
+
+    metrics = {
+        "total_events": {"$sum": 1},
+        "missing_event_id": {"$sum": {"$cond": ["$has_event_id", 0, 1]}},
+        "invalid_event_time": {"$sum": {"$cond": [_is_null("$event_time"), 1, 0]}},
+        "invalid_ingested_at": {"$sum": {"$cond": [_is_null("$ingested_at"), 1, 0]}},
+        "future_events": {"$sum": {"$cond": [
+            {"$and": [
+                {"$not": [_is_null("$event_time")]},
+                {"$not": [_is_null("$ingested_at")]},
+                {"$gt": ["$event_time", "$ingested_at"]},
+            ]},
+            1,
+            0,
+        ]}},
+    }
+
+    pipeline.append({"$facet": {
+        "totals": [{"$group": {"_id": None, **metrics}}],
+        "by_type": [
+            {"$group": {"_id": "$event_type", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+        ],
+        "by_day": [{"$group": {"_id": "$day", **metrics}}],
+        "by_day_type": [
+            {"$group": {"_id": {"day": "$day", "event_type": "$event_type"}, "count": {"$sum": 1}}},
+        ],
+    }})
+
+    return pipeline
+
+
+def build_report(facets):
+    totals = facets["totals"][0] if facets["totals"] else {}
+
+    report = {metric: totals.get(metric, 0) for metric in METRICS}
+    report["by_type"] = facets["by_type"]
+    return report
+
+
+def daily_buckets(facets, run_at):
+    """
+    Documentos por dia de ingested_at (eventos sem ingested_at válido só
+    entram nos totais).
+    """
+    by_type = {}
+    for row in facets["by_day_type"]:
+        by_type.setdefault(row["_id"]["day"], {})[str(row["_id"]["event_type"])] = row["count"]
+
+    buckets = []
+    for row in facets["by_day"]:
+        day = row["_id"]
+        if day is None:
+            continue
+        bucket = {"_id": day, "day": day, "run_at": run_at}
+        bucket.update({metric: row[metric] for metric in METRICS})
+        bucket["by_type"] = by_type.get(day, {})
+        buckets.append(bucket)
+
+    return buckets
+
+
+def save_buckets(collection, buckets):
+    if not buckets:
+        return
+    collection.bulk_write([ReplaceOne({"_id": b["_id"]}, b, upsert=True) for b in buckets], ordered=False)
+
+
+def read_trend(collection, since=None, until=None):
+    """
+    Buckets diários guardados, por ordem de dia, sem reler events_raw.
+    """
+    query = {}
+    if since is not None:
+        query.setdefault("day", {})["$gte"] = since.strftime("%Y-%m-%d")
+    if until is not None:
+        query.setdefault("day", {})["$lt"] = until.strftime("%Y-%m-%d")
+    return list(collection.find(query).sort("day", 1))
+
+
+def quality_facets(db, since=None, until=None):
+    if STORAGE_BACKEND == "embedded":
+        return reference_facets(db.events_raw, since, until)
+    return next(db.events_raw.aggregate(quality_pipeline(since, until), allowDiskUse=True))
+
+
+def run_report(db, since=None, until=None):
+    """
+    Calcula as métricas (opcionalmente só numa janela de ingested_at),
+    guarda os buckets diários e devolve o relatório.
+    """
+    since, until = day_window(since, until)
+
+    facets = quality_facets(db, since, until)
+
+    save_buckets(db[BUCKETS_COLLECTION], daily_buckets(facets, datetime.utcnow()))
+    return build_report(facets)
+
+
+def frame_facets(docs, since=None, until=None):
+    """
+    As mesmas facetas calculadas com pandas a partir dos documentos, com as
+    datas normalizadas por time_utils.parse_timestamps (ao segundo). É o
+    caminho do armazenamento embebido, que não tem aggregate.
+    """
+    docs = list(docs)
+    frame = pd.DataFrame({
+        "event_type": pd.Series([doc.get("event_type") for doc in docs], dtype=object),
+        "missing_event_id": np.array([int("event_id" not in doc) for doc in docs], dtype=np.int64),
     })
+    event_time = parse_timestamps((doc.get("event_time") for doc in docs), field="event_time")
+    ingested_at = parse_timestamps((doc.get("ingested_at") for doc in docs), field="ingested_at")
+
+    keep = np.ones(len(frame), dtype=bool)
+    if since is not None:
+        keep &= (ingested_at != NAT) & (ingested_at >= calendar.timegm(since.timetuple()))
+    if until is not None:
+        keep &= (ingested_at != NAT) & (ingested_at < calendar.timegm(until.timetuple()))
+    frame, event_time, ingested_at = frame[keep].reset_index(drop=True), event_time[keep], ingested_at[keep]
+
+    frame["total_events"] = 1
+    frame["invalid_event_time"] = (event_time == NAT).astype(np.int64)
+    frame["invalid_ingested_at"] = (ingested_at == NAT).astype(np.int64)
+    frame["future_events"] = ((event_time != NAT) & (ingested_at != NAT) & (event_time > ingested_at)).astype(np.int64)
+
+    days = np.full(len(frame), None, dtype=object)
+    valid = ingested_at != NAT
+    days[valid] = np.datetime_as_string(ingested_at[valid].astype("datetime64[s]"), unit="D")
+    frame["day"] = days
+
+    def key(value):
+        return None if pd.isna(value) else value
+
+    def counts(row):
+        return {metric: int(row[metric]) for metric in METRICS}
+
+    by_type = frame.groupby("event_type", dropna=False, sort=False).size().sort_values(ascending=False, kind="stable")
+    by_day = frame.groupby("day", dropna=False, sort=False)[METRICS].sum()
+    by_day_type = frame.groupby(["day", "event_type"], dropna=False, sort=False).size()
+
+    return {
+        "totals": [{"_id": None, **counts(frame[METRICS].sum())}] if len(frame) else [],
+        "by_type": [{"_id": key(t), "count": int(n)} for t, n in by_type.items()],
+        "by_day": [{"_id": key(day), **counts(row)} for day, row in by_day.iterrows()],
+        "by_day_type": [
+            {"_id": {"day": key(day), "event_type": key(t)}, "count": int(n)}
+            for (day, t), n in by_day_type.items()
+        ],
+    }
+
+
+def reference_facets(collection, since=None, until=None):
+    """
+    frame_facets sobre toda a coleção: sem window_prefilter, para --check
+    validar também o pré-filtro.
+    """
+    projection = {"_id": 0, "event_type": 1, "event_id": 1, "event_time": 1, "ingested_at": 1}
+    return frame_facets(collection.find({}, projection), since, until)
+
+
+def check_report(db, since=None, until=None):
+    """
+    Compara a agregação com a referência pandas e, sem janela, com as
+    consultas do relatório antigo (contagens diretas). Devolve as diferenças.
+    """
+    since, until = day_window(since, until)
+    events = db.events_raw
+
+    facets = quality_facets(db, since, until)
+    expected = reference_facets(events, since, until)
+    differences = []
+
+    def compare(name, got, want):
+        if got != want:
+            differences.append(f"{name}: agregação={got} esperado={want}")
+
+    report = build_report(facets)
+    reference = build_report(expected)
+    for metric in METRICS:
+        compare(metric, report[metric], reference[metric])
+    compare("by_type", {r["_id"]: r["count"] for r in report["by_type"]},
+            {r["_id"]: r["count"] for r in reference["by_type"]})
+
+    days = {row["_id"]: row for row in facets["by_day"]}
+    for row in expected["by_day"]:
+        got = days.pop(row["_id"], {})
+        for metric in METRICS:
+            compare(f"{row['_id']} {metric}", got.get(metric, 0), row[metric])
+    for day in days:
+        differences.append(f"{day}: só na agregação")
+
+    if since is None and until is None:
+        compare("total_events (count_documents)", report["total_events"], events.count_documents({}))
+        compare("missing_event_id (count_documents)", report["missing_event_id"],
+                events.count_documents({"event_id": {"$exists": False}}))
+        legacy_types = events.aggregate([{"$group": {"_id": "$event_type", "count": {"$sum": 1}}}])
+        compare("by_type ($group)", {r["_id"]: r["count"] for r in report["by_type"]},
+                {r["_id"]: r["count"] for r in legacy_types})
+
+    return differences
+
+
+def parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--since", type=parse_day, help="Início da janela de ingested_at (YYYY-MM-DD)")
+    p.add_argument("--until", type=parse_day, help="Fim (exclusivo) da janela de ingested_at (YYYY-MM-DD)")
+    p.add_argument("--trend", action="store_true",
+                   help="Mostra os buckets diários guardados em vez de recalcular")
+    p.add_argument("--check", action="store_true",
+                   help="Valida a agregação no servidor contra o cálculo pandas (não grava buckets)")
+    args = p.parse_args()
+
+    if STORAGE_BACKEND == "embedded" and args.check:
+        raise SystemExit("--check valida a agregação MongoDB: use STORAGE_BACKEND=mongo")
+
+    client = get_mongo_client()
+    db = client[DB_NAME]
+
+    if args.check:
+        differences = check_report(db, args.since, args.until)
+        print("\nEVENTS QUALITY CHECK")
+        print("====================")
+        for line in differences:
+            print(line)
+        print("ok: a agregação coincide com a referência" if not differences else f"{len(differences)} diferença(s)")
+        raise SystemExit(1 if differences else 0)
+
+    if args.trend:
+        print("\nEVENTS QUALITY TREND")
+        print("====================")
+        for bucket in read_trend(db[BUCKETS_COLLECTION], args.since, args.until):
+            print(bucket["day"] + ": " + ", ".join(f"{m}={bucket[m]}" for m in METRICS))
+        return
 
-    report["by_type"] = list(events.aggregate([
-        {"$group": {"_id": "$event_type", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}}
-    ]))
+    report = run_report(db, args.since, args.until)
 
     print("\nEVENTS QUALITY REPORT")
     print("=====================")
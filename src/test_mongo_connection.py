@@ -1,17 +1,20 @@
-from pymongo import MongoClient
-from dotenv import load_dotenv
 import os
 
-load_dotenv()
+from src.config.mongo_client import get_mongo_client
 
-mongo_uri = os.getenv("MONGO_URI")
-mongo_db = os.getenv("MONGO_DB")
 
-print("MONGO_URI:", mongo_uri)
-print("MONGO_DB:", mongo_db)
+def main():
+    mongo_uri = os.getenv("MONGO_URI")
+    mongo_db = os.getenv("MONGO_DB")
 
-client = MongoClient(mongo_uri)
-db = client[mongo_db]
+    print("MONGO_URI:", mongo_uri)
+    print("MONGO_DB:", mongo_db)
 
-print("Bases de dados disponíveis:")
-print(client.list_database_names())
+    client = get_mongo_client()
+
+    print("Bases de dados disponíveis:")
+    print(client.list_database_names())
+
+
+if __name__ == "__main__":
+    main()
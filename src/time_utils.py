@@ -0,0 +1,207 @@
+"""
+Parsing dos vários formatos de data/hora dos vendors para epoch UTC (segundos).
+
+Formatos conhecidos:
+- 2023-10-10T22:31:55Z        (ISO com Z)
+- 2023-10-10T22:31:55         (ISO sem fuso; tratado como UTC)
+- 2023-10-10 22:31            (vendor_a "created")
+- 2023/10/10 22:31:55         (vendor_a "paidAt")
+- 1736937828                  (epoch, vendor_c "ts"/"timestamp")
+- datetime                    (ingested_at do bootstrap)
+- outro ISO 8601 (offset, frações de segundo)
+
+parse_timestamp trata um valor; parse_timestamps trata um array inteiro e
+guarda em cache os formatos encontrados para cada (vendor, campo).
+"""
+import calendar
+import re
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Valor devolvido por parse_timestamps quando não há data válida
+NAT = np.iinfo(np.int64).min
+
+# event_time que o bootstrap grava em registos sem created_at/timestamp. Não
+# é uma data: quem calcula epochs trata-o como em falta (continua gravado
+# porque entra no event_id).
+PLACEHOLDER_EVENT_TIME = "1970-01-01T00:00:00"
+PLACEHOLDER_EPOCH = 0
+
+STRPTIME_FORMATS = {
+    "iso_z": "%Y-%m-%dT%H:%M:%SZ",
+    "iso_naive": "%Y-%m-%dT%H:%M:%S",
+    "minute": "%Y-%m-%d %H:%M",
+    "slash": "%Y/%m/%d %H:%M:%S",
+}
+
+# Acima disto um epoch numérico está em milissegundos
+_EPOCH_MS_THRESHOLD = 10 ** 11
+
+# Frações de segundo de qualquer comprimento (fromisoformat só aceita 3 ou 6 dígitos)
+_FRACTION = re.compile(r"([T ]\d{2}:\d{2}:\d{2})\.(\d+)")
+
+# (vendor, campo) -> formatos já vistos, pela ordem em que foram detetados
+_FORMAT_CACHE = {}
+
+
+def _datetime_epoch(value):
+    if value.tzinfo is None:
+        return calendar.timegm(value.timetuple())
+    return int(value.timestamp())
+
+
+def _fromisoformat(value):
+    """
+    datetime.fromisoformat com Z e frações de 1 a 9+ dígitos (acertadas para 6).
+    """
+    value = _FRACTION.sub(lambda m: f"{m.group(1)}.{m.group(2)[:6].ljust(6, '0')}", value)
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _number_epoch(value):
+    value = float(value)
+    if abs(value) >= _EPOCH_MS_THRESHOLD:
+        value /= 1000
+    return int(value)
+
+
+def detect_format(value):
+    """
+    Nome do formato de um valor, ou None se não for reconhecido.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+
+    if isinstance(value, datetime):
+        return "datetime"
+
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return None if np.isnan(value) else "epoch"
+
+    if not isinstance(value, str):
+        return None
+
+    value = value.strip()
+
+    for name, fmt in STRPTIME_FORMATS.items():
+        try:
+            datetime.strptime(value, fmt)
+            return name
+        except ValueError:
+            pass
+
+    try:
+        float(value)
+        return "epoch"
+    except ValueError:
+        pass
+
+    try:
+        _fromisoformat(value)
+        return "iso"
+    except ValueError:
+        return None
+
+
+def parse_timestamp(value):
+    """
+    Epoch UTC em segundos (int), ou None se o valor não for uma data reconhecida.
+    """
+    fmt = detect_format(value)
+
+    if fmt is None:
+        return None
+
+    if fmt == "datetime":
+        return _datetime_epoch(value)
+
+    if fmt == "epoch":
+        return _number_epoch(value)
+
+    value = value.strip()
+
+    if fmt == "iso":
+        return _datetime_epoch(_fromisoformat(value))
+
+    return calendar.timegm(datetime.strptime(value, STRPTIME_FORMATS[fmt]).timetuple())
+
+
+def parse_datetime(value):
+    """
+    Como parse_timestamp, mas devolve datetime UTC sem tzinfo.
+    """
+    epoch = parse_timestamp(value)
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None)
+
+
+def _parse_series(values, fmt):
+    """
+    Epochs (float, NaN quando falha) de uma Série, assumindo o formato fmt.
+    """
+    if fmt == "epoch":
+        numbers = pd.to_numeric(values.where(values.map(type) != bool), errors="coerce")
+        return numbers.where(numbers.abs() < _EPOCH_MS_THRESHOLD, numbers / 1000).floordiv(1)
+
+    if fmt == "datetime":
+        candidates = values.where(values.map(lambda v: isinstance(v, datetime)))
+        parsed = pd.to_datetime(candidates, errors="coerce", utc=True)
+    else:
+        candidates = values.where(values.map(type) == str).str.strip()
+        pd_format = "ISO8601" if fmt == "iso" else STRPTIME_FORMATS[fmt]
+        parsed = pd.to_datetime(candidates, format=pd_format, errors="coerce", utc=True)
+
+    epochs = pd.Series(np.nan, index=values.index)
+    valid = parsed.notna().to_numpy()
+    epochs[valid] = parsed[valid].astype("int64").to_numpy() // 10 ** 9
+    return epochs
+
+
+def parse_timestamps(values, vendor=None, field=None):
+    """
+    Versão vetorizada de parse_timestamp.
+
+    Devolve um np.ndarray int64 de epochs UTC (NAT onde não há data válida).
+    Os formatos são detetados numa amostra e guardados por (vendor, field);
+    linhas noutro formato são detetadas e tratadas num passo seguinte.
+    """
+    values = pd.Series(list(values), dtype=object)
+    epochs = pd.Series(np.nan, index=values.index)
+
+    pending = values.notna()
+    leftovers = []
+    formats = _FORMAT_CACHE.setdefault((vendor, field), [])
+    tried = set()
+
+    while pending.any():
+        fmt = next((f for f in formats if f not in tried), None)
+
+        if fmt is None:
+            first = pending.idxmax()
+            fmt = detect_format(values[first])
+
+            if fmt is None or fmt in tried:
+                pending[first] = False
+                leftovers.append(first)
+                continue
+
+            formats.append(fmt)
+
+        tried.add(fmt)
+        parsed = _parse_series(values[pending], fmt)
+        epochs[parsed.index] = parsed
+        pending &= epochs.isna()
+
+    # Valores que nenhum formato resolveu em lote: um a um
+    for idx in leftovers:
+        epoch = parse_timestamp(values[idx])
+        if epoch is not None:
+            epochs[idx] = epoch
+
+    result = np.full(len(values), NAT, dtype=np.int64)
+    valid = epochs.notna().to_numpy()
+    result[valid] = epochs[valid].to_numpy().astype(np.int64)
+    return result
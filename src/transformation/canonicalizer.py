@@ -0,0 +1,227 @@
+"""
+Converte payloads de vendors diferentes num registo canónico largo.
+
+canonicalize_batch aplica o registo (schema_registry) coluna a coluna com
+pandas; canonicalize_payload é a versão linha a linha, usada como referência.
+"""
+import numpy as np
+import pandas as pd
+
+from src.transformation.schema_registry import (
+    CANONICAL_FIELDS,
+    FIELD_ALIASES,
+    ITEM_ALIASES,
+    VENDOR_MARKERS,
+    split_path,
+)
+
+_MISSING = object()
+
+_UPPERCASE_FIELDS = ("currency", "status")
+_NUMERIC_FIELDS = ("amount", "item_count", "items_quantity", "items_amount")
+
+
+# --------------------------------------------------
+# Linha a linha (referência)
+# --------------------------------------------------
+
+def _get_path(data, parts):
+    for part in parts:
+        if isinstance(part, int):
+            if not isinstance(data, list) or not -len(data) <= part < len(data):
+                return _MISSING
+        elif not isinstance(data, dict) or part not in data:
+            return _MISSING
+        data = data[part]
+    return data
+
+
+def _first_present(data, paths, accept=None):
+    for path in paths:
+        value = _get_path(data, split_path(path))
+        if value is not _MISSING and value is not None and (accept is None or accept(value)):
+            return value
+    return None
+
+
+def infer_vendor(vendor, payload):
+    if vendor in FIELD_ALIASES:
+        return vendor
+
+    for key, inferred in VENDOR_MARKERS.items():
+        if key in payload:
+            return inferred
+
+    return None
+
+
+def canonicalize_payload(vendor, payload):
+    """
+    Registo canónico de um único payload.
+    """
+    record = dict.fromkeys(CANONICAL_FIELDS)
+    aliases = FIELD_ALIASES.get(infer_vendor(vendor, payload or {}))
+
+    if not aliases or not isinstance(payload, dict):
+        return record
+
+    for field, paths in aliases.items():
+        if field == "items":
+            continue
+        accept = (lambda v: not isinstance(v, dict)) if field == "order_id" else None
+        record[field] = _first_present(payload, paths, accept)
+
+    items = _first_present(payload, aliases["items"])
+    if isinstance(items, list):
+        qty_total = 0
+        amount_total = 0
+        for item in items:
+            qty = _first_present(item, ITEM_ALIASES["qty"])
+            price = _first_present(item, ITEM_ALIASES["price"])
+            qty = qty if qty is not None else np.nan
+            price = price if price is not None else np.nan
+            qty_total += qty
+            amount_total += qty * price
+        record["item_count"] = len(items)
+        record["items_quantity"] = qty_total
+        record["items_amount"] = amount_total
+
+    for field in _UPPERCASE_FIELDS:
+        if isinstance(record[field], str):
+            record[field] = record[field].upper()
+
+    if record["amount"] is not None:
+        record["amount"] = pd.to_numeric(record["amount"], errors="coerce")
+
+    return record
+
+
+# --------------------------------------------------
+# Em lote, coluna a coluna
+# --------------------------------------------------
+
+def _column(frame, parts):
+    """
+    Série com o valor do caminho em cada linha (NaN quando não existe).
+    """
+    if parts[0] not in frame.columns:
+        return None
+
+    series = frame[parts[0]]
+    for part in parts[1:]:
+        if series.dtype != object or not series.notna().any():
+            return None
+        series = series.str.get(part)
+    return series
+
+
+def _coalesce(frame, paths, accept_types=None):
+    """
+    Primeiro valor não nulo entre as colunas dos caminhos indicados.
+    """
+    result = None
+
+    for path in paths:
+        series = _column(frame, split_path(path))
+        if series is None:
+            continue
+        if accept_types is not None:
+            series = series.where(series.map(type).isin(accept_types))
+        result = series if result is None else result.fillna(series)
+
+    return result
+
+
+def _items_totals(items, index):
+    """
+    (item_count, items_quantity, items_amount) por linha a partir das listas
+    de itens, com explode + groupby em vez de ciclos por evento.
+    """
+    # object: num lote sem nenhuma lista a coluna vem toda NaN (float) e .str falha
+    lists = items.astype(object).where(items.map(type) == list)
+    exploded = lists.explode().dropna()
+
+    count = lists.str.len()
+
+    if exploded.empty:
+        empty = pd.Series(np.nan, index=index)
+        return count, empty.where(count.isna(), 0), empty.where(count.isna(), 0)
+
+    item_frame = pd.DataFrame.from_records(exploded.tolist(), index=exploded.index)
+    qty = pd.to_numeric(_coalesce(item_frame, ITEM_ALIASES["qty"]), errors="coerce")
+    price = pd.to_numeric(_coalesce(item_frame, ITEM_ALIASES["price"]), errors="coerce")
+
+    grouped_qty = qty.groupby(level=0).sum(min_count=1)
+    grouped_amount = (qty * price).groupby(level=0).sum(min_count=1)
+
+    quantity = grouped_qty.reindex(index).where(count.isna(), grouped_qty.reindex(index).fillna(0))
+    amount = grouped_amount.reindex(index).where(count.isna(), grouped_amount.reindex(index).fillna(0))
+
+    return count, quantity, amount
+
+
+def _vendor_columns(aliases):
+    return sorted({split_path(path)[0] for paths in aliases.values() for path in paths})
+
+
+def canonicalize_batch(vendors, payloads):
+    """
+    Registo canónico de um lote de payloads.
+
+    vendors e payloads são sequências alinhadas; devolve um DataFrame com as
+    colunas CANONICAL_FIELDS e uma linha por payload, pela mesma ordem.
+    """
+    payloads = [p if isinstance(p, dict) else {} for p in payloads]
+
+    # Agrupa as posições por formato; cada grupo é tratado coluna a coluna
+    groups = {}
+    for position, (vendor, payload) in enumerate(zip(vendors, payloads)):
+        groups.setdefault(infer_vendor(vendor, payload), []).append(position)
+
+    columns = {field: np.full(len(payloads), np.nan, dtype=object) for field in CANONICAL_FIELDS}
+
+    for vendor, positions in groups.items():
+        aliases = FIELD_ALIASES.get(vendor)
+        if aliases is None:
+            continue
+
+        positions = np.asarray(positions)
+        group = pd.DataFrame.from_records(
+            [payloads[i] for i in positions],
+            columns=_vendor_columns(aliases),
+        )
+
+        for field, paths in aliases.items():
+            if field == "items":
+                continue
+
+            accept = None if field != "order_id" else (str, int, float)
+            values = _coalesce(group, paths, accept)
+            if values is not None:
+                columns[field][positions] = values.to_numpy(dtype=object)
+
+        items = _coalesce(group, aliases["items"])
+        if items is not None:
+            count, quantity, amount = _items_totals(items, group.index)
+            columns["item_count"][positions] = count.to_numpy(dtype=object)
+            columns["items_quantity"][positions] = quantity.to_numpy(dtype=object)
+            columns["items_amount"][positions] = amount.to_numpy(dtype=object)
+
+    result = pd.DataFrame(columns, columns=CANONICAL_FIELDS)
+
+    for field in _UPPERCASE_FIELDS:
+        result[field] = result[field].where(result[field].isna(), result[field].astype(str).str.upper())
+
+    for field in _NUMERIC_FIELDS:
+        result[field] = pd.to_numeric(result[field], errors="coerce")
+    result["item_count"] = result["item_count"].astype("Int64")
+
+    return result
+
+
+def canonical_records(frame):
+    """
+    Linhas do DataFrame como dicts prontos para MongoDB (None em vez de NaN).
+    """
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict("records")
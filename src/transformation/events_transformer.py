@@ -1,11 +1,49 @@
 import os
 import json
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
+from bson import ObjectId
+from pymongo import UpdateOne
 from src.config.mongo_client import get_mongo_client
-from src.analytics.warehouse_simulator import save
+from src.analytics.warehouse_simulator import FACT_COLUMNS, FACT_LOAD_STATE, Warehouse, warehouse_value
+from src.transformation.canonicalizer import canonicalize_batch, canonical_records
+from src.transformation.schema_registry import payload_projection
+from src.time_utils import NAT, PLACEHOLDER_EPOCH, parse_timestamps
 
 DB_NAME = os.getenv("MONGO_DB", "commercepulse")
 
+# Eventos raw enviados por cada bulk_write; a marca avança no fim de cada lote
+BATCH_SIZE = int(os.getenv("TRANSFORM_BATCH_SIZE", "1000"))
+
+# Documentos por ida ao servidor no cursor de leitura
+CURSOR_BATCH_SIZE = int(os.getenv("TRANSFORM_CURSOR_BATCH_SIZE", "5000"))
+
+# Só os campos usados pela transformação; do payload apenas as chaves do registo
+RAW_PROJECTION = {
+    "_id": 1,
+    "event_id": 1,
+    "event_type": 1,
+    "vendor": 1,
+    "event_time": 1,
+    "ingested_at": 1,
+    **payload_projection(),
+}
+
+# Eventos curados inseridos por transação no warehouse
+WAREHOUSE_CHUNK_SIZE = int(os.getenv("WAREHOUSE_CHUNK_SIZE", "5000"))
+
+# Nome da marca de carga em load_state
+WAREHOUSE_STATE = FACT_LOAD_STATE
+
+# Documento em pipeline_state com a marca (_id do último evento raw processado)
+STATE_ID = "events_transformer"
+
+# Os ObjectId são gerados no cliente: loaders paralelos podem inserir um _id
+# ligeiramente menor do que a marca. Relemos esta janela (os upserts são idempotentes).
+WATERMARK_OVERLAP_SECONDS = int(os.getenv("TRANSFORM_WATERMARK_OVERLAP", "300"))
+
 
 def normalize_payload(raw_payload):
     """
@@ -25,38 +63,70 @@ def normalize_payload(raw_payload):
     return {}
 
 
-def extract_order_id(raw_payload):
-    data = normalize_payload(raw_payload)
+def get_watermark(state_col, state_id=STATE_ID):
+    state = state_col.find_one({"_id": state_id})
+    return state.get("last_id") if state else None
 
-    if not data:
-        return None
 
-    if "orderRef" in data:
-        return data["orderRef"]
+def advance_watermark(state_col, last_id, state_id=STATE_ID):
+    """
+    Atualização atómica de um único documento; $max impede que a marca recue.
+    """
+    state_col.update_one(
+        {"_id": state_id},
+        {"$max": {"last_id": last_id}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
 
-    if "order_id" in data:
-        return data["order_id"]
 
-    if isinstance(data.get("order"), dict):
-        return data["order"].get("id")
+def watermark_query(last_id):
+    if last_id is None:
+        return {}
 
-    if isinstance(data.get("order"), str):
-        return data["order"]
+    lower = last_id.generation_time - timedelta(seconds=WATERMARK_OVERLAP_SECONDS)
+    return {"_id": {"$gt": ObjectId.from_datetime(lower)}}
 
-    return None
 
+def event_epochs_for(batch, vendors, event_ts):
+    """
+    Epoch UTC de cada evento: event_time quando é válido, senão a data do
+    próprio payload (event_ts). O event_time de preenchimento do bootstrap
+    (epoch 0) conta como em falta. Os formatos ficam em cache por vendor.
+    """
+    vendors = pd.Series(vendors, dtype=object).fillna("unknown")
+    event_times = pd.Series([ev.get("event_time") for ev in batch], dtype=object)
+    event_ts = pd.Series(event_ts.to_numpy(), dtype=object)
 
-def transform_events():
-    client = get_mongo_client()
-    db = client[DB_NAME]
+    epochs = np.full(len(batch), NAT, dtype=np.int64)
 
-    raw_col = db.events_raw
-    curated_col = db.events_curated
+    for vendor in vendors.unique():
+        mask = (vendors == vendor).to_numpy()
+        from_time = parse_timestamps(event_times[mask], vendor, "event_time")
+        from_time[from_time == PLACEHOLDER_EPOCH] = NAT
+        from_payload = parse_timestamps(event_ts[mask], vendor, "event_ts")
+        epochs[mask] = np.where(from_time != NAT, from_time, from_payload)
 
-    transformed = 0
+    return epochs
+
+
+def transform_batch(curated_col, batch):
+    """
+    Envia os upserts do lote num único bulk_write não ordenado.
+    Devolve o número de eventos novos em events_curated.
+    """
+    operations = []
+
+    vendors = [ev.get("vendor") for ev in batch]
+    canonical_frame = canonicalize_batch(
+        vendors,
+        [normalize_payload(ev.get("payload")) for ev in batch],
+    )
+    event_epochs = event_epochs_for(batch, vendors, canonical_frame["event_ts"])
+    canonical = canonical_records(canonical_frame)
 
-    for ev in raw_col.find():
-        order_id = extract_order_id(ev.get("payload"))
+    for ev, fields, event_epoch in zip(batch, canonical, event_epochs):
+        order_id = fields.pop("order_id")
+        fields["event_epoch"] = None if event_epoch == NAT else int(event_epoch)
 
         doc = {
             "event_id": ev.get("event_id"),
@@ -67,38 +137,131 @@ def transform_events():
             "ingested_at": ev.get("ingested_at"),
         }
 
-        result = curated_col.update_one(
+        # Os campos canónicos derivam só do payload: $set permite preenchê-los
+        # em eventos já curados com --full.
+        operations.append(UpdateOne(
             {"event_id": doc["event_id"]},
-            {"$setOnInsert": doc},
+            {"$setOnInsert": doc, "$set": fields},
             upsert=True,
-        )
+        ))
 
-        if result.upserted_id:
-            transformed += 1
+    if not operations:
+        return 0
+
+    result = curated_col.bulk_write(operations, ordered=False)
+
+    return result.upserted_count
+
+
+def transform_events(full=False):
+    """
+    Transforma os eventos raw para events_curated.
+
+    Em modo incremental só lê os eventos com _id acima da marca guardada em
+    pipeline_state; com full=True relê toda a coleção.
+    """
+    client = get_mongo_client()
+    db = client[DB_NAME]
+
+    raw_col = db.events_raw
+    curated_col = db.events_curated
+    state_col = db.pipeline_state
+
+    # Os upserts filtram por event_id: sem índice cada um seria uma leitura
+    # da coleção inteira, e o índice único impede duplicados entre upserts paralelos
+    curated_col.create_index("event_id", unique=True)
+
+    query = {} if full else watermark_query(get_watermark(state_col))
+
+    transformed = 0
+    batch = []
+
+    cursor = raw_col.find(query, RAW_PROJECTION).sort("_id", 1).batch_size(CURSOR_BATCH_SIZE)
+
+    for ev in cursor:
+        batch.append(ev)
+
+        if len(batch) >= BATCH_SIZE:
+            transformed += transform_batch(curated_col, batch)
+            advance_watermark(state_col, batch[-1]["_id"])
+            batch = []
+
+    if batch:
+        transformed += transform_batch(curated_col, batch)
+        advance_watermark(state_col, batch[-1]["_id"])
 
     print(f"Transformados {transformed} eventos.")
 
     return curated_col
 
 
-def load_to_warehouse(curated_col):
-    data = list(curated_col.find({}, {"_id": 0}))
+def load_warehouse_chunk(warehouse, chunk, last_id):
+    """
+    Insere o bloco e avança a marca na mesma transação SQLite.
+    """
+    rows = [tuple(warehouse_value(doc.get(c)) for c in FACT_COLUMNS) for doc in chunk]
+    chunk_last_id = max(doc["_id"] for doc in chunk)
+    if last_id is not None and last_id > chunk_last_id:
+        chunk_last_id = last_id
+
+    with warehouse.transaction():
+        inserted = warehouse.insert_facts(rows)
+        warehouse.set_state(WAREHOUSE_STATE, str(chunk_last_id))
+
+    return inserted, chunk_last_id
+
+
+def load_to_warehouse(curated_col, full=False):
+    """
+    Carrega em fact_events só os eventos curados depois da última carga, em
+    blocos; event_id único + INSERT OR IGNORE evitam duplicados.
+    """
+    with Warehouse() as warehouse:
+        warehouse.ensure_fact_table()
 
-    if not data:
-        print("Nenhum dado para carregar no warehouse.")
-        return
+        state = warehouse.get_state(WAREHOUSE_STATE)
+        last_id = ObjectId(state) if state else None
+        query = {} if full else watermark_query(last_id)
 
-    df = pd.DataFrame(data)
+        cursor = curated_col.find(
+            query, {"_id": 1, **{c: 1 for c in FACT_COLUMNS}}
+        ).sort("_id", 1).batch_size(CURSOR_BATCH_SIZE)
 
-    save(df, "fact_events")
+        loaded = 0
+        chunk = []
 
-    print("Dados carregados no warehouse com sucesso.")
+        for doc in cursor:
+            chunk.append(doc)
 
+            if len(chunk) >= WAREHOUSE_CHUNK_SIZE:
+                inserted, last_id = load_warehouse_chunk(warehouse, chunk, last_id)
+                loaded += inserted
+                chunk = []
 
-def main():
-    curated_col = transform_events()
-    load_to_warehouse(curated_col)
+        if chunk:
+            inserted, last_id = load_warehouse_chunk(warehouse, chunk, last_id)
+            loaded += inserted
+
+        # Partições antigas: events_curated foi relido até ao fim
+        warehouse.finish_backfill()
+
+    if not loaded:
+        print("Nenhum dado novo para carregar no warehouse.")
+        return 0
+
+    print(f"{loaded} eventos carregados no warehouse com sucesso.")
+    return loaded
+
+
+def main(full=False):
+    curated_col = transform_events(full=full)
+    return load_to_warehouse(curated_col, full=full)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true",
+                        help="Ignora a marca e retransforma todos os eventos raw")
+    args = parser.parse_args()
+
+    main(full=args.full)
@@ -0,0 +1,95 @@
+"""
+Reordenação por event_time com atraso permitido (allowed lateness).
+
+Os eventos ficam num heap por event_time. A marca é o maior event_time já
+visto menos o atraso permitido: tudo o que está abaixo dela sai do buffer
+por ordem de event_time (e, portanto, também por encomenda). Um evento que
+chega já abaixo da marca é "atrasado" e segue pelo caminho de correção do
+consumidor. O buffer só guarda eventos entre a marca e o máximo visto, por
+isso a memória fica limitada pela janela de atraso.
+
+Um evento só faz avançar o máximo até à sua hora de ingestão (nunca além de
+agora) mais o atraso permitido: um event_time no futuro (ano errado, epoch
+em ms lido como s) não pode pôr a marca no futuro e tornar "atrasados"
+todos os eventos seguintes.
+"""
+import heapq
+import itertools
+import os
+import time
+
+# Atraso permitido (segundos de event_time) antes de um evento ser tratado como correção
+ALLOWED_LATENESS_SECONDS = int(os.getenv("ALLOWED_LATENESS_SECONDS", "86400"))
+
+
+def event_time_ceiling(ingested_time=None, allowed_lateness=ALLOWED_LATENESS_SECONDS):
+    """
+    Maior event_time (epoch) que um evento ingerido em ingested_time pode
+    contar para a marca.
+    """
+    now = time.time()
+    reference = now if ingested_time is None else min(ingested_time, now)
+    return int(reference + allowed_lateness)
+
+
+def capped_event_time(event_time, ingested_time=None, allowed_lateness=ALLOWED_LATENESS_SECONDS):
+    if event_time is None:
+        return None
+    return min(event_time, event_time_ceiling(ingested_time, allowed_lateness))
+
+
+class ReorderBuffer:
+
+    def __init__(self, allowed_lateness=ALLOWED_LATENESS_SECONDS, max_event_time=None):
+        self.allowed_lateness = allowed_lateness
+        # Uma marca guardada acima do teto só pode vir de um evento com data no futuro
+        if max_event_time is not None and max_event_time > event_time_ceiling(None, allowed_lateness):
+            max_event_time = None
+        self.max_event_time = max_event_time
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def watermark(self):
+        if self.max_event_time is None:
+            return None
+        return self.max_event_time - self.allowed_lateness
+
+    def push(self, event, event_time, ingested_time=None):
+        """
+        Adiciona um evento (event_time e ingested_time em epoch). Devolve
+        (prontos, atrasados): os eventos que a marca libertou, por ordem de
+        event_time, e o próprio evento se já chegou abaixo da marca.
+        """
+        if event_time is None:
+            # Sem data não há ordem a respeitar
+            return [event], []
+
+        watermark = self.watermark
+        if watermark is not None and event_time < watermark:
+            return [], [event]
+
+        heapq.heappush(self._heap, (event_time, next(self._sequence), event))
+
+        capped = capped_event_time(event_time, ingested_time, self.allowed_lateness)
+        if self.max_event_time is None or capped > self.max_event_time:
+            self.max_event_time = capped
+
+        return self._drain(self.watermark), []
+
+    def _drain(self, limit):
+        ready = []
+        while self._heap and self._heap[0][0] < limit:
+            ready.append(heapq.heappop(self._heap)[2])
+        return ready
+
+    def flush(self):
+        """
+        Liberta tudo o que ainda está no buffer (fim do fluxo).
+        """
+        ready = [item[2] for item in sorted(self._heap)]
+        self._heap = []
+        return ready
@@ -0,0 +1,103 @@
+"""
+Registo declarativo dos nomes de campo usados por cada vendor.
+
+Para cada campo canónico há uma lista de caminhos no payload, por ordem de
+preferência: o primeiro presente ganha. Um caminho usa "." para entrar em
+dicts e inteiros para posições em listas (-1 = último elemento).
+As variantes cobrem o schema drift de live_event_generator.vendor_payload e
+os formatos históricos do bootstrap.
+"""
+
+FIELD_ALIASES = {
+    "vendor_a": {
+        "order_id": ["orderRef"],
+        "amount": ["total", "totalAmount", "amount"],
+        "currency": ["currency"],
+        "region": ["region"],
+        "status": ["status", "payment_status", "updates.-1.status"],
+        "event_ts": ["created", "paidAt", "refundedAt", "updateTime", "update_time",
+                     "updatedAt", "updated_at", "updates.-1.time"],
+        "email": ["customer.email", "buyer.email"],
+        "payment_method": ["method"],
+        "reason": ["reason"],
+        "tracking": ["tracking"],
+        "items": ["items", "refunded_items"],
+    },
+    "vendor_b": {
+        "order_id": ["order_id"],
+        "amount": ["totalAmount", "amountPaid", "amount_paid", "refundAmount"],
+        "currency": ["currencyCode", "currency"],
+        "region": ["state"],
+        "status": ["payment_status", "shipment_status", "status", "status_history.-1.status"],
+        "event_ts": ["created_at", "paid_at", "refunded_at", "time", "updated_at",
+                     "status_history.-1.time"],
+        "email": ["buyerEmail"],
+        "payment_method": ["channel"],
+        "reason": ["refund_reason", "reason"],
+        "tracking": ["tracking_code"],
+        "items": ["line_items", "refunded_items"],
+    },
+    "vendor_c": {
+        "order_id": ["order.id", "order"],
+        "amount": ["amount", "amt"],
+        "currency": ["ccy"],
+        "region": ["geo.region"],
+        "status": ["state", "payment_state", "status", "timeline.-1.status"],
+        "event_ts": ["order.ts", "timestamp", "ts", "timeline.-1.time"],
+        "email": ["email"],
+        "payment_method": ["paymentMethod"],
+        "reason": ["reason"],
+        "tracking": ["tracking"],
+        "items": ["items", "items_refunded"],
+    },
+}
+
+# Campos das linhas de encomenda / reembolso
+ITEM_ALIASES = {
+    "sku": ["sku", "productSku"],
+    "qty": ["qty", "quantity"],
+    "price": ["price", "unit_price", "amount"],
+}
+
+# Os registos históricos não trazem vendor; a chave da encomenda identifica o formato
+VENDOR_MARKERS = {
+    "orderRef": "vendor_a",
+    "order_id": "vendor_b",
+    "order": "vendor_c",
+}
+
+CANONICAL_FIELDS = [
+    "order_id",
+    "amount",
+    "currency",
+    "region",
+    "status",
+    "event_ts",
+    "email",
+    "payment_method",
+    "reason",
+    "tracking",
+    "item_count",
+    "items_quantity",
+    "items_amount",
+]
+
+
+def split_path(path):
+    """
+    "updates.-1.status" -> ["updates", -1, "status"]
+    """
+    return [int(part) if part.lstrip("-").isdigit() else part for part in path.split(".")]
+
+
+def payload_projection(prefix="payload"):
+    """
+    Projeção MongoDB com todas as chaves de topo referidas no registo.
+    """
+    keys = set(VENDOR_MARKERS)
+
+    for aliases in FIELD_ALIASES.values():
+        for paths in aliases.values():
+            keys.update(split_path(path)[0] for path in paths)
+
+    return {f"{prefix}.{key}": 1 for key in sorted(keys)}
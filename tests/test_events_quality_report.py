@@ -0,0 +1,56 @@
+import unittest
+from datetime import datetime
+
+from src.quality_reports.events_quality_report import build_report, daily_buckets, frame_facets
+
+
+DOCS = [
+    # datetime do bootstrap
+    {"event_id": "a", "event_type": "order_historical", "event_time": "2023-03-24T10:00:00Z",
+     "ingested_at": datetime(2025, 1, 1, 12, 0)},
+    # ISO com Z, epoch em segundos, em ms e em texto, data com barras
+    {"event_id": "b", "event_type": "order_created", "event_time": "2025-01-01T09:00:00Z",
+     "ingested_at": "2025-01-01T10:00:00Z"},
+    {"event_id": "c", "event_type": "order_created", "event_time": "2025-01-02T11:00:00Z",
+     "ingested_at": 1735725600},
+    {"event_id": "d", "event_type": "payment_succeeded", "event_time": "nope",
+     "ingested_at": 1735725600000},
+    {"event_type": "payment_succeeded", "event_time": "2025-01-02T09:00:00Z",
+     "ingested_at": "1735812000"},
+    {"event_id": "f", "event_type": "refund_issued", "event_time": "2025-01-03T09:00:00Z",
+     "ingested_at": "2025/01/03 10:00:00"},
+    {"event_id": "g", "event_type": "refund_issued", "event_time": "2025-01-03T09:00:00Z",
+     "ingested_at": None},
+]
+
+
+class FrameFacetsTest(unittest.TestCase):
+
+    def test_totals_and_days(self):
+        facets = frame_facets(DOCS)
+        report = build_report(facets)
+
+        self.assertEqual(report["total_events"], 7)
+        self.assertEqual(report["missing_event_id"], 1)
+        self.assertEqual(report["invalid_event_time"], 1)
+        self.assertEqual(report["invalid_ingested_at"], 1)
+        # c: event_time 11:00 depois de ingested_at 10:00
+        self.assertEqual(report["future_events"], 1)
+        self.assertEqual({r["_id"]: r["count"] for r in report["by_type"]}, {
+            "order_historical": 1, "order_created": 2, "payment_succeeded": 2, "refund_issued": 2,
+        })
+
+        buckets = {b["day"]: b for b in daily_buckets(facets, datetime(2025, 1, 4))}
+        self.assertEqual(sorted(buckets), ["2025-01-01", "2025-01-02", "2025-01-03"])
+        self.assertEqual(buckets["2025-01-01"]["total_events"], 4)
+        self.assertEqual(buckets["2025-01-02"]["by_type"], {"payment_succeeded": 1})
+
+    def test_window_on_ingested_at(self):
+        facets = frame_facets(DOCS, datetime(2025, 1, 2), datetime(2025, 1, 3))
+
+        self.assertEqual(build_report(facets)["total_events"], 1)
+        self.assertEqual([r["_id"] for r in facets["by_day"]], ["2025-01-02"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from src.time_utils import NAT, PLACEHOLDER_EVENT_TIME, parse_timestamp
+from src.transformation.canonicalizer import canonicalize_batch
+from src.transformation.events_transformer import event_epochs_for
+
+# Registos do bootstrap sem created_at/timestamp (data/bootstrap/*_2023.json):
+# o loader grava PLACEHOLDER_EVENT_TIME e a data real está no payload
+BOOTSTRAP_RECORDS = [
+    ({"order": {"id": "ORD-000003", "ts": 1679701829}, "amount": 20100, "ccy": "NGN"}, 1679701829),
+    ({"order_id": "ORD-000444", "paid_at": "2023-12-26T22:44:47Z", "payment_status": "FAILED",
+      "amountPaid": 40000, "currencyCode": "NGN"}, parse_timestamp("2023-12-26T22:44:47Z")),
+    ({"orderRef": "ORD-000355", "carrier": "FedEx",
+      "updates": [{"status": "CREATED", "time": "2023-03-04T23:44:39Z"},
+                  {"status": "DELIVERED", "time": "2023-03-08 04:44"}]}, parse_timestamp("2023-03-08 04:44")),
+]
+
+
+def raw_events(records, event_time=PLACEHOLDER_EVENT_TIME):
+    return [{"event_time": event_time, "vendor": "unknown", "payload": record} for record, _ in records]
+
+
+class EventEpochsTest(unittest.TestCase):
+
+    def epochs(self, batch):
+        vendors = [ev["vendor"] for ev in batch]
+        frame = canonicalize_batch(vendors, [ev["payload"] for ev in batch])
+        return list(event_epochs_for(batch, vendors, frame["event_ts"]))
+
+    def test_bootstrap_placeholder_falls_back_to_payload(self):
+        self.assertEqual(self.epochs(raw_events(BOOTSTRAP_RECORDS)), [epoch for _, epoch in BOOTSTRAP_RECORDS])
+
+    def test_placeholder_without_payload_date_is_missing(self):
+        batch = [{"event_time": PLACEHOLDER_EVENT_TIME, "vendor": "unknown", "payload": {"order_id": "ORD-1"}}]
+        self.assertEqual(self.epochs(batch), [NAT])
+
+    def test_real_event_time_wins_over_payload(self):
+        batch = raw_events(BOOTSTRAP_RECORDS[:1], event_time="2024-01-01T00:00:00Z")
+        self.assertEqual(self.epochs(batch), [parse_timestamp("2024-01-01T00:00:00Z")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import pickle
+import unittest
+from functools import partial
+
+from src.dags.executor import SUCCESS, DAG
+from src.dags.local_dag import build_pipeline, staged
+
+
+def rows(n):
+    return n
+
+
+class LocalDagTest(unittest.TestCase):
+
+    def test_process_pipeline_tasks_are_picklable(self):
+        dag = build_pipeline("process")
+
+        self.assertIn("live", dag.tasks)
+        for task in dag.tasks.values():
+            pickle.dumps(task.fn)
+
+    def test_staged_task_runs_in_process_pool(self):
+        dag = DAG("test")
+        dag.add("one", staged("test", partial(rows, 3)))
+
+        results = dag.run(max_workers=1, executor="process")
+
+        self.assertEqual(results["one"].status, SUCCESS)
+        self.assertEqual(results["one"].rows, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+from src.analytics.order_state import CREATED, PAID, REFUND, OrderStateTable, rebuild_order_states
+
+
+def events():
+    return [
+        {"event_id": "e1", "event_type": "order_created", "order_id": "ORD-2", "event_epoch": 200},
+        {"event_id": "e2", "event_type": "refund_issued", "order_id": "ORD-1", "event_epoch": 300},
+        {"event_id": "e3", "event_type": "payment_succeeded", "order_id": "ORD-1", "event_epoch": 150},
+        {"event_id": "e4", "event_type": "order_created", "order_id": "ORD-1", "event_epoch": 100},
+        {"event_id": "e5", "event_type": "refund_issued", "order_id": "ORD-1", "event_epoch": 400},
+        {"event_id": "e6", "event_type": "shipment_updated", "order_id": "ORD-2", "event_epoch": 500,
+         "status": "DELIVERED"},
+    ]
+
+
+class OrderStateTableTest(unittest.TestCase):
+
+    def test_codes_are_stable_across_batches(self):
+        table = OrderStateTable(capacity=1)
+        first = table.intern(["ORD-B", "ORD-A", "ORD-B"])
+        second = table.intern(["ORD-C", "ORD-A", "ORD-LONGER-ID"])
+
+        self.assertEqual(first.tolist(), [1, 0, 1])
+        self.assertEqual(second.tolist(), [2, 0, 3])
+        self.assertEqual(table.keys.tolist(), [b"ORD-A", b"ORD-B", b"ORD-C", b"ORD-LONGER-ID"])
+        self.assertEqual(len(table), 4)
+
+    def test_sorted_states(self):
+        table = OrderStateTable(capacity=1)
+        table.add(["ORD-2", "ORD-1"], np.array([CREATED, REFUND], dtype=np.int8),
+                  np.array([200, 300]), ["e1", "e2"])
+        table.add(["ORD-1", "ORD-1"], np.array([PAID, REFUND], dtype=np.int8),
+                  np.array([150, 400]), ["e3", "e5"])
+
+        states = list(table.sorted_states())
+
+        self.assertEqual([s[0] for s in states], [b"ORD-1", b"ORD-2"])
+        self.assertEqual(states[0][2], 150)
+        self.assertEqual(states[0][4], ("e2", "e5"))
+        self.assertEqual(states[1][1], 200)
+
+
+class RebuildOrderStatesTest(unittest.TestCase):
+
+    def test_disk_runs_match_memory(self):
+        in_memory = list(rebuild_order_states(events()))
+        spilled = list(rebuild_order_states(events(), memory_budget_mb=0))
+
+        self.assertEqual(in_memory, spilled)
+        self.assertEqual([doc["order_id"] for doc in in_memory], ["ORD-1", "ORD-2"])
+        self.assertEqual(in_memory[0]["refund_event_ids"], ["e2", "e5"])
+        self.assertIsNotNone(in_memory[1]["delivered_at"])
+
+    def test_non_string_order_ids(self):
+        docs = list(rebuild_order_states([
+            {"event_id": "e1", "event_type": "order_created", "order_id": 7, "event_epoch": 100},
+        ]))
+
+        self.assertEqual(docs[0]["order_id"], 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
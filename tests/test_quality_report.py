@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from src.analytics.quality_report import run_checks
+from src.analytics.warehouse_simulator import Warehouse
+from src.time_utils import PLACEHOLDER_EVENT_TIME
+from tests.test_warehouse import fact_row
+
+
+class LateArrivalsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.warehouse = Warehouse(os.path.join(self.tmp.name, "warehouse.db"))
+        self.warehouse.ensure_fact_table()
+
+    def tearDown(self):
+        self.warehouse.close()
+        self.tmp.cleanup()
+
+    def late_arrivals(self):
+        with redirect_stdout(StringIO()):
+            return run_checks(self.warehouse)["late_arrivals"]
+
+    def test_bootstrap_rows_are_not_late(self):
+        self.warehouse.insert_facts([
+            # Registo do bootstrap: event_time de preenchimento, epoch do event_ts
+            fact_row(1, PLACEHOLDER_EVENT_TIME, 1679701829, ingested_at="2025-01-01 10:00:00"),
+            # Chegou dois dias depois do evento
+            fact_row(2, "2024-12-30T10:00:00Z", event_type="order_created", ingested_at="2025-01-01 10:00:00"),
+            fact_row(3, "2025-01-01T09:00:00Z", event_type="order_created", ingested_at="2025-01-01 10:00:00"),
+        ])
+        # Linha gravada por versões que guardavam o epoch 0 do preenchimento
+        self.warehouse.execute(
+            "INSERT INTO fact_events_p202501 (event_id, event_time, event_epoch, ingested_at) "
+            "VALUES (x'04', ?, 0, '2025-01-01 10:00:00')",
+            (PLACEHOLDER_EVENT_TIME,),
+        )
+
+        late = self.late_arrivals()
+
+        self.assertEqual(late["late_events"], 1)
+        self.assertEqual(late["max_delay_seconds"], 2 * 86400)
+        self.assertEqual(late["placeholder_event_time"], 2)
+        self.assertEqual(late["invalid_event_time"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
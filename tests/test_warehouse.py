@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+
+from src.analytics.warehouse_simulator import (
+    FACT_BACKFILL_STATE,
+    FACT_COLUMNS,
+    PLACEHOLDER_PARTITION,
+    UNKNOWN_PARTITION,
+    Warehouse,
+)
+from src.time_utils import PLACEHOLDER_EVENT_TIME
+
+
+def fact_row(event_id, event_time, event_epoch=None, event_type="order_historical", **values):
+    row = {
+        "event_id": f"{event_id:064x}",
+        "event_time": event_time,
+        "event_type": event_type,
+        "ingested_at": "2025-01-01 10:00:00",
+        "order_id": f"ORD-{event_id:06d}",
+        "vendor": None,
+        "event_epoch": event_epoch,
+        "amount": None,
+        "currency": None,
+        "status": None,
+        **values,
+    }
+    return tuple(row[c] for c in FACT_COLUMNS)
+
+
+class WarehouseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "warehouse.db")
+        self.warehouse = Warehouse(self.path)
+        self.warehouse.ensure_fact_table()
+
+    def tearDown(self):
+        self.warehouse.close()
+        self.tmp.cleanup()
+
+    def test_bootstrap_rows_route_on_event_epoch(self):
+        self.warehouse.insert_facts([
+            fact_row(1, PLACEHOLDER_EVENT_TIME, 1679701829),
+            fact_row(2, PLACEHOLDER_EVENT_TIME, 0),
+            fact_row(3, PLACEHOLDER_EVENT_TIME),
+        ])
+
+        self.assertEqual(self.warehouse.partitions(), ["fact_events_p202303", UNKNOWN_PARTITION])
+        days = dict(self.warehouse.execute("SELECT day, SUM(events) FROM rollup_events_daily GROUP BY day"))
+        self.assertEqual(days, {"2023-03-24": 1, "unknown": 2})
+
+    def test_placeholder_partition_is_dropped_on_open(self):
+        self.warehouse.insert_facts([fact_row(1, "2025-01-02T00:00:00Z")])
+        with self.warehouse.transaction():
+            self.warehouse._ensure_partition("197001")
+            self.warehouse.execute(f"INSERT INTO {PLACEHOLDER_PARTITION} (event_id, event_epoch) VALUES (x'01', 0)")
+            self.warehouse.execute("INSERT INTO rollup_events_daily VALUES ('1970-01-01', 0, 1, 1)")
+            self.warehouse.set_state("fact_events", "000000000000000000000000")
+        self.warehouse.close()
+
+        self.warehouse = Warehouse(self.path)
+        self.warehouse.ensure_fact_table()
+
+        self.assertNotIn(PLACEHOLDER_PARTITION, self.warehouse.partitions())
+        self.assertIsNone(self.warehouse.get_state("fact_events"))
+        days = [row[0] for row in self.warehouse.execute("SELECT day FROM rollup_events_daily")]
+        self.assertEqual(days, ["2025-01-02"])
+
+    def test_daily_orders_and_revenue_per_currency(self):
+        day = "2023-03-24T10:00:00Z"
+        self.warehouse.insert_facts([
+            fact_row(1, day, event_type="order_historical", amount=100.0, currency="NGN"),
+            fact_row(2, day, event_type="order_created", amount=5.0, currency="USD"),
+            fact_row(3, day, event_type="payment_historical", amount=100.0, currency="NGN", status="SUCCESS"),
+            fact_row(4, day, event_type="payment_historical", amount=50.0, currency="NGN", status="FAILED"),
+            fact_row(5, day, event_type="payment_succeeded", amount=5.0, currency="USD", status="SUCCESS"),
+            fact_row(6, day, event_type="refund_issued", amount=20.0, currency="NGN"),
+        ])
+
+        orders = self.warehouse.execute(
+            "SELECT day, orders_created, payments_succeeded, refunds_issued FROM daily_orders"
+        ).fetchall()
+        self.assertEqual(orders, [("2023-03-24", 2, 2, 1)])
+
+        revenue = self.warehouse.execute(
+            "SELECT currency, order_value, payments, refunds FROM daily_revenue ORDER BY currency"
+        ).fetchall()
+        self.assertEqual(revenue, [("NGN", 100.0, 100.0, 20.0), ("USD", 5.0, 5.0, 0.0)])
+
+    def test_drop_partition_removes_its_rollup_days(self):
+        self.warehouse.insert_facts([
+            fact_row(1, "2025-01-02T00:00:00Z", amount=10.0, currency="NGN"),
+            fact_row(2, "2025-02-03T00:00:00Z", amount=20.0, currency="NGN"),
+        ])
+
+        self.warehouse.drop_partition("202501")
+
+        for rollup in ("rollup_events_daily", "rollup_amounts_daily"):
+            days = [row[0] for row in self.warehouse.execute(f"SELECT day FROM {rollup}")]
+            self.assertEqual(days, ["2025-02-03"])
+
+    def test_partitions_without_amounts_are_backfilled(self):
+        self.warehouse.insert_facts([fact_row(1, "2025-01-02T00:00:00Z")])
+        with self.warehouse.transaction():
+            self.warehouse.execute("DROP VIEW fact_events")
+            self.warehouse.execute("DROP VIEW fact_events_compact")
+            for column in ("amount", "currency", "status"):
+                self.warehouse.execute(f"ALTER TABLE fact_events_p202501 DROP COLUMN {column}")
+            self.warehouse.set_state("fact_events", "000000000000000000000000")
+        self.warehouse.close()
+
+        self.warehouse = Warehouse(self.path)
+        self.warehouse.ensure_fact_table()
+        self.assertIsNone(self.warehouse.get_state("fact_events"))
+        self.assertIsNotNone(self.warehouse.get_state(FACT_BACKFILL_STATE))
+
+        # A carga seguinte relê events_curated
+        self.warehouse.insert_facts([
+            fact_row(1, "2025-01-02T00:00:00Z", amount=10.0, currency="NGN"),
+            fact_row(2, "2025-01-03T00:00:00Z", amount=5.0, currency="NGN"),
+        ])
+        self.warehouse.finish_backfill()
+
+        self.assertIsNone(self.warehouse.get_state(FACT_BACKFILL_STATE))
+        self.assertEqual(self.warehouse.execute("SELECT COUNT(*) FROM fact_events").fetchone()[0], 2)
+        revenue = self.warehouse.execute("SELECT day, order_value FROM daily_revenue ORDER BY day").fetchall()
+        self.assertEqual(revenue, [("2025-01-02", 10.0), ("2025-01-03", 5.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()